@@ -0,0 +1 @@
+# BioIntertidal Mapper processing package
@@ -0,0 +1,5 @@
+import sys
+
+from biointertidal_mapper.cli import main
+
+sys.exit(main())
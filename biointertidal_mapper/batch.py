@@ -0,0 +1,227 @@
+import concurrent.futures
+import dataclasses
+import datetime
+import json
+import os
+import threading
+
+from biointertidal_mapper.ee_client import EarthEngineClient
+from biointertidal_mapper.engine import (RunCancelled, RunConfig, RunResult, finish_exports, make_tide_backend,
+                                         prepare_aoi, process_site, record_export_jobs, screen_aoi_clouds)
+from biointertidal_mapper.exports import ExportManager, ExportRegistry
+from biointertidal_mapper.instrument import DEFAULT_REPORT_DIR, RunStats, write_report
+from biointertidal_mapper.ledger import RunLedger
+from biointertidal_mapper.tide_cache import TideCache
+
+# Default number of sites screened and submitted concurrently
+DEFAULT_SITE_WORKERS = 4
+
+# Default number of blocking Earth Engine requests in flight at once, over all the sites of a batch
+DEFAULT_MAX_EE_REQUESTS = 4
+
+
+# Earth Engine client shared by the sites of a batch run: the blocking requests of all sites go
+# through a semaphore so no more than max_requests are in flight at once. Everything else is passed
+# through to the wrapped client.
+class RequestLimitedClient:
+    BLOCKING_METHODS = ("get_info", "aoi", "scene_table", "zonal_statistics", "download_url", "export_to_drive",
+                        "task_status")
+
+    def __init__(self, client, max_requests=DEFAULT_MAX_EE_REQUESTS):
+        self.__dict__["_client"] = client
+        self.__dict__["_slots"] = threading.BoundedSemaphore(max(1, max_requests))
+
+    def __getattr__(self, name):
+        value = getattr(self._client, name)
+        if name not in self.BLOCKING_METHODS:
+            return value
+
+        def limited(*args, **kwargs):
+            with self._slots:
+                return value(*args, **kwargs)
+        return limited
+
+    def __setattr__(self, name, value):
+        setattr(self._client, name, value)
+
+
+# Outcome of a batch run: the RunResult of every site that finished and the error of every site that
+# failed, by folder name
+@dataclasses.dataclass
+class BatchResult:
+    results: dict = dataclasses.field(default_factory=dict)
+    errors: dict = dataclasses.field(default_factory=dict)
+    report_path: str = ""
+
+
+# Function definition for reading a site manifest (JSON or YAML): run parameters shared by every site
+# under "defaults", one entry of site parameters (lat, lon, geometry, folder_name, tiles, ...) per site
+# under "sites", and optionally site_workers and max_ee_requests. Returns the RunConfig of every site
+# and the batch options.
+def load_manifest(path):
+    with open(path) as f:
+        if path.endswith((".yaml", ".yml")):
+            import yaml
+            manifest = yaml.safe_load(f)
+        else:
+            manifest = json.load(f)
+
+    unknown = set(manifest) - {"defaults", "sites", "site_workers", "max_ee_requests"}
+    if unknown:
+        raise ValueError(f"Unknown manifest entries: {', '.join(sorted(unknown))}")
+    if not manifest.get("sites"):
+        raise ValueError("The manifest lists no sites.")
+    defaults = manifest.get("defaults") or {}
+    configs = [RunConfig.from_dict({**defaults, **site}) for site in manifest["sites"]]
+    folders = [config.folder_name for config in configs]
+    if len(set(folders)) != len(folders):
+        raise ValueError("Every site of the manifest needs its own folder_name.")
+    options = {"site_workers": int(manifest.get("site_workers", DEFAULT_SITE_WORKERS)),
+               "max_ee_requests": int(manifest.get("max_ee_requests", DEFAULT_MAX_EE_REQUESTS))}
+    return configs, options
+
+
+# Function definition for the scenes of the shared query that belong to a site: those of its tiles,
+# date range and cloud limit whose footprint intersects its AOI (the site's index in scene["sites"],
+# see scene_table), as a single-site query filtered by bounds would select. When the cloud cover inside
+# the site's AOI was fetched with the query, the scenes are copies carrying it as "aoi_cloud".
+def assign_scenes(config, scenes, site=None):
+    assigned = [scene for scene in scenes
+                if scene["tile"] in config.tiles and config.start_date <= scene["date"] < config.end_date
+                and scene["cloud"] < config.cloudy_percentage
+                and (site is None or site in scene.get("sites", [site]))]
+    return [dict(scene, aoi_cloud=scene["site_clouds"][site]) if site in scene.get("site_clouds", {}) else scene
+            for scene in assigned]
+
+
+# Function definition for running several sites as one batch on Earth Engine. The AOIs of all sites are
+# prepared, then a single collection query over their union (widest date range and cloud limit, all
+# tiles) fetches the scene metadata, footprint intersections and the cloud cover inside the AOIs of the
+# sites screened for it in one request, and the scenes are assigned to the sites locally.
+# Each site's tide screening and export submissions then run concurrently in site_workers threads,
+# every blocking Earth Engine request counting against one global max_ee_requests limit, and the
+# export tasks of all sites share one export manager. A failing site does not stop the others.
+def process_batch(configs, client=None, progress=None, exports=None, cancel=None, stats=None, ledger=None,
+                  site_workers=DEFAULT_SITE_WORKERS, max_ee_requests=DEFAULT_MAX_EE_REQUESTS, tide_backends=None):
+    stats = stats if stats is not None else RunStats()
+    report = progress or (lambda value: None)
+    batch = BatchResult()
+    first = configs[0]
+
+    if client is None:
+        client = EarthEngineClient()
+    client.stats = stats
+    client = RequestLimitedClient(client, max_ee_requests)
+    if exports is None:
+        exports = ExportManager(client, max(config.max_concurrent_exports for config in configs),
+                                first.export_poll_interval, first.export_retries, ExportRegistry())
+    if ledger is None and any(config.incremental for config in configs):
+        ledger = RunLedger()
+    tide_cache = TideCache() if tide_backends is None else None
+
+    status = "completed"
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, site_workers)) as executor:
+            with stats.stage("aoi"):
+                aois = list(executor.map(lambda config: prepare_aoi(config, client), configs))
+            report(10)
+
+            # One query for all sites: the metadata of every candidate scene, which site AOIs its
+            # footprint intersects and its cloud cover inside them, in a single request
+            geometries = [geometry for geometry, region in aois]
+            cloud_sites = [i for i, config in enumerate(configs) if config.aoi_cloud_percentage < 100]
+            with stats.stage("scene_query"):
+                imgs = client.image_collection(client.features(geometries),
+                                               max(config.cloudy_percentage for config in configs),
+                                               min(config.start_date for config in configs),
+                                               max(config.end_date for config in configs),
+                                               sorted({tile for config in configs for tile in config.tiles}))
+                scenes = client.scene_table(imgs, sites=geometries, cloud_sites=cloud_sites)
+            print(f"Batch scene query: {len(scenes)} scenes for {len(configs)} sites")
+
+            fractions = [0.0] * len(configs)
+            lock = threading.Lock()
+
+            def site_progress(i):
+                def update(value):
+                    with lock:
+                        fractions[i] = value / 100
+                        report(10 + 90 * sum(fractions) / len(fractions))
+                return update
+
+            def run_site(i):
+                config, (geometry, region) = configs[i], aois[i]
+                site_scenes = assign_scenes(config, scenes, i)
+                if config.aoi_cloud_percentage < 100:
+                    site_scenes = screen_aoi_clouds(site_scenes, config.aoi_cloud_percentage)
+                if tide_backends is not None:
+                    tide_backend = tide_backends[config.folder_name]
+                else:
+                    tide_backend = make_tide_backend(config, tide_cache)
+                tide_backend.stats = stats
+                return process_site(config, client, tide_backend, imgs, site_scenes, geometry, region,
+                                    site_progress(i), exports, cancel, stats,
+                                    ledger if config.incremental else None, wait=False)
+
+            futures = {executor.submit(run_site, i): config for i, config in enumerate(configs)}
+            outputs = {}
+            for future in concurrent.futures.as_completed(futures):
+                config = futures[future]
+                try:
+                    batch.results[config.folder_name], outputs[config.folder_name] = future.result()
+                except RunCancelled:
+                    raise
+                except Exception as error:
+                    print(f"Site '{config.folder_name}' failed: {error}")
+                    batch.errors[config.folder_name] = str(error)
+
+        # Wait for the export tasks of every site at once, then record them per site
+        if any(outputs.values()):
+            print()
+            waited = RunResult()
+            with stats.stage("export_wait"):
+                finish_exports(exports, waited, cancel)
+            for config in configs:
+                if config.folder_name in outputs:
+                    jobs = [job for job in waited.export_jobs if job.params.get("folder") == config.folder_name]
+                    batch.results[config.folder_name].export_jobs = jobs
+                    record_export_jobs(config, ledger if config.incremental else None,
+                                       outputs[config.folder_name], jobs)
+        if cancel is not None and cancel.is_set():
+            raise RunCancelled("The run was cancelled.")
+        report(100)
+        if batch.errors:
+            status = f"failed sites: {', '.join(sorted(batch.errors))}"
+        return batch
+    except RunCancelled:
+        status = "cancelled"
+        raise
+    except Exception as error:
+        status = f"failed: {error}"
+        raise
+    finally:
+        batch.report_path = write_batch_report(configs, stats, status, batch)
+
+
+# Function definition for writing the JSON report of a batch run (stage times, network calls and the
+# outcome of every site) to the report_path of the sites (set under the manifest defaults) or to the
+# report folder; returns its path
+def write_batch_report(configs, stats, status, batch):
+    def site_report(name):
+        if name in batch.results:
+            result = batch.results[name]
+            return {"scene_count": result.scene_count, "low_tide_scenes": len(result.dates_with_low_tides),
+                    "outputs": len(result.exports)}
+        return {"error": batch.errors.get(name, "not run")}
+
+    path = configs[0].report_path or os.path.join(DEFAULT_REPORT_DIR,
+                                                  f"batch_{datetime.datetime.now():%Y%m%dT%H%M%S}.json")
+    report = {
+        "started": datetime.datetime.fromtimestamp(stats.started, datetime.timezone.utc).isoformat(),
+        "status": status,
+        "sites": {config.folder_name: site_report(config.folder_name) for config in configs},
+    }
+    report.update(stats.report())
+    write_report(report, path)
+    print(f"Run report written to {path}")
+    return path
@@ -0,0 +1,202 @@
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from biointertidal_mapper.ee_client import FakeEEClient
+from biointertidal_mapper.engine import RunConfig, process
+from biointertidal_mapper.exports import ExportManager, ExportRegistry
+from biointertidal_mapper.instrument import RunStats
+from biointertidal_mapper.stubs import StubWorldTidesServer
+from biointertidal_mapper.tide_cache import TideCache
+from biointertidal_mapper.tides import WorldTidesBackend, WorldTidesClient
+
+# Default folder of the stored benchmark results
+DEFAULT_RESULTS_DIR = "benchmark_results"
+
+# Number of scenes of the default workloads
+DEFAULT_SIZES = (10, 100, 500, 2000)
+
+BENCHMARK_KEY = "benchmark-key"
+
+# Modules whose import time in a fresh interpreter is measured, as the startup cost of a worker process
+STARTUP_MODULES = ("biointertidal_mapper.engine", "biointertidal_mapper.cli")
+
+
+# Function definition for a deterministic list of scenes: one acquisition at 11:30 UTC per day and tile,
+# starting on 2018-01-01, with a cloud percentage cycling between 0 and 49
+def synthetic_scenes(count, tiles=("T29UPV", "T29UQV")):
+    start = datetime.datetime(2018, 1, 1, 11, 30, tzinfo=datetime.timezone.utc)
+    scenes = []
+    for i in range(count):
+        day, index = divmod(i, len(tiles))
+        tile = tiles[index]
+        acquired = start + datetime.timedelta(days=day)
+        scenes.append({"id": f"{acquired:%Y%m%dT%H%M%S}_{tile}", "time_start": int(acquired.timestamp() * 1000),
+                       "tile": tile[1:], "cloud": (i * 7) % 50})
+    return scenes
+
+
+# Function definition for running process() once on a workload of `count` scenes against the fake
+# Earth Engine client and the stub WorldTides server. Returns the measurements of the run.
+def run_workload(count, tiles=("T29UPV", "T29UQV"), ee_latency=0.005, tide_latency=0.02, max_concurrent_exports=10,
+                 measure_memory=False):
+    scenes = synthetic_scenes(count, tiles)
+    days = count // len(tiles) + 1
+    end_date = (datetime.date(2018, 1, 1) + datetime.timedelta(days=days)).isoformat()
+    with tempfile.TemporaryDirectory() as folder:
+        config = RunConfig(lat="53.35293", lon="-6.16435", start_date="2018-01-01", end_date=end_date,
+                           tiles=list(tiles), geometry="projects/benchmark/assets/aoi", epsg="32629",
+                           folder_name="benchmark", world_tides_key=BENCHMARK_KEY,
+                           max_concurrent_exports=max_concurrent_exports, export_poll_interval=0.01,
+                           report_path=os.path.join(folder, "report.json"), incremental=False)
+        client = FakeEEClient(scenes, latency=ee_latency)
+        stats = RunStats()
+        exports = ExportManager(client, max_concurrent_exports, config.export_poll_interval, 0,
+                                ExportRegistry(os.path.join(folder, "exports.sqlite")))
+        with StubWorldTidesServer(credits={BENCHMARK_KEY: 10 ** 9}, latency=tide_latency) as server:
+            tide_backend = WorldTidesBackend(BENCHMARK_KEY, cache=TideCache(":memory:"), fallback_keys=(),
+                                             client=WorldTidesClient([BENCHMARK_KEY], requests_per_second=0,
+                                                                     base_url=server.url))
+            if measure_memory:
+                tracemalloc.start()
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = process(config, client=client, tide_backend=tide_backend, exports=exports, stats=stats)
+            seconds = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] if measure_memory else None
+            if measure_memory:
+                tracemalloc.stop()
+
+    report = stats.report()
+    return {
+        "scenes": count,
+        "seconds": round(seconds, 3),
+        "ee_round_trips": client.round_trips,
+        "tide_requests": server.request_count,
+        "outputs": len(result.exports),
+        "peak_memory_mb": round(peak / 2 ** 20, 2) if peak is not None else None,
+        "stages": report["stages"],
+    }
+
+
+# Function definition for the median wall-clock time, in milliseconds, of starting a fresh interpreter
+# that imports each module (like a worker process does), next to that of a bare interpreter
+def measure_startup(modules=STARTUP_MODULES, repeats=5):
+    def median_ms(code):
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", code], check=True)
+            times.append((time.perf_counter() - start) * 1000)
+        return round(statistics.median(times), 1)
+
+    startup = {"interpreter": median_ms("pass")}
+    for module in modules:
+        startup[module] = median_ms(f"import {module}")
+        print(f"Startup with {module}: {startup[module]:.1f} ms (bare interpreter {startup['interpreter']:.1f} ms)",
+              file=sys.stderr)
+    return startup
+
+
+# Function definition for running every workload size; memory is measured in a second run of each
+# workload so tracing does not slow down the timed run
+def run_suite(sizes=DEFAULT_SIZES, **options):
+    results = []
+    for count in sizes:
+        measurement = run_workload(count, **options)
+        measurement["peak_memory_mb"] = run_workload(count, measure_memory=True, **options)["peak_memory_mb"]
+        print(f"{count:>6} scenes: {measurement['seconds']:8.3f} s, {measurement['ee_round_trips']:>5} EE round trips, "
+              f"{measurement['tide_requests']:>4} tide requests, {measurement['peak_memory_mb']:7.2f} MB peak",
+              file=sys.stderr)
+        results.append(measurement)
+    return results
+
+
+def save_results(label, results, options, results_dir=DEFAULT_RESULTS_DIR, startup=None):
+    os.makedirs(results_dir, exist_ok=True)
+    path = os.path.join(results_dir, f"{label}.json")
+    stored = {"label": label, "created": datetime.datetime.now().isoformat(timespec="seconds"),
+              "python": platform.python_version(), "options": options, "results": results}
+    if startup is not None:
+        stored["startup_ms"] = startup
+    with open(path, "w") as f:
+        json.dump(stored, f, indent=1)
+    return path
+
+
+def load_results(label, results_dir=DEFAULT_RESULTS_DIR):
+    path = label if label.endswith(".json") else os.path.join(results_dir, f"{label}.json")
+    with open(path) as f:
+        return json.load(f)
+
+
+# Function definition for printing a before/after table of two stored benchmark runs
+def compare(before, after):
+    rows = {result["scenes"]: result for result in before["results"]}
+    print(f"{'scenes':>6}  {'time before':>11}  {'time after':>10}  {'speedup':>7}  {'EE trips':>11}  "
+          f"{'tide reqs':>11}  {'memory MB':>15}")
+    for result in after["results"]:
+        old = rows.get(result["scenes"])
+        if old is None:
+            continue
+        speedup = old["seconds"] / result["seconds"] if result["seconds"] else float("inf")
+        print(f"{result['scenes']:>6}  {old['seconds']:>11.3f}  {result['seconds']:>10.3f}  {speedup:>6.2f}x  "
+              f"{old['ee_round_trips']:>5}->{result['ee_round_trips']:<5}  "
+              f"{old['tide_requests']:>5}->{result['tide_requests']:<5}  "
+              f"{old['peak_memory_mb'] or 0:>7.2f}->{result['peak_memory_mb'] or 0:<7.2f}")
+
+    before_startup, after_startup = before.get("startup_ms", {}), after.get("startup_ms", {})
+    for name in after_startup:
+        if name in before_startup:
+            print(f"startup {name}: {before_startup[name]:.1f} ms -> {after_startup[name]:.1f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m biointertidal_mapper.benchmark",
+                                     description="Offline benchmark of the pipeline against fake Earth Engine "
+                                                 "and WorldTides backends")
+    parser.add_argument("--results-dir", default=DEFAULT_RESULTS_DIR, help="Folder of the stored results")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run the workloads and store the results under a label")
+    run_parser.add_argument("label", help="Name of the stored results, e.g. before or a commit id")
+    run_parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                            help="Comma-separated numbers of scenes")
+    run_parser.add_argument("--tiles", type=int, default=2, help="Number of tiles the scenes are spread over")
+    run_parser.add_argument("--ee-latency", type=float, default=0.005, help="Seconds per Earth Engine round trip")
+    run_parser.add_argument("--tide-latency", type=float, default=0.02, help="Seconds per WorldTides request")
+    run_parser.add_argument("--exports", type=int, default=10, help="Maximum concurrent export tasks")
+    run_parser.add_argument("--startup-repeats", type=int, default=5,
+                            help="Interpreter starts per measured module (0 skips the startup measurement)")
+
+    compare_parser = subparsers.add_parser("compare", help="Compare two stored results")
+    compare_parser.add_argument("before")
+    compare_parser.add_argument("after")
+
+    args = parser.parse_args(argv)
+    if args.command == "compare":
+        compare(load_results(args.before, args.results_dir), load_results(args.after, args.results_dir))
+        return 0
+
+    tiles = tuple(f"T29U{chr(ord('A') + i // 26)}{chr(ord('A') + i % 26)}" for i in range(args.tiles))
+    options = dict(tiles=tiles, ee_latency=args.ee_latency, tide_latency=args.tide_latency,
+                   max_concurrent_exports=args.exports)
+    results = run_suite([int(size) for size in args.sizes.split(",")], **options)
+    startup = measure_startup(repeats=args.startup_repeats) if args.startup_repeats else None
+    path = save_results(args.label, results, options, args.results_dir, startup)
+    print(f"Results written to {path}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
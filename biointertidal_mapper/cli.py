@@ -0,0 +1,179 @@
+import argparse
+import concurrent.futures
+import json
+import sys
+
+from biointertidal_mapper.engine import RunConfig, load_config, process
+from biointertidal_mapper.tides import TideAPIError
+
+
+# Function definition for applying "name=value" overrides given on the command line to a config
+def apply_overrides(config, overrides):
+    values = config.to_dict()
+    for override in overrides:
+        name, _, value = override.partition("=")
+        values[name] = value
+    return RunConfig.from_dict(values)
+
+
+# Function definition for running a single job; returns the process exit status
+def run_job(path, overrides=()):
+    try:
+        config = apply_overrides(load_config(path), overrides)
+    except (OSError, ValueError, TypeError) as error:
+        print(f"{path}: invalid configuration: {error}", file=sys.stderr)
+        return 2
+
+    valid, error_message = config.validate()
+    if not valid:
+        print(f"{path}: {error_message}", file=sys.stderr)
+        return 2
+
+    from biointertidal_mapper.ee_client import EarthEngineClient
+    client = EarthEngineClient()
+    client.initialize(config.ee_project or None)
+
+    def progress(value):
+        print(f"[{path}] {value:.0f}%", file=sys.stderr)
+
+    try:
+        result = process(config, client=client, progress=progress)
+    except TideAPIError as error:
+        print(f"{path}: {error}", file=sys.stderr)
+        return 1
+
+    if result.dates_with_low_tides:
+        print("Dates with images acquired during low tide:")
+        print("\n".join(result.dates_with_low_tides))
+    return 0
+
+
+# Function definition for printing the plan of a job without running it; returns the process exit status
+def plan_job(path, overrides=(), as_json=False):
+    from biointertidal_mapper.plan import format_plan, plan_run
+
+    try:
+        config = apply_overrides(load_config(path), overrides)
+    except (OSError, ValueError, TypeError) as error:
+        print(f"{path}: invalid configuration: {error}", file=sys.stderr)
+        return 2
+
+    valid, error_message = config.validate()
+    if not valid:
+        print(f"{path}: {error_message}", file=sys.stderr)
+        return 2
+    if config.backend != "earthengine":
+        print(f"{path}: plans are only available for the Earth Engine backend", file=sys.stderr)
+        return 2
+
+    from biointertidal_mapper.ee_client import EarthEngineClient
+    client = EarthEngineClient()
+    client.initialize(config.ee_project or None)
+
+    plan = plan_run(config, client=client)
+    print(json.dumps(plan.to_dict(), indent=1) if as_json else format_plan(plan))
+    return 0
+
+
+# Function definition for running the sites of a manifest as one batch; returns the process exit status
+def run_batch(path, overrides=(), site_workers=None, max_ee_requests=None):
+    from biointertidal_mapper.batch import load_manifest, process_batch
+
+    try:
+        configs, options = load_manifest(path)
+        configs = [apply_overrides(config, overrides) for config in configs]
+    except (OSError, ValueError, TypeError) as error:
+        print(f"{path}: invalid manifest: {error}", file=sys.stderr)
+        return 2
+    for config in configs:
+        valid, error_message = config.validate()
+        if not valid:
+            print(f"{path}: site '{config.folder_name}': {error_message}", file=sys.stderr)
+            return 2
+        if config.backend != "earthengine":
+            print(f"{path}: site '{config.folder_name}': batch runs need the Earth Engine backend", file=sys.stderr)
+            return 2
+
+    from biointertidal_mapper.ee_client import EarthEngineClient
+    client = EarthEngineClient()
+    client.initialize(configs[0].ee_project or None)
+
+    def progress(value):
+        print(f"[{path}] {value:.0f}%", file=sys.stderr)
+
+    try:
+        result = process_batch(configs, client=client, progress=progress,
+                               site_workers=site_workers or options["site_workers"],
+                               max_ee_requests=max_ee_requests or options["max_ee_requests"])
+    except TideAPIError as error:
+        print(f"{path}: {error}", file=sys.stderr)
+        return 1
+
+    for name, site_result in result.results.items():
+        print(f"{name}: {len(site_result.dates_with_low_tides)} scenes at low tide, {len(site_result.exports)} outputs")
+    for name, error in result.errors.items():
+        print(f"{name}: failed: {error}", file=sys.stderr)
+    return 1 if result.errors else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="biointertidal-mapper",
+                                     description="Map intertidal habitats from Sentinel-2 images acquired at low tide")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run one or more jobs described by JSON/YAML config files")
+    run_parser.add_argument("configs", nargs="+", help="Run configuration files")
+    run_parser.add_argument("--set", dest="overrides", action="append", default=[], metavar="NAME=VALUE",
+                            help="Override a parameter of every config")
+    run_parser.add_argument("--jobs", type=int, default=1, help="Number of jobs run in parallel processes")
+
+    plan_parser = subparsers.add_parser("plan", help="Estimate scenes, tide requests and exports without running")
+    plan_parser.add_argument("configs", nargs="+", help="Run configuration files")
+    plan_parser.add_argument("--set", dest="overrides", action="append", default=[], metavar="NAME=VALUE",
+                             help="Override a parameter of every config")
+    plan_parser.add_argument("--json", action="store_true", help="Print the plans as JSON")
+
+    batch_parser = subparsers.add_parser("batch", help="Run the sites of a manifest with one shared scene query")
+    batch_parser.add_argument("manifest", help="Site manifest (JSON/YAML with defaults and sites)")
+    batch_parser.add_argument("--set", dest="overrides", action="append", default=[], metavar="NAME=VALUE",
+                              help="Override a parameter of every site")
+    batch_parser.add_argument("--site-workers", type=int, help="Number of sites processed concurrently")
+    batch_parser.add_argument("--max-ee-requests", type=int,
+                              help="Maximum number of Earth Engine requests in flight over all sites")
+
+    subparsers.add_parser("gui", help="Open the graphical interface")
+
+    merge_parser = subparsers.add_parser("merge", help="Merge per-tile GeoTIFFs of the same date into one raster")
+    merge_parser.add_argument("folder", help="Folder with the <indices>_<date>_<tile>.tif files")
+    merge_parser.add_argument("--output-dir", help="Folder of the merged rasters (default: the input folder)")
+    merge_parser.add_argument("--overwrite", action="store_true", help="Replace merged rasters that already exist")
+    merge_parser.add_argument("--block-size", type=int, default=1024, help="Size in pixels of the blocks written")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "gui":
+        from biointertidal_mapper.gui import main as gui_main
+        gui_main()
+        return 0
+
+    if args.command == "plan":
+        return max(plan_job(path, args.overrides, args.json) for path in args.configs)
+
+    if args.command == "batch":
+        return run_batch(args.manifest, args.overrides, args.site_workers, args.max_ee_requests)
+
+    if args.command == "merge":
+        from biointertidal_mapper.mosaic import merge_folder
+        merge_folder(args.folder, args.output_dir, args.overwrite, args.block_size)
+        return 0
+
+    if args.jobs > 1 and len(args.configs) > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            statuses = list(executor.map(run_job, args.configs, [args.overrides] * len(args.configs)))
+    else:
+        statuses = [run_job(path, args.overrides) for path in args.configs]
+    return max(statuses)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
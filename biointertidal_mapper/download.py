@@ -0,0 +1,152 @@
+import concurrent.futures
+import io
+import math
+import os
+import random
+import threading
+import time
+
+from biointertidal_mapper.ee_client import DOWNLOAD_NODATA
+from biointertidal_mapper.instrument import timed_call
+
+# Default edge in pixels of the square chunks fetched in one request. 512 x 512 float32 pixels of a few
+# bands stay well below the 48 MB limit of Earth Engine pixel downloads.
+DEFAULT_CHUNK_SIZE = 512
+
+# Default largest output, in pixels, downloaded directly; larger outputs go through a batch export
+DEFAULT_MAX_PIXELS = 50_000_000
+
+
+class DownloadError(Exception):
+    pass
+
+
+class _TransientError(Exception):
+    pass
+
+
+# Function definition for the output grid of an AOI: bounds (min x, min y, max x, max y) in the output
+# CRS snapped outwards to the pixel size. Returns (left, top, width, height).
+def output_grid(bounds, scale):
+    minx, miny, maxx, maxy = bounds
+    left, top = math.floor(minx / scale) * scale, math.ceil(maxy / scale) * scale
+    width = max(1, math.ceil(round((maxx - left) / scale, 6)))
+    height = max(1, math.ceil(round((top - miny) / scale, 6)))
+    return left, top, width, height
+
+
+# Function definition for the bounding box of the AOI of a run in the output CRS, from the local
+# shapefile (converted once and cached, see load_aoi) or the GeoJSON of the prepared asset region
+def aoi_bounds(config, region):
+    from biointertidal_mapper.engine import is_local_shapefile
+    from biointertidal_mapper.shapefiles import geometries_bounds, load_aoi, reproject_geometries
+
+    crs = f"EPSG:{config.epsg}"
+    if is_local_shapefile(config.geometry):
+        return geometries_bounds([load_aoi(config.geometry, crs, config.aoi_tolerance, config.aoi_max_vertices)])
+    return geometries_bounds(reproject_geometries([region], "EPSG:4326", crs))
+
+
+# Downloads Earth Engine images straight to local GeoTIFFs. The output grid is cut into chunks whose
+# pixels are fetched in parallel over a pooled HTTP session (one download URL per chunk), every chunk
+# retried on its own, and each chunk is written to the file as soon as it arrives. At most two chunks
+# per worker are held in memory, whatever the size of the output.
+class ChunkDownloader:
+    def __init__(self, client, workers=8, chunk_size=DEFAULT_CHUNK_SIZE, max_retries=3, backoff=0.5, timeout=120):
+        import requests
+        self._requests = requests
+        self.client = client
+        self.workers = max(1, workers)
+        self.chunk_size = chunk_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # Number of chunk requests sent, retries included
+        self.request_count = 0
+        # RunStats recording the latency and size of every chunk request, if any
+        self.stats = None
+        self._lock = threading.Lock()
+
+    # Fetch the pixels of one chunk as a (bands, height, width) float32 array, masked pixels as NaN.
+    # The download URL is requested again on every attempt since it may have expired.
+    def _fetch(self, image, bands, crs, scale, x, y, width, height):
+        import numpy as np
+
+        for attempt in range(self.max_retries + 1):
+            with self._lock:
+                self.request_count += 1
+            try:
+                url = self.client.download_url(image, bands, crs, scale, x, y, width, height)
+                with timed_call(self.stats, "ee.download") as call:
+                    response = self.session.get(url, timeout=self.timeout)
+                    call["bytes"] = len(response.content)
+                if response.status_code == 429 or response.status_code >= 500:
+                    raise _TransientError(f"HTTP {response.status_code}")
+                if response.status_code != 200:
+                    raise DownloadError(f"Pixel download failed with HTTP {response.status_code}: "
+                                        f"{response.text[:200]}")
+                values = np.load(io.BytesIO(response.content), allow_pickle=False)
+                data = np.stack([values[band] for band in bands]).astype("float32")
+                data[data == DOWNLOAD_NODATA] = np.nan
+                return data
+            except (self._requests.ConnectionError, self._requests.Timeout, _TransientError) as error:
+                if attempt == self.max_retries:
+                    raise DownloadError(f"Pixel download failed after {attempt + 1} attempts: {error}")
+                time.sleep(self.backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+
+    # Download the given bands of an image over the AOI bounds (in crs) at scale metres to a float32
+    # GeoTIFF at path. The file is written under a temporary name and only renamed once complete.
+    # Once the threading.Event `cancel` is set no new chunk is requested, the partial file is removed
+    # and None is returned.
+    def download(self, image, bands, bounds, crs, scale, path, cancel=None):
+        import rasterio
+        from rasterio.transform import from_origin
+
+        left, top, width, height = output_grid(bounds, scale)
+        chunks = [(col, row, min(self.chunk_size, width - col), min(self.chunk_size, height - row))
+                  for row in range(0, height, self.chunk_size) for col in range(0, width, self.chunk_size)]
+
+        def fetch(chunk):
+            col, row, w, h = chunk
+            return chunk, self._fetch(image, bands, crs, scale, left + col * scale, top - row * scale, w, h)
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        partial_path = path + ".part"
+        profile = dict(driver="GTiff", width=width, height=height, count=len(bands), dtype="float32", crs=crs,
+                       transform=from_origin(left, top, scale, scale), nodata=float("nan"), tiled=True,
+                       blockxsize=256, blockysize=256, compress="deflate")
+        try:
+            with rasterio.open(partial_path, "w", **profile) as dst:
+                dst.descriptions = tuple(bands)
+
+                def write(future):
+                    (col, row, w, h), data = future.result()
+                    dst.write(data, window=rasterio.windows.Window(col, row, w, h))
+
+                with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+                    # Keep a bounded number of chunks in flight so memory use does not grow with the output
+                    pending = set()
+                    for chunk in chunks:
+                        if cancel is not None and cancel.is_set():
+                            break
+                        pending.add(executor.submit(fetch, chunk))
+                        if len(pending) >= 2 * self.workers:
+                            done, pending = concurrent.futures.wait(
+                                pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                            for future in done:
+                                write(future)
+                    for future in concurrent.futures.as_completed(pending):
+                        write(future)
+            if cancel is not None and cancel.is_set():
+                os.remove(partial_path)
+                return None
+            os.replace(partial_path, path)
+        except BaseException:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+        return path
@@ -0,0 +1,485 @@
+import datetime
+import time
+import urllib.parse
+
+from biointertidal_mapper.indices import composite_band_names, index_image, parse_statistic
+from biointertidal_mapper.instrument import json_size, timed_call
+
+# Sentinel-2 surface reflectance collection used by the mapper
+S2_COLLECTION = 'COPERNICUS/S2_SR'
+
+# Scene properties fetched for the whole collection in a single round trip
+SCENE_COLUMNS = ['system:index', 'system:time_start', 'MGRS_TILE', 'CLOUDY_PIXEL_PERCENTAGE']
+
+# Property holding the percentage of cloudy or cloud shadow pixels inside the AOI (-1 when the image has
+# no valid pixel there) and the Scene Classification (SCL) classes counted: cloud shadow, cloud medium
+# and high probability, thin cirrus
+AOI_CLOUD_PROPERTY = 'AOI_CLOUDY_PERCENTAGE'
+SCL_CLOUD_CLASSES = (3, 8, 9, 10)
+
+# Prefix of the properties telling whether the footprint of an image intersects each site of a batch
+SITE_PROPERTY = 'INTERSECTS_SITE_'
+
+# Value of masked pixels in direct downloads, turned back into NaN locally
+DOWNLOAD_NODATA = -9999.0
+
+# Columns of the zonal statistics rows: date, zone, NDVI class bounds, pixel count, mean and percentile
+ZONAL_COLUMNS = ['date', 'zone', 'class_low', 'class_high', 'count', 'mean', 'percentile']
+
+
+# Function definition for converting tile numbers as entered by the user (T29UPV) to MGRS_TILE values (29UPV)
+def mgrs_tiles(tiles):
+    return [tile[1:] if tile.upper().startswith("T") else tile for tile in tiles]
+
+
+# Function definition for converting a row of the scene metadata table into a scene dictionary
+def scene_from_row(row):
+    scene_id, time_start, tile, cloud = row[:4]
+    acquired = datetime.datetime.fromtimestamp(time_start / 1000, datetime.timezone.utc)
+    scene = {
+        "id": scene_id,
+        "time_start": time_start,
+        "date": acquired.strftime("%Y-%m-%d"),
+        "tile": f"T{tile}" if tile and not tile.startswith("T") else tile,
+        "cloud": cloud,
+    }
+    if len(row) > 4:
+        scene["aoi_cloud"] = row[4] if row[4] is not None and row[4] >= 0 else None
+    return scene
+
+
+# Function definition for converting the rows of the scene metadata table into scene dictionaries. The
+# last columns are the footprint intersection flags of the site_count sites of a batch, followed by the
+# cloud percentages inside the AOIs of cloud_sites (None when the image has no valid pixel there).
+def scenes_from_rows(rows, site_count=0, cloud_sites=()):
+    if not site_count:
+        return [scene_from_row(row) for row in rows]
+    extra = site_count + len(cloud_sites)
+    scenes = []
+    for row in rows:
+        scene = scene_from_row(row[:-extra])
+        flags, clouds = row[-extra:][:site_count], row[-extra:][site_count:]
+        scene["sites"] = [i for i, inside in enumerate(flags) if inside]
+        if cloud_sites:
+            scene["site_clouds"] = {i: cloud if cloud is not None and cloud >= 0 else None
+                                    for i, cloud in zip(cloud_sites, clouds)}
+        scenes.append(scene)
+    return scenes
+
+
+# Earth Engine client used by the pipeline. Every blocking server call goes through get_info()
+# so the number of round trips of a run can be counted. When stats (a RunStats) is set, the latency
+# and response size of every call are recorded too.
+class EarthEngineClient:
+    def __init__(self):
+        import ee
+        self.ee = ee
+        self.round_trips = 0
+        self.stats = None
+        self._aois = {}
+
+    # Initialize the Earth Engine library with the stored credentials (headless runs)
+    def initialize(self, project=None):
+        if project:
+            self.ee.Initialize(project=project)
+        else:
+            self.ee.Initialize()
+
+    # Evaluate an Earth Engine object on the server (one blocking round trip)
+    def get_info(self, obj):
+        self.round_trips += 1
+        with timed_call(self.stats, "ee.get_info") as call:
+            value = obj.getInfo()
+            call["bytes"] = json_size(value)
+        return value
+
+    def feature_collection(self, asset_id):
+        return self.ee.FeatureCollection(asset_id)
+
+    # Build a feature collection from inline geometries (no round trip)
+    def features(self, geometries):
+        return self.ee.FeatureCollection([self.ee.Feature(geometry) for geometry in geometries])
+
+    # Prepare the AOI of a run: union of all the features of the asset, simplified within `tolerance`
+    # metres (0 keeps every vertex). It is fetched once (one round trip) and cached by asset id. Returns
+    # the geometry to filter and clip with, rebuilt from the fetched GeoJSON so later requests carry the
+    # small simplified polygon instead of a reference to the asset, and the GeoJSON export region.
+    def aoi(self, asset_id, tolerance=10.0):
+        key = (asset_id, tolerance)
+        if key not in self._aois:
+            ee = self.ee
+            union = ee.FeatureCollection(asset_id).geometry(max(tolerance, 1)).dissolve(max(tolerance, 1))
+            region = self.get_info(union.simplify(tolerance) if tolerance else union)
+            self._aois[key] = (ee.Geometry(region), region)
+        return self._aois[key]
+
+    # Build an inline planar geometry from GeoJSON coordinates in the given CRS (no round trip)
+    def geometry(self, geojson, crs):
+        return self.ee.Geometry(geojson, crs, False)
+
+    # Get the Sentinel-2 image collection of the date range, AOI and cloud limit, restricted on the server
+    # to the requested MGRS tiles (all tiles if None)
+    def image_collection(self, geometry, cloudy_percentage, start_date, end_date, tiles=None):
+        ee = self.ee
+        collection = (ee.ImageCollection(S2_COLLECTION)
+                      .filterDate(start_date, end_date)
+                      .filterBounds(geometry)
+                      .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', cloudy_percentage)))
+        if tiles:
+            collection = collection.filter(ee.Filter.inList('MGRS_TILE', mgrs_tiles(tiles)))
+        return collection
+
+    # Keep only the images with the given ids (the scenes accepted by the tide screening) and clip
+    # them to the AOI, so no other scene is ever clipped or exported
+    def select_scenes(self, collection, scene_ids, geometry):
+        return (collection.filter(self.ee.Filter.inList('system:index', list(scene_ids)))
+                .map(lambda image: image.clip(geometry)))
+
+    # Fetch ids, acquisition timestamps, MGRS tiles and cloud percentages of every image in the
+    # collection with a single server round trip and return them as a local table. With a geometry the
+    # cloud percentage inside it ("aoi_cloud") is computed for every image by a mapped reduceRegion
+    # over the SCL band and fetched in the same round trip. With the AOI geometries of the sites of a
+    # batch, the sites whose AOI the footprint of every image intersects ("sites", their indices) are
+    # computed on the server and fetched in the same round trip too, as well as the cloud percentage
+    # inside the AOI of every site of cloud_sites whose AOI the image intersects ("site_clouds").
+    def scene_table(self, collection, geometry=None, scale=20, sites=(), cloud_sites=()):
+        ee = self.ee
+        columns = list(SCENE_COLUMNS)
+
+        def cloud_percentage(image, region):
+            scl = image.select('SCL')
+            cloudy = scl.remap(list(SCL_CLOUD_CLASSES), [1] * len(SCL_CLOUD_CLASSES), 0).rename('cloudy')
+            mean = cloudy.reduceRegion(ee.Reducer.mean(), region, scale, maxPixels=1e9).get('cloudy')
+            # Images without any pixel in the AOI get -1 instead of null, which reduceColumns would drop
+            return ee.Number(ee.List([mean, -0.01]).reduce(ee.Reducer.firstNonNull())).multiply(100)
+
+        if geometry is not None:
+            collection = collection.map(lambda image: image.set(AOI_CLOUD_PROPERTY, cloud_percentage(image, geometry)))
+            columns.append(AOI_CLOUD_PROPERTY)
+        if sites:
+            names = [f'{SITE_PROPERTY}{i}' for i in range(len(sites))]
+            cloud_names = [f'{AOI_CLOUD_PROPERTY}_{i}' for i in cloud_sites]
+
+            def intersections(image):
+                footprint = image.geometry()
+                properties = {name: ee.Algorithms.If(footprint.intersects(site, 1), 1, 0)
+                              for name, site in zip(names, sites)}
+                # The cloud cover is only reduced over the sites the footprint intersects
+                properties.update({name: ee.Algorithms.If(footprint.intersects(sites[i], 1),
+                                                          cloud_percentage(image, sites[i]), -1)
+                                   for name, i in zip(cloud_names, cloud_sites)})
+                return image.set(properties)
+
+            collection = collection.map(intersections)
+            columns.extend(names + cloud_names)
+        table = collection.reduceColumns(ee.Reducer.toList(len(columns)), columns).get('list')
+        return scenes_from_rows(self.get_info(table), len(sites), cloud_sites)
+
+    # Get a single image of the collection by its id without fetching anything from the server
+    def image(self, collection, scene_id):
+        return collection.filter(self.ee.Filter.eq('system:index', scene_id)).first()
+
+    # Mosaic the images of the collection with the given ids into a single image (no round trip)
+    def mosaic(self, collection, scene_ids):
+        return collection.filter(self.ee.Filter.inList('system:index', scene_ids)).mosaic()
+
+    # Reduce the indices of the images with the given ids to one per-pixel composite: the statistic and
+    # the count of valid observations of every index, as float bands (no round trip)
+    def composite(self, collection, scene_ids, index_ranges, statistic):
+        ee = self.ee
+        reducer_name, percentile = parse_statistic(statistic)
+        if reducer_name == "percentile":
+            reducer = ee.Reducer.percentile([percentile])
+        else:
+            reducer = getattr(ee.Reducer, reducer_name)()
+        reducer = reducer.combine(ee.Reducer.count(), sharedInputs=True)
+        reduced = (collection.filter(ee.Filter.inList('system:index', scene_ids))
+                   .map(lambda image: index_image(image, index_ranges))
+                   .reduce(reducer))
+        # Fix the band order and names whatever the reducer output order is
+        names = composite_band_names(list(index_ranges), statistic)
+        return reduced.select(names).toFloat()
+
+    # Reduce the "ndvi" band of (date, image) pairs over the features of a collection for every NDVI
+    # class [low, high): pixel count, mean and percentile per date, feature and class. Every image is
+    # reduced by one mapped reduceRegions on the server and the table is fetched in a single round trip.
+    # Zones are named by zone_property, or by feature id if empty. Returns dictionaries with the keys of
+    # ZONAL_COLUMNS; mean and percentile are None for the classes without any pixel.
+    def zonal_statistics(self, images, features, classes, percentile, scale=10, zone_property=""):
+        ee = self.ee
+        reducer = (ee.Reducer.mean()
+                   .combine(ee.Reducer.percentile([percentile], ['percentile']), sharedInputs=True)
+                   .combine(ee.Reducer.count(), sharedInputs=True))
+        zones = features.map(lambda feature: feature.set('zone', feature.get(zone_property) if zone_property
+                                                         else feature.id()))
+        collection = ee.ImageCollection([image.set('date', date) for date, image in images])
+
+        def reduce(image):
+            ndvi = image.select('ndvi')
+            table = None
+            for low, high in classes:
+                def label(feature, low=low, high=high):
+                    # Classes without any pixel get -1 instead of null, which reduceColumns would drop
+                    return feature.set({
+                        'date': image.get('date'), 'class_low': low, 'class_high': high,
+                        'mean': ee.List([feature.get('mean'), -1]).reduce(ee.Reducer.firstNonNull()),
+                        'percentile': ee.List([feature.get('percentile'), -1]).reduce(ee.Reducer.firstNonNull()),
+                    })
+
+                reduced = (ndvi.updateMask(ndvi.gte(low).And(ndvi.lt(high)))
+                           .reduceRegions(zones, reducer, scale).map(label))
+                table = reduced if table is None else table.merge(reduced)
+            return table
+
+        table = (ee.FeatureCollection(collection.map(reduce)).flatten()
+                 .reduceColumns(ee.Reducer.toList(len(ZONAL_COLUMNS)), ZONAL_COLUMNS).get('list'))
+        rows = [dict(zip(ZONAL_COLUMNS, row)) for row in self.get_info(table)]
+        for row in rows:
+            if not row['count']:
+                row['mean'] = row['percentile'] = None
+        return rows
+
+    # Get the URL of the pixels of the given bands on a chunk of the output grid (top-left corner x, y in
+    # CRS units) in the NPY format, masked pixels set to DOWNLOAD_NODATA (one blocking round trip)
+    def download_url(self, image, bands, crs, scale, x, y, width, height):
+        self.round_trips += 1
+        with timed_call(self.stats, "ee.download_url"):
+            return image.select(bands).toFloat().unmask(DOWNLOAD_NODATA).getDownloadURL({
+                'format': 'NPY',
+                'crs': crs,
+                'crs_transform': [scale, 0, x, 0, -scale, y],
+                'dimensions': f'{width}x{height}',
+            })
+
+    def export_to_drive(self, image, description, folder, scale, crs, region, max_pixels=1e13):
+        task = self.ee.batch.Export.image.toDrive(
+            image=image,
+            description=description,
+            scale=scale,
+            fileNamePrefix=description,
+            folder=folder,
+            maxPixels=max_pixels,
+            crs=crs,
+            region=region
+        )
+        with timed_call(self.stats, "ee.export"):
+            task.start()
+        return task
+
+    # Fetch the status dictionary of an export task, or of the task with the given id when task is a
+    # string (a task started by an earlier run), in one blocking round trip
+    def task_status(self, task):
+        self.round_trips += 1
+        with timed_call(self.stats, "ee.task_status") as call:
+            status = self.ee.data.getTaskStatus(task)[0] if isinstance(task, str) else task.status()
+            call["bytes"] = json_size(status)
+        return status
+
+
+# Lazy stand-in for any Earth Engine object. Method calls are recorded instead of being sent to
+# the server and getInfo() returns the value the object was created with.
+class FakeEEObject:
+    def __init__(self, name, value=None, ops=()):
+        self.name = name
+        self.value = value
+        self.ops = ops
+
+    def __getattr__(self, op):
+        if op.startswith("__"):
+            raise AttributeError(op)
+
+        def call(*args, **kwargs):
+            return FakeEEObject(self.name, self.value, self.ops + ((op, args, kwargs),))
+        return call
+
+    def getInfo(self):
+        return self.value
+
+
+# Filtered view of the in-memory scene list of a FakeEEClient
+class FakeImageCollection(FakeEEObject):
+    def __init__(self, scenes, ops=()):
+        super().__init__("ImageCollection", None, ops)
+        self.scenes = scenes
+
+
+# Export task that runs for `duration` seconds once started and then completes, or fails if `fail` is set
+class FakeExportTask:
+    def __init__(self, task_id, params, duration=0.0, fail=False):
+        self.id = task_id
+        self.params = params
+        self.duration = duration
+        self.fail = fail
+        self.started = None
+
+    def start(self):
+        self.started = time.time()
+
+    def status(self):
+        if self.started is None:
+            return {"state": "UNSUBMITTED"}
+        if time.time() - self.started < self.duration:
+            return {"state": "RUNNING"}
+        if self.fail:
+            return {"state": "FAILED", "error_message": "Simulated export failure"}
+        return {"state": "COMPLETED"}
+
+
+# In-memory Earth Engine client for running the pipeline without network access. Scenes are
+# dictionaries with the keys "id", "time_start" (milliseconds), "tile", "cloud" and optionally
+# "aoi_cloud" (percentage of cloudy pixels inside the AOI, -1 if unknown) and "footprint" (GeoJSON
+# polygon; scenes without one cover every AOI). `aoi` is the GeoJSON of every AOI asset, or a
+# dictionary of them by asset id. Exports take
+# export_duration seconds and the export named in `failures` fail that many times before succeeding.
+# Every round trip (get_info, scene table, export start, task status) waits `latency` seconds. The
+# export tasks are kept by id, like on the server, so a later run can poll the tasks of an earlier one.
+# Download URLs point to pixel_url, the address of a StubPixelServer.
+class FakeEEClient:
+    def __init__(self, scenes=(), aoi=None, export_duration=0.0, failures=None, latency=0.0, pixel_url=None):
+        self.scenes = [dict(scene) for scene in scenes]
+        self.aoi_geojson = aoi if aoi is not None else {
+            "type": "Polygon",
+            "coordinates": [[[-6.2, 53.3], [-6.1, 53.3], [-6.1, 53.4], [-6.2, 53.4], [-6.2, 53.3]]],
+        }
+        self.export_duration = export_duration
+        self.failures = dict(failures or {})
+        self.latency = latency
+        self.pixel_url = pixel_url
+        self.round_trips = 0
+        self.stats = None
+        self.exports = []
+        self._aois = {}
+
+    def _wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def get_info(self, obj):
+        self.round_trips += 1
+        with timed_call(self.stats, "ee.get_info") as call:
+            self._wait()
+            value = obj.getInfo()
+            call["bytes"] = json_size(value)
+        return value
+
+    def feature_collection(self, asset_id):
+        return FakeEEObject(asset_id, [self.aoi_geojson])
+
+    def features(self, geometries):
+        return FakeEEObject("FeatureCollection", list(geometries))
+
+    def aoi(self, asset_id, tolerance=10.0):
+        key = (asset_id, tolerance)
+        if key not in self._aois:
+            geojson = self.aoi_geojson.get(asset_id) if "type" not in self.aoi_geojson else self.aoi_geojson
+            region = self.get_info(FakeEEObject(asset_id, geojson))
+            self._aois[key] = (FakeEEObject("Geometry", region), region)
+        return self._aois[key]
+
+    def geometry(self, geojson, crs):
+        return FakeEEObject("Geometry", geojson, (("crs", (crs,), {}),))
+
+    def image_collection(self, geometry, cloudy_percentage, start_date, end_date, tiles=None):
+        start = _date_millis(start_date)
+        end = _date_millis(end_date)
+        scenes = [scene for scene in self.scenes
+                  if start <= scene["time_start"] < end and scene["cloud"] < cloudy_percentage
+                  and (not tiles or mgrs_tiles([scene["tile"]])[0] in mgrs_tiles(tiles))]
+        return FakeImageCollection(scenes, (("filterDate", (start_date, end_date), {}),))
+
+    def select_scenes(self, collection, scene_ids, geometry):
+        scene_ids = set(scene_ids)
+        return FakeImageCollection([scene for scene in collection.scenes if scene["id"] in scene_ids],
+                                   collection.ops + (("filter", ("system:index", tuple(sorted(scene_ids))), {}),))
+
+    def scene_table(self, collection, geometry=None, scale=20, sites=(), cloud_sites=()):
+        self.round_trips += 1
+        with timed_call(self.stats, "ee.get_info") as call:
+            self._wait()
+            rows = []
+            for scene in collection.scenes:
+                flags = [int(_bounds_intersect(scene.get("footprint"), site.value)) for site in sites]
+                rows.append((scene["id"], scene["time_start"], scene["tile"], scene["cloud"])
+                            + ((scene.get("aoi_cloud", -1),) if geometry is not None else ())
+                            + tuple(flags)
+                            + tuple(scene.get("aoi_cloud", -1) if flags[i] else -1 for i in cloud_sites))
+            call["bytes"] = json_size(rows)
+        return scenes_from_rows(rows, len(sites), cloud_sites)
+
+    def image(self, collection, scene_id):
+        return FakeEEObject(scene_id)
+
+    def mosaic(self, collection, scene_ids):
+        return FakeEEObject("mosaic", None, (("mosaic", tuple(scene_ids), {}),))
+
+    def composite(self, collection, scene_ids, index_ranges, statistic):
+        parse_statistic(statistic)
+        return FakeEEObject("composite", None, (("reduce", (tuple(scene_ids), statistic), {}),))
+
+    # Deterministic statistics for every date, feature (named by its index) and class in one round trip
+    def zonal_statistics(self, images, features, classes, percentile, scale=10, zone_property=""):
+        rows = []
+        for date, image in images:
+            day = datetime.date.fromisoformat(date).toordinal()
+            for zone in range(len(features.value)):
+                for i, (low, high) in enumerate(classes):
+                    count = (day * 31 + zone * 7 + i * 13) % 500
+                    fraction = (day % 10) / 10
+                    rows.append({"date": date, "zone": str(zone), "class_low": low, "class_high": high,
+                                 "count": count,
+                                 "mean": low + (high - low) * fraction if count else None,
+                                 "percentile": low + (high - low) * (fraction + 1) / 2 if count else None})
+        return self.get_info(FakeEEObject("Table", rows))
+
+    def download_url(self, image, bands, crs, scale, x, y, width, height):
+        self.round_trips += 1
+        with timed_call(self.stats, "ee.download_url"):
+            self._wait()
+            query = urllib.parse.urlencode(dict(bands=",".join(bands), crs=crs, scale=scale, x=x, y=y,
+                                                width=width, height=height))
+        return f"{self.pixel_url}?{query}"
+
+    def export_to_drive(self, image, description, folder, scale, crs, region, max_pixels=1e13):
+        fail = self.failures.get(description, 0) > 0
+        if fail:
+            self.failures[description] -= 1
+        task = FakeExportTask(f"FAKE{len(self.exports) + 1:06d}",
+                              dict(image=image, description=description, folder=folder,
+                                   scale=scale, crs=crs, region=region, maxPixels=max_pixels),
+                              self.export_duration, fail)
+        with timed_call(self.stats, "ee.export"):
+            self._wait()
+            task.start()
+        self.exports.append(task)
+        return task
+
+    def task_status(self, task):
+        self.round_trips += 1
+        with timed_call(self.stats, "ee.task_status") as call:
+            self._wait()
+            if isinstance(task, str):
+                task = next((export for export in self.exports if export.id == task), None)
+            status = task.status() if task is not None else {"state": "UNKNOWN"}
+            call["bytes"] = json_size(status)
+        return status
+
+
+# Whether the bounding boxes of two GeoJSON geometries intersect; a missing geometry covers everything
+def _bounds_intersect(first, second):
+    if not first or not second:
+        return True
+
+    def bounds(geojson):
+        points = geojson["coordinates"]
+        while isinstance(points[0][0], (list, tuple)):
+            points = [point for part in points for point in part]
+        xs, ys = [point[0] for point in points], [point[1] for point in points]
+        return min(xs), min(ys), max(xs), max(ys)
+
+    a, b = bounds(first), bounds(second)
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def _date_millis(date):
+    parsed = datetime.datetime.strptime(date, "%Y-%m-%d").replace(tzinfo=datetime.timezone.utc)
+    return int(parsed.timestamp() * 1000)
@@ -0,0 +1,712 @@
+import dataclasses
+import datetime
+import json
+import os
+import re
+
+from biointertidal_mapper.download import DEFAULT_CHUNK_SIZE, DEFAULT_MAX_PIXELS, ChunkDownloader, aoi_bounds, output_grid
+from biointertidal_mapper.ee_client import EarthEngineClient
+from biointertidal_mapper.exports import FINISHED_STATES, ExportManager, ExportRegistry
+from biointertidal_mapper.indices import (INDICES, composite_band_names, compute_index, get_index, index_image,
+                                          output_name, parse_statistic)
+from biointertidal_mapper.instrument import DEFAULT_REPORT_DIR, RunStats, write_report
+from biointertidal_mapper.ledger import RunLedger, run_key
+from biointertidal_mapper.matching import LowTideIndex, in_hour_window, time_zone
+from biointertidal_mapper.statistics import DEFAULT_CLASS_BREAKS, ndvi_classes, time_series_rows, write_time_series
+from biointertidal_mapper.tide_cache import TideCache
+from biointertidal_mapper.tides import WorldTidesBackend
+
+
+# Tile part of the file names of mosaicked outputs, e.g. ndvi_20220109_mosaic
+MOSAIC_TILE = "mosaic"
+
+
+# Parameters of a mapping run. Can be loaded from a JSON or YAML file with load_config().
+@dataclasses.dataclass
+class RunConfig:
+    lat: str
+    lon: str
+    start_date: str
+    end_date: str
+    tiles: list
+    geometry: str
+    epsg: str
+    folder_name: str
+    world_tides_key: str = ""
+    constituents_file: str = ""
+    start_hour: str = "10:00"
+    end_hour: str = "14:00"
+    # IANA time zone of the low tide time range (WorldTides times are UTC)
+    timezone: str = "UTC"
+    # When above 0, keep the scenes acquired within this many minutes of a low tide instead of the scenes
+    # of the dates with a low tide inside the time range
+    tide_tolerance_minutes: float = 0.0
+    cloudy_percentage: int = 30
+    # Maximum percentage of cloudy or cloud shadow pixels (SCL band) inside the AOI; 100 turns the AOI
+    # cloud screening off and only the scene-wide cloudy_percentage applies
+    aoi_cloud_percentage: float = 100.0
+    start_ndvi: float = 0.10
+    end_ndvi: float = 1.0
+    indices: list = dataclasses.field(default_factory=lambda: ["ndvi"])
+    index_ranges: dict = dataclasses.field(default_factory=dict)
+    ee_project: str = ""
+    # "earthengine" or "local" (Sentinel-2 L2A products on disk, see biointertidal_mapper.local)
+    backend: str = "earthengine"
+    # Mosaic the tiles acquired on the same date and export one image per date
+    mosaic: bool = False
+    # Reduce the selected scenes of every "season" or "month" to one composite image instead of
+    # exporting them one by one, with the per-pixel statistic "median", "max" or "pNN" (percentile)
+    composite: str = ""
+    composite_statistic: str = "median"
+    local_inputs: list = dataclasses.field(default_factory=list)
+    output_dir: str = ""
+    workers: int = 0
+    block_size: int = 1024
+    max_concurrent_exports: int = 3
+    export_poll_interval: float = 10.0
+    export_retries: int = 2
+    # Simplification tolerance of the AOI in metres, for the export region and the clipping (0 keeps it as is)
+    aoi_tolerance: float = 10.0
+    # Vertex budget of a local shapefile AOI sent inline to Earth Engine
+    aoi_max_vertices: int = 5000
+    # JSON run report (default: ~/.biointertidal_mapper/reports/<folder_name>_<time>.json) and, with
+    # profile, a cProfile dump next to it (.prof)
+    report_path: str = ""
+    profile: bool = False
+    # Skip the scenes and outputs already handled by earlier runs with the same site and parameters
+    # (see biointertidal_mapper.ledger)
+    incremental: bool = True
+    # Download the outputs straight to <output_dir or folder_name>/<name>.tif in parallel chunks instead of
+    # exporting them to Google Drive; outputs larger than download_max_pixels still go through an export
+    download: bool = False
+    download_max_pixels: int = DEFAULT_MAX_PIXELS
+    download_chunk_size: int = DEFAULT_CHUNK_SIZE
+    download_workers: int = 8
+    # Instead of exporting rasters, reduce the NDVI of every low tide date over the AOI features on the
+    # server (pixel count, vegetated area, mean and percentile per NDVI class) and write the time series
+    # to statistics_path (.csv or .parquet, default <output_dir>/habitat_statistics.csv)
+    statistics: bool = False
+    statistics_path: str = ""
+    statistics_classes: list = dataclasses.field(default_factory=lambda: list(DEFAULT_CLASS_BREAKS))
+    statistics_percentile: int = 90
+    # Property naming the features of an AOI asset in the statistics (default: feature id)
+    zone_property: str = ""
+
+    @classmethod
+    def from_dict(cls, values):
+        names = {field.name for field in dataclasses.fields(cls)}
+        unknown = set(values) - names
+        if unknown:
+            raise ValueError(f"Unknown run parameters: {', '.join(sorted(unknown))}")
+        values = dict(values)
+        for name in ("tiles", "indices", "statistics_classes"):
+            if isinstance(values.get(name), str):
+                values[name] = values[name].split(";")
+        if "statistics_classes" in values:
+            values["statistics_classes"] = [float(value) for value in values["statistics_classes"]]
+        for name in ("lat", "lon", "epsg"):
+            if name in values:
+                values[name] = str(values[name])
+        if "cloudy_percentage" in values:
+            values["cloudy_percentage"] = int(values["cloudy_percentage"])
+        if isinstance(values.get("local_inputs"), str):
+            values["local_inputs"] = [values["local_inputs"]]
+        for name in ("max_concurrent_exports", "export_retries", "workers", "block_size", "aoi_max_vertices",
+                     "download_max_pixels", "download_chunk_size", "download_workers", "statistics_percentile"):
+            if name in values:
+                values[name] = int(values[name])
+        for name in ("mosaic", "profile", "incremental", "download", "statistics"):
+            if isinstance(values.get(name), str):
+                values[name] = values[name].lower() in ("1", "true", "yes")
+        for name in ("start_ndvi", "end_ndvi", "export_poll_interval", "aoi_tolerance", "tide_tolerance_minutes",
+                     "aoi_cloud_percentage"):
+            if name in values:
+                values[name] = float(values[name])
+        return cls(**values)
+
+    def to_dict(self):
+        return dataclasses.asdict(self)
+
+    # Value range of every selected index, in export band order. The NDVI range comes from
+    # start_ndvi/end_ndvi, the others from index_ranges or the registry defaults.
+    def selected_index_ranges(self):
+        ranges = {}
+        for name in self.indices:
+            name = name.lower()
+            if name == "ndvi":
+                ranges[name] = (self.start_ndvi, self.end_ndvi)
+            else:
+                ranges[name] = tuple(self.index_ranges.get(name, get_index(name).value_range))
+        return ranges
+
+    def validate(self):
+        valid, error_message = validate_parameters(self.lat, self.lon, self.world_tides_key, self.tiles, self.geometry,
+                                                   self.epsg, self.start_hour, self.end_hour, self.start_date,
+                                                   self.end_date, self.cloudy_percentage, self.start_ndvi,
+                                                   self.end_ndvi, self.folder_name, self.constituents_file)
+        if not valid:
+            return valid, error_message
+
+        if self.backend not in ("earthengine", "local"):
+            return False, f"Unknown processing backend '{self.backend}'. Use 'earthengine' or 'local'."
+        if self.backend == "local":
+            if not self.local_inputs:
+                return False, "The local backend needs at least one SAFE folder or GeoTIFF folder in local_inputs."
+            if not is_local_shapefile(self.geometry) or not os.path.isfile(self.geometry):
+                return False, "The local backend needs the path of a local shapefile (.shp) as geometry."
+
+        if self.backend == "earthengine" and is_local_shapefile(self.geometry) and not os.path.isfile(self.geometry):
+            return False, f"Shapefile '{self.geometry}' does not exist."
+        try:
+            time_zone(self.timezone)
+        except (ValueError, KeyError, OSError):
+            return False, f"Unknown time zone '{self.timezone}'. Use an IANA name such as 'Europe/Dublin' or 'UTC'."
+        if not 0 <= self.aoi_cloud_percentage <= 100:
+            return False, "The AOI cloud percentage must be a number between 0 and 100."
+        if self.tide_tolerance_minutes < 0:
+            return False, "The tide tolerance must be 0 or a positive number of minutes."
+        if self.aoi_tolerance < 0:
+            return False, "The AOI simplification tolerance must be 0 or a positive number of metres."
+        if self.download and (self.download_chunk_size < 1 or self.download_workers < 1):
+            return False, "The download chunk size and number of download workers must be positive."
+        if self.statistics and self.backend != "earthengine":
+            return False, "The statistics mode needs the Earth Engine backend."
+        if not 0 <= self.statistics_percentile <= 100:
+            return False, "The statistics percentile must be between 0 and 100."
+        if self.composite not in ("", "season", "month"):
+            return False, f"Unknown composite period '{self.composite}'. Use 'season' or 'month'."
+        if self.composite:
+            try:
+                parse_statistic(self.composite_statistic)
+            except ValueError as error:
+                return False, str(error)
+
+        # Validate the selected spectral indices and their ranges
+        if not self.indices:
+            return False, "At least one spectral index must be selected."
+        for name in self.indices:
+            if name.lower() not in INDICES:
+                return False, f"Unknown spectral index '{name}'. Available indices: {', '.join(sorted(INDICES))}."
+        for name, (low, high) in self.selected_index_ranges().items():
+            if not low < high:
+                return False, f"The {name.upper()} range must go from a lower to a higher value."
+        return True, ""
+
+
+# Raised when a run is stopped through its cancel event
+class RunCancelled(Exception):
+    pass
+
+
+# Function definition for stopping a run between two steps once its cancel event (a threading.Event) is set
+def check_cancelled(cancel):
+    if cancel is not None and cancel.is_set():
+        raise RunCancelled("The run was cancelled.")
+
+
+# Outcome of a run
+@dataclasses.dataclass
+class RunResult:
+    scene_count: int = 0
+    dates_with_low_tides: list = dataclasses.field(default_factory=list)
+    exports: list = dataclasses.field(default_factory=list)
+    export_jobs: list = dataclasses.field(default_factory=list)
+    report_path: str = ""
+    statistics_path: str = ""
+
+
+# Function definition for reading a run configuration from a JSON or YAML file
+def load_config(path):
+    with open(path) as f:
+        if path.endswith((".yaml", ".yml")):
+            import yaml
+            values = yaml.safe_load(f)
+        else:
+            values = json.load(f)
+    return RunConfig.from_dict(values)
+
+
+# Function for validating the input parameters
+def validate_parameters(lat, lon, keyAPIWorldTides, tiles, geometry, epsg, start_hour, end_hour, start_date, end_date, cloudy_percentage, start_ndvi, end_ndvi, folder_name, constituents_file=""):
+    # Check if the fields are not empty. The WorldTides key is not needed when tides are predicted offline.
+    if not all([lat, lon, keyAPIWorldTides or constituents_file, tiles, geometry, epsg, folder_name]):
+        return False, "Fields must not be empty."
+
+    if constituents_file and not os.path.isfile(constituents_file):
+        return False, f"Tide constituents file '{constituents_file}' does not exist."
+
+    # Check tiles
+    for tile in tiles:
+        if len(tile) != 6:
+            return False, "Each tile number must be exactly 6 digits long. You can enter multiple tiles separated by ;"
+
+    # Validate start_hour and end_hour of low tide time range
+    try:
+        start_hour_hh, start_hour_mm = map(int, start_hour.split(':'))
+        end_hour_hh, end_hour_mm = map(int, end_hour.split(':'))
+        if not (0 <= start_hour_hh < 24 and 0 <= start_hour_mm < 60 and len(start_hour) == 5 and
+                0 <= end_hour_hh < 24 and 0 <= end_hour_mm < 60 and len(end_hour) == 5):
+            return False, "Low tide time range must be in the format 'HH:MM', for instance '00:24' or '14:30'."
+    except ValueError:
+        return False, "Invalid input. Please input time in the format 'HH:MM', for instance '00:24' or '14:30'."
+
+    date_pattern = re.compile(r'\d{4}-\d{2}-\d{2}')
+    if not (date_pattern.fullmatch(start_date) and date_pattern.fullmatch(end_date)):
+        return False, "Date range must be in the format 'YYYY-MM-DD'."
+
+    # Validate start_date and end_date - Start date must be after march 2017
+    if start_date < '2017-03-01':
+        return False, "Start date must be after March 2017."
+
+    # Validate cloudy_percentage
+    if not (0 <= cloudy_percentage <= 100):
+        return False, "Cloudy percentage must be an integer between 0 and 100."
+
+    # Validate start_ndvi and end_ndvi
+    if not (-1 <= start_ndvi <= 1 and -1 <= end_ndvi <= 1):
+        return False, "NDVI range must be values between -1 and 1. (for example, 0.10 or -0.5 are valid values)"
+
+    return True, ""
+
+
+# Function definition for choosing the tide backend of a run: offline predictions when a
+# constituents file is given, WorldTides through the shared tide cache otherwise
+def make_tide_backend(config, cache=None):
+    if config.constituents_file:
+        from biointertidal_mapper.harmonic import HarmonicTideBackend
+        return HarmonicTideBackend.from_file(config.constituents_file)
+    return WorldTidesBackend(config.world_tides_key, cache=cache or TideCache())
+
+
+# Function definition for telling a local shapefile path from an Earth Engine asset id
+def is_local_shapefile(geometry):
+    return geometry.lower().endswith(".shp")
+
+
+# Function definition for preparing the AOI of an Earth Engine run. A local shapefile is reprojected to
+# the output CRS, reduced to the vertex budget and sent inline (cached on disk by content hash);
+# an asset is fetched once and simplified on the server. Returns the geometry and the export region.
+def prepare_aoi(config, client):
+    if is_local_shapefile(config.geometry):
+        from biointertidal_mapper.shapefiles import load_aoi
+        crs = f"EPSG:{config.epsg}"
+        geometry = client.geometry(load_aoi(config.geometry, crs, config.aoi_tolerance, config.aoi_max_vertices), crs)
+        return geometry, geometry
+    return client.aoi(config.geometry, config.aoi_tolerance)
+
+
+# Function definition for queueing the export of an index image (or composite) to Google Drive.
+# region is the prepared AOI (GeoJSON of an asset or the inline geometry of a local shapefile).
+# force exports the image again even if an export with the same name completed earlier; task_id is the
+# task of an earlier run still exporting the same image, which is then polled instead of started again.
+def export(img, name, region, folder_name, epsg, exports, force=False, task_id=None):
+    job = exports.submit(
+        name,
+        img,
+        force=force,
+        task_id=task_id,
+        scale=10,
+        folder=folder_name,
+        crs=f"EPSG:{epsg}",
+        region=region
+    )
+
+    if job.state == "SKIPPED":
+        print(f"Image '{folder_name}/{name}' was already exported in an earlier run")
+    elif task_id:
+        print(f"Image '{folder_name}/{name}' is still being exported by an earlier run")
+    else:
+        print(f"Image '{folder_name}/{name}' queued for export")
+    print()
+    return name
+
+
+# Function definition for keeping the scenes whose AOI is clear enough, before any tide lookup. Scenes
+# without a valid pixel in the AOI are dropped too.
+def screen_aoi_clouds(scenes, max_percentage):
+    kept = [scene for scene in scenes if scene.get("aoi_cloud") is not None and scene["aoi_cloud"] <= max_percentage]
+    print(f"AOI cloud screening: {len(scenes) - len(kept)} of {len(scenes)} scenes have more than "
+          f"{max_percentage:g}% cloudy pixels inside the AOI or no data there")
+    return kept
+
+
+# Function definition for screening scenes through the run ledger. Only the scenes the ledger has not
+# seen for this run key are screened for low tide and their decisions are recorded before anything is
+# exported, so a crashed run resumes without screening again. Returns the (scene, extreme) pairs of
+# all the scenes acquired at low tide, old and new, in scene order.
+def screen_incremental(config, scenes, tide_backend, ledger, key, progress=None, cancel=None):
+    known = ledger.decisions(key)
+    new_scenes = [scene for scene in scenes if scene["id"] not in known]
+    if len(new_scenes) < len(scenes):
+        print(f"Run ledger: {len(scenes) - len(new_scenes)} scenes already evaluated, {len(new_scenes)} new")
+
+    decisions = {scene["id"]: None for scene in new_scenes if scene["tile"] in config.tiles}
+    for scene, extreme in screen_scenes(config, new_scenes, tide_backend, progress, cancel):
+        decisions[scene["id"]] = decisions[scene["id"]] or extreme
+    ledger.record_decisions(key, decisions)
+
+    known.update(decisions)
+    return [(scene, known[scene["id"]]) for scene in scenes if known.get(scene["id"])]
+
+
+# Function definition for the dates before and after a date (YYYY-MM-DD)
+def neighbour_dates(date):
+    day = datetime.date.fromisoformat(date)
+    return [(day + datetime.timedelta(days=offset)).isoformat() for offset in (-1, 1)]
+
+
+# Function definition for selecting the scenes of the requested tiles acquired at low tide. Returns
+# (scene, low tide extreme) pairs; progress, if given, is called with the fraction of scenes screened
+# and the screening stops with RunCancelled between tide requests or scenes once cancel is set.
+# With tide_tolerance_minutes the nearest low tide to the acquisition time of every scene is searched
+# in a sorted index of all the low tides of the run, including those of the neighbouring dates so
+# scenes close to midnight are matched to a low tide of the previous or next day. Otherwise a scene
+# matches the low tide of its date inside the start_hour-end_hour range of the configured time zone
+# that is nearest to its acquisition time. Every scene is matched at most once.
+def screen_scenes(config, scenes, tide_backend, progress=None, cancel=None):
+    lat, lon = config.lat, config.lon
+    start_hour, end_hour = config.start_hour, config.end_hour
+    tolerance = config.tide_tolerance_minutes
+    candidates = [scene for scene in scenes if scene["tile"] in config.tiles]
+    matches = []
+
+    # Fetch the tides of all the distinct candidate dates up front, in as few requests as possible
+    dates = {scene["date"] for scene in candidates}
+    if tolerance:
+        dates |= {neighbour for date in dates for neighbour in neighbour_dates(date)}
+    dates = sorted(dates)
+    tide_backend.prefetch(dates, lat, lon, cancel)
+    check_cancelled(cancel)
+
+    if tolerance:
+        index = LowTideIndex([extreme for date in dates for extreme in tide_backend.low_tide_extremes(date, lat, lon)])
+        nearest = index.nearest([scene["time_start"] // 1000 for scene in candidates], tolerance * 60)
+        for scene, extreme in zip(candidates, nearest):
+            if extreme is not None:
+                minutes = abs(extreme["dt"] - scene["time_start"] / 1000) / 60
+                print()
+                print(f"For image '{scene['id']}', the nearest low tide is at {extreme['date']}, {minutes:.0f} minutes from the acquisition")
+                print()
+                matches.append((scene, extreme))
+        if progress is not None:
+            progress(1.0)
+    else:
+        by_date = {date: in_hour_window(tide_backend.low_tide_extremes(date, lat, lon), start_hour, end_hour,
+                                        config.timezone)
+                   for date in dates}
+        for i, scene in enumerate(candidates):
+            check_cancelled(cancel)
+            if progress is not None:
+                progress((i + 1) / len(candidates))
+            if by_date[scene["date"]]:
+                extreme = min(by_date[scene["date"]], key=lambda extreme: abs(extreme["dt"] - scene["time_start"] / 1000))
+                hour = extreme['date'][11:16]
+                print()
+                print(f"For image '{scene['id']}', the nearest low tide between {start_hour} and {end_hour} on {scene['date']} is at {hour}")
+                print()
+                matches.append((scene, extreme))
+
+    print(tide_backend.summary())
+    return matches
+
+
+# Function definition for grouping screened (scene, extreme) pairs by acquisition date, keeping each
+# scene once and the scenes in acquisition order
+def group_by_date(matches):
+    dates = {}
+    for scene, extreme in matches:
+        date_scenes = dates.setdefault(scene["date"], [])
+        if scene not in date_scenes:
+            date_scenes.append(scene)
+    return dates
+
+
+# Meteorological seasons by month; December belongs to the winter of the following year
+SEASONS = {12: "DJF", 1: "DJF", 2: "DJF", 3: "MAM", 4: "MAM", 5: "MAM",
+           6: "JJA", 7: "JJA", 8: "JJA", 9: "SON", 10: "SON", 11: "SON"}
+
+
+# Function definition for the composite period of a date (YYYY-MM-DD): "2021-06" by month,
+# "2021-JJA" by season
+def composite_period(date, period):
+    year, month = int(date[:4]), int(date[5:7])
+    if period == "month":
+        return date[:7]
+    return f"{year + 1 if month == 12 else year}-{SEASONS[month]}"
+
+
+# Function definition for grouping screened (scene, extreme) pairs by composite period, keeping each
+# scene once
+def group_by_period(matches, period):
+    periods = {}
+    for date, date_scenes in group_by_date(matches).items():
+        periods.setdefault(composite_period(date, period), []).extend(date_scenes)
+    return periods
+
+
+# Function definition for the outputs of a run from its screened (scene, extreme) pairs: one composite
+# per period reduced on the server, one export per date when the tiles of a date are mosaicked on the
+# server, or one export per scene. Returns (name, scene ids) pairs.
+def build_outputs(config, matches):
+    names = list(config.selected_index_ranges())
+    if config.composite:
+        return [(output_name(names, period, config.composite_statistic), [scene["id"] for scene in period_scenes])
+                for period, period_scenes in group_by_period(matches, config.composite).items()]
+    if config.mosaic:
+        return [(output_name(names, date, MOSAIC_TILE), [scene["id"] for scene in date_scenes])
+                for date, date_scenes in group_by_date(matches).items()]
+    return [(output_name(names, scene["date"], scene["tile"]), [scene["id"]]) for scene, extreme in matches]
+
+
+# Function definition for waiting for the export tasks and reporting how each one really ended
+def finish_exports(exports, result, cancel=None):
+    print("Waiting for the export tasks to finish...")
+    result.export_jobs = exports.wait(cancel)
+    for job in result.export_jobs:
+        print(job.describe())
+    print(exports.summary())
+    print()
+
+
+# Function definition for computing the NDVI statistics of every low tide date (the tiles of a date
+# mosaicked) over the AOI features in one server-side reduction and writing them as a time series.
+# The features are those of the AOI asset, or the whole AOI for a local shapefile. Returns the path.
+def zonal_time_series(config, client, imgs, matches, geometry):
+    ndvi = get_index("ndvi")
+    value_range = (config.start_ndvi, config.end_ndvi)
+    images = [(date, compute_index(client.mosaic(imgs, [scene["id"] for scene in date_scenes]), ndvi, value_range))
+              for date, date_scenes in sorted(group_by_date(matches).items())]
+    if is_local_shapefile(config.geometry):
+        zones = client.features([geometry])
+    else:
+        zones = client.feature_collection(config.geometry)
+
+    classes = ndvi_classes(config.start_ndvi, config.end_ndvi, config.statistics_classes)
+    statistics = client.zonal_statistics(images, zones, classes, config.statistics_percentile,
+                                         zone_property=config.zone_property)
+    rows = time_series_rows(config.folder_name, statistics, config.statistics_percentile)
+    path = config.statistics_path or os.path.join(config.output_dir, "habitat_statistics.csv")
+    write_time_series(rows, path, config.folder_name, config.statistics_percentile)
+    print(f"NDVI statistics of {len(images)} dates, {len(classes)} NDVI classes written to {path}")
+    return path
+
+
+# Function definition for writing the JSON report of a run (stage times, network calls, outcome) and
+# the cProfile dump if the run was profiled. The WorldTides key is left out of the report.
+def write_run_report(config, stats, status, result=None, profiler=None):
+    path = config.report_path or os.path.join(
+        DEFAULT_REPORT_DIR, f"{config.folder_name}_{datetime.datetime.now():%Y%m%dT%H%M%S}.json")
+    report = {
+        "started": datetime.datetime.fromtimestamp(stats.started, datetime.timezone.utc).isoformat(),
+        "status": status,
+        "config": {name: value for name, value in config.to_dict().items() if name != "world_tides_key"},
+    }
+    if result is not None:
+        report.update(scene_count=result.scene_count, low_tide_scenes=len(result.dates_with_low_tides),
+                      outputs=len(result.exports))
+    report.update(stats.report())
+    write_report(report, path)
+    if profiler is not None:
+        profiler.dump_stats(os.path.splitext(path)[0] + ".prof")
+    print(f"Run report written to {path}")
+    return path
+
+
+# Function definition for processing Sentinel-2 images to find low tide dates and export index images
+# (NDVI by default) to Google Drive. progress, if given, is called with the completion percentage
+# (0-100). The run returns once every export task has finished. Setting the threading.Event cancel
+# stops the run with RunCancelled between tide requests, scenes and export status checks.
+# The time of every stage and the network calls are recorded in stats (a new RunStats by default)
+# and written to a JSON run report whatever the outcome of the run.
+def process(config, client=None, tide_backend=None, progress=None, exports=None, cancel=None, stats=None,
+            ledger=None):
+    stats = stats if stats is not None else RunStats()
+    if ledger is None and config.incremental:
+        ledger = RunLedger()
+    profiler = None
+    if config.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    result, status = None, "completed"
+    try:
+        if config.backend == "local":
+            from biointertidal_mapper.local import process_local
+            result = process_local(config, tide_backend, progress, cancel, stats, ledger)
+        else:
+            result = process_earthengine(config, client, tide_backend, progress, exports, cancel, stats, ledger)
+        return result
+    except RunCancelled:
+        status = "cancelled"
+        raise
+    except Exception as error:
+        status = f"failed: {error}"
+        raise
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        path = write_run_report(config, stats, status, result, profiler)
+        if result is not None:
+            result.report_path = path
+
+
+# Function definition for a run of process() on Earth Engine
+def process_earthengine(config, client, tide_backend, progress, exports, cancel, stats, ledger=None):
+    report = progress or (lambda value: None)
+    result = RunResult()
+
+    if client is None:
+        client = EarthEngineClient()
+    if tide_backend is None:
+        tide_backend = make_tide_backend(config)
+    if exports is None:
+        exports = ExportManager(client, config.max_concurrent_exports, config.export_poll_interval,
+                                config.export_retries, ExportRegistry())
+    client.stats = stats
+    tide_backend.stats = stats
+
+    # Prepare the AOI once, as a single simplified geometry used for filtering, clipping and every export region
+    with stats.stage("aoi"):
+        geometry, region = prepare_aoi(config, client)
+
+    report(10)
+
+    # Get the image collection of the requested tiles and fetch the metadata of all its images in a
+    # single request
+    with stats.stage("scene_query"):
+        imgs = client.image_collection(geometry, config.cloudy_percentage, config.start_date, config.end_date,
+                                       config.tiles)
+        if config.aoi_cloud_percentage < 100:
+            # The AOI cloud percentages come with the scene metadata in the same request
+            scenes = screen_aoi_clouds(client.scene_table(imgs, geometry), config.aoi_cloud_percentage)
+        else:
+            scenes = client.scene_table(imgs)
+
+    result, outputs = process_site(config, client, tide_backend, imgs, scenes, geometry, region, report, exports,
+                                   cancel, stats, ledger)
+    report(100)
+    return result
+
+
+# Function definition for the part of a run that follows the scene query, for one site: tide screening
+# of its scenes, then the statistics, downloads or export submissions of its outputs. With wait the
+# export tasks are waited for and their final state recorded in the ledger; batch runs sharing one
+# export manager do it once for all sites with record_export_jobs(). Returns the RunResult and the
+# (name, scene ids) pairs of the outputs.
+def process_site(config, client, tide_backend, imgs, scenes, geometry, region, report, exports, cancel, stats,
+                 ledger=None, wait=True):
+    result = RunResult(scene_count=len(scenes))
+    index_ranges = config.selected_index_ranges()
+
+    report(40)
+    key = run_key(config)
+    with stats.stage("tide_screening"):
+        if ledger is not None:
+            matches = screen_incremental(config, scenes, tide_backend, ledger, key,
+                                         lambda fraction: report(40 + 30 * fraction), cancel)
+        else:
+            matches = screen_scenes(config, scenes, tide_backend, lambda fraction: report(40 + 30 * fraction), cancel)
+
+    result.dates_with_low_tides = [scene["date"] for scene, extreme in matches]
+
+    # Restrict the collection on the server to the scenes acquired at low tide before clipping them
+    imgs = client.select_scenes(imgs, {scene["id"] for scene, extreme in matches}, geometry)
+
+    if config.statistics:
+        if not matches:
+            print("No images were found that meet the conditions.")
+        else:
+            with stats.stage("statistics"):
+                result.statistics_path = zonal_time_series(config, client, imgs, matches, geometry)
+        return result, []
+
+    names = list(index_ranges)
+    outputs = build_outputs(config, matches)
+
+    def output_image(scene_ids):
+        if config.composite:
+            return client.composite(imgs, scene_ids, index_ranges, config.composite_statistic)
+        if config.mosaic:
+            return index_image(client.mosaic(imgs, scene_ids), index_ranges)
+        return index_image(client.image(imgs, scene_ids[0]), index_ranges)
+
+    # Outputs small enough are downloaded directly; the AOI grid is the same for all of them
+    downloader = None
+    if config.download and outputs:
+        bounds = aoi_bounds(config, region)
+        left, top, width, height = output_grid(bounds, 10)
+        if width * height <= config.download_max_pixels:
+            downloader = ChunkDownloader(client, config.download_workers, config.download_chunk_size)
+            downloader.stats = stats
+        else:
+            print(f"The AOI covers {width * height} pixels, more than download_max_pixels "
+                  f"({config.download_max_pixels}): the outputs are exported to Google Drive instead")
+    bands = composite_band_names(names, config.composite_statistic) if config.composite else names
+    output_dir = config.output_dir or config.folder_name
+
+    done = ledger.outputs(key) if ledger is not None else {}
+    with stats.stage("export_submission" if downloader is None else "download"):
+        for i, (name, scene_ids) in enumerate(outputs):
+            if cancel is not None and cancel.is_set():
+                exports.cancel()
+                # Keep the ids of the tasks already running so a resumed run polls them
+                record_export_jobs(config, ledger, outputs[:i], exports.jobs)
+                check_cancelled(cancel)
+            report(70 + 30 * (i + 1) / len(outputs))
+            if ledger is not None and ledger.is_done(key, name, scene_ids, done):
+                print(f"Image '{config.folder_name}/{name}' was already exported in an earlier run")
+                print()
+                result.exports.append(name)
+                continue
+            if downloader is not None:
+                path = os.path.join(output_dir, f"{name}.tif")
+                # The ledger decides when there is one: a file left by a run with other parameters is replaced
+                if os.path.exists(path) and ledger is None:
+                    print(f"Image '{path}' already exists, skipped")
+                else:
+                    downloader.download(output_image(scene_ids), bands, bounds, f"EPSG:{config.epsg}", 10, path, cancel)
+                    check_cancelled(cancel)
+                    print(f"Image '{path}' downloaded")
+                print()
+                if ledger is not None:
+                    ledger.record_output(key, name, scene_ids, "COMPLETED")
+                result.exports.append(name)
+                continue
+            # An output exported earlier from other scenes (a composite that gained scenes) is exported
+            # again; one whose task is still in flight from an earlier run is only polled. The ledger
+            # overrides the registry, which only knows file names: an output this parameter set never
+            # recorded is exported even if a run with other parameters wrote a file of the same name.
+            status, recorded_scenes, task_id = done.get(name, (None, None, None))
+            changed = ledger is not None and recorded_scenes != sorted(scene_ids)
+            if changed or status in FINISHED_STATES:
+                task_id = None
+            if ledger is not None:
+                ledger.record_output(key, name, scene_ids, "QUEUED", task_id)
+            result.exports.append(export(output_image(scene_ids), name, region, config.folder_name, config.epsg,
+                                         exports, force=changed, task_id=task_id))
+
+    if not result.dates_with_low_tides:
+        print("No images were found that meet the conditions.")
+    elif downloader is not None:
+        check_cancelled(cancel)
+        outputs = []
+    elif wait:
+        print()
+        with stats.stage("export_wait"):
+            finish_exports(exports, result, cancel)
+        record_export_jobs(config, ledger, outputs, result.export_jobs)
+        check_cancelled(cancel)
+    return result, outputs
+
+
+# Function definition for recording in the ledger the final state of the export jobs of a site's
+# outputs (jobs of other folders are ignored)
+def record_export_jobs(config, ledger, outputs, jobs):
+    if ledger is None:
+        return
+    key = run_key(config)
+    scene_ids = dict(outputs)
+    for job in jobs:
+        if job.params.get("folder") == config.folder_name and job.name in scene_ids:
+            ledger.record_output(key, job.name, scene_ids[job.name], job.state, job.task_id)
@@ -0,0 +1,262 @@
+import collections
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Default location of the record of completed exports, shared by every run
+DEFAULT_REGISTRY_PATH = os.path.join(os.path.expanduser("~"), ".biointertidal_mapper", "exports.sqlite")
+
+FINISHED_STATES = ("COMPLETED", "FAILED", "CANCELLED", "SKIPPED")
+
+
+# Persistent record of the exports that completed, keyed by Drive folder and file name. It is an
+# SQLite database so runs in parallel processes add their entries without overwriting each other's;
+# the entries of the JSON registry of earlier versions (exports.json next to it) are imported once.
+class ExportRegistry:
+    def __init__(self, path=None):
+        self.path = path or os.environ.get("BIOINTERTIDAL_EXPORT_REGISTRY", DEFAULT_REGISTRY_PATH)
+        self._lock = threading.Lock()
+
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS exports (
+                folder TEXT NOT NULL,
+                name TEXT NOT NULL,
+                completed TEXT NOT NULL,
+                seconds REAL NOT NULL,
+                PRIMARY KEY (folder, name)
+            )""")
+        self._conn.commit()
+        if self.path != ":memory:":
+            self._import_json(os.path.join(os.path.dirname(os.path.abspath(self.path)), "exports.json"))
+
+    def _import_json(self, path):
+        try:
+            with open(path) as f:
+                completed = json.load(f)
+        except (OSError, ValueError):
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO exports VALUES (?, ?, ?, ?)",
+                [(*key.rsplit("/", 1), entry["completed"], entry["seconds"])
+                 for key, entry in completed.items() if "/" in key])
+            self._conn.commit()
+        os.replace(path, path + ".imported")
+
+    def is_completed(self, folder, name):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM exports WHERE folder=? AND name=?",
+                                      (folder, name)).fetchone() is not None
+
+    def mark_completed(self, folder, name, seconds):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO exports VALUES (?, ?, ?, ?)",
+                               (folder, name, time.strftime("%Y-%m-%dT%H:%M:%S"), round(seconds, 1)))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ExportJob:
+    def __init__(self, name, image, params):
+        self.name = name
+        self.image = image
+        self.params = params
+        self.state = "QUEUED"
+        self.attempts = 0
+        self.error = None
+        self.task = None
+        self.queued_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    # Earth Engine id of the task of the last attempt, None until it is submitted
+    @property
+    def task_id(self):
+        if self.task is None or isinstance(self.task, str):
+            return self.task
+        return getattr(self.task, "id", None)
+
+    # Seconds the last attempt spent in the Earth Engine task queue
+    @property
+    def task_seconds(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def describe(self):
+        where = f"{self.params['folder']}/{self.name}"
+        if self.state == "SKIPPED":
+            return f"Export '{where}': already completed in an earlier run, skipped"
+        minutes, seconds = divmod(int(self.task_seconds), 60)
+        line = f"Export '{where}': {self.state} after {minutes}m {seconds:02d}s ({self.attempts} attempt{'s' if self.attempts != 1 else ''})"
+        if self.error:
+            line += f" - {self.error}"
+        return line
+
+
+# Submits Drive exports with at most max_concurrent tasks running at once and polls their status on
+# a background thread. Failed tasks are resubmitted up to max_retries times and exports already
+# completed in an earlier run (according to the registry) are skipped unless submitted with force.
+# An export submitted with the id of a task started by an earlier run (task_id) is not started again:
+# the task is polled like the others and only resubmitted if it fails or Earth Engine no longer knows it.
+# Submitting a file of a folder that is already queued or running returns its job instead of a new one.
+class ExportManager:
+    def __init__(self, client, max_concurrent=3, poll_interval=10.0, max_retries=2, registry=None, on_finished=None):
+        self.client = client
+        self.max_concurrent = max_concurrent
+        self.poll_interval = poll_interval
+        self.max_retries = max_retries
+        self.registry = registry
+        self.on_finished = on_finished
+        self.jobs = []
+        self._queue = collections.deque()
+        self._active = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closing = False
+        self._cancelled = False
+        self._thread = None
+
+    def submit(self, name, image, force=False, task_id=None, **params):
+        job = ExportJob(name, image, params)
+        job.task = task_id
+        with self._lock:
+            # The same file is never exported twice at once: a job still queued or running is returned
+            for existing in self.jobs:
+                if (existing.name == name and existing.params.get("folder") == params.get("folder")
+                        and existing.state not in FINISHED_STATES):
+                    return existing
+            self.jobs.append(job)
+            if not force and self.registry is not None and self.registry.is_completed(params["folder"], name):
+                job.state = "SKIPPED"
+            else:
+                self._queue.append(job)
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="export-manager", daemon=True)
+                    self._thread.start()
+        if job.state == "SKIPPED" and self.on_finished is not None:
+            self.on_finished(job)
+        self._wake.set()
+        return job
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if self._cancelled:
+                    return
+            try:
+                self._pump()
+            except Exception as error:
+                # Keep polling: a failure of one status check or callback must not strand the other jobs
+                print(f"Export manager error: {error}")
+            with self._lock:
+                idle = not self._queue and not self._active
+                if idle and self._closing:
+                    return
+            self._wake.wait(None if idle else self.poll_interval)
+            self._wake.clear()
+
+    def _finish(self, job, state):
+        job.state = state
+        job.finished_at = time.time()
+        try:
+            if state == "COMPLETED" and self.registry is not None:
+                self.registry.mark_completed(job.params["folder"], job.name, job.task_seconds)
+            if self.on_finished is not None:
+                self.on_finished(job)
+        except Exception as error:
+            print(f"Export '{job.params['folder']}/{job.name}': could not record its completion: {error}")
+
+    def _pump(self):
+        for job in list(self._active):
+            try:
+                status = self.client.task_status(job.task)
+            except Exception as error:
+                job.error = str(error)
+                continue
+            state = status.get("state", "UNKNOWN")
+            if state == "UNKNOWN" and isinstance(job.task, str):
+                # Task of an earlier run that Earth Engine no longer knows: submit the export again
+                self._active.remove(job)
+                job.task = None
+                job.state = "RETRYING"
+                with self._lock:
+                    self._queue.append(job)
+            elif state == "COMPLETED":
+                self._active.remove(job)
+                job.error = None
+                self._finish(job, state)
+            elif state in ("FAILED", "CANCELLED"):
+                self._active.remove(job)
+                job.error = status.get("error_message")
+                if state == "FAILED" and job.attempts <= self.max_retries:
+                    job.state = "RETRYING"
+                    with self._lock:
+                        self._queue.append(job)
+                else:
+                    self._finish(job, state)
+            else:
+                job.state = state
+
+        while len(self._active) < self.max_concurrent:
+            with self._lock:
+                if not self._queue:
+                    break
+                job = self._queue.popleft()
+            job.attempts += 1
+            job.started_at = time.time()
+            job.finished_at = None
+            if job.attempts == 1 and job.task is not None:
+                # Task started by an earlier run and still in flight: only polled
+                job.state = "SUBMITTED"
+                self._active.append(job)
+                continue
+            try:
+                job.task = self.client.export_to_drive(job.image, job.name, **job.params)
+            except Exception as error:
+                job.error = str(error)
+                if job.attempts <= self.max_retries:
+                    job.state = "RETRYING"
+                    with self._lock:
+                        self._queue.append(job)
+                    break
+                self._finish(job, "FAILED")
+                continue
+            job.state = "SUBMITTED"
+            self._active.append(job)
+
+    # Drop the exports that were not submitted yet and stop polling. Tasks already submitted keep
+    # running in Earth Engine.
+    def cancel(self):
+        with self._lock:
+            self._cancelled = True
+            cancelled = list(self._queue)
+            self._queue.clear()
+        for job in cancelled:
+            self._finish(job, "CANCELLED")
+        self._wake.set()
+
+    # Block until every submitted export has finished and return the jobs. If the threading.Event
+    # `cancel` is set meanwhile, the remaining exports are cancelled.
+    def wait(self, cancel=None):
+        with self._lock:
+            self._closing = True
+            thread = self._thread
+        self._wake.set()
+        while thread is not None and thread.is_alive():
+            thread.join(None if cancel is None else 0.5)
+            if cancel is not None and cancel.is_set() and not self._cancelled:
+                self.cancel()
+        return self.jobs
+
+    def summary(self):
+        counts = collections.Counter(job.state for job in self.jobs)
+        return "Exports: " + ", ".join(f"{count} {state.lower()}" for state, count in sorted(counts.items()))
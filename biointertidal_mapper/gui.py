@@ -0,0 +1,316 @@
+import queue
+import sys
+import threading
+import tkinter as tk
+from tkinter import messagebox
+from tkinter import ttk
+from tkinter.scrolledtext import ScrolledText
+
+from biointertidal_mapper.engine import RunCancelled, RunConfig, process
+from biointertidal_mapper.tides import TideAPIError
+
+# Default values of the input fields, in field order
+default_values = [
+    "53.35293", "-6.16435", "0d53af43-ce61-4660-812c-9ed6fc49190a", "", "120", "10:00", "14:00", "UTC", "2021-06-01", "2021-08-30", "30", "T29UPV", "0.10", "1", "ndvi", "projects/ee-saraharo/assets/DollymountStrand_32629", "32629", "Dollymount_Strand"
+]
+
+fields = [
+    {"label": "Latitude:", "entry": "lat_entry"},
+    {"label": "Longitude:", "entry": "lon_entry"},
+    {"label": "API Key of World Tides:", "entry": "key_entry"},
+    {"label": "Tide constituents file (optional):", "entry": "constituents_entry"},
+    {"label": "Low tide tolerance (minutes):", "entry": "tolerance_entry"},
+    {"label": "Low Tide Time Range (HH:MM):", "entry": ["start_hour_entry", "end_hour_entry"]},
+    {"label": "Time zone of the time range:", "entry": "timezone_entry"},
+    {"label": "Date Range (YYYY-MM-DD):", "entry": ["start_date_entry", "end_date_entry"]},
+    {"label": "Maximum cloud percentage:", "entry": "cloudy_percentage_entry"},
+    {"label": "Tile numbers fields:", "entry": "tile_entry"},
+    {"label": "NDVI Range:", "entry": ["start_ndvi_entry", "end_ndvi_entry"]},
+    {"label": "Indices (ndvi;evi;fai):", "entry": "indices_entry"},
+    {"label": "Geometry (GEE asset or local .shp):", "entry": "geometry_entry"},
+    {"label": "CRS(EPSG):", "entry": "epsg_entry"},
+    {"label": "Folder name (in your Google Drive):", "entry": "folder_name_entry"},
+]
+
+HELP_TIME_RANGE = "Assuming the Sentinel-2 satellite passes over the study area at 11:00 UTC, and the study area observes a time difference of +1 UTC, the satellite would have acquired the image at 12:00 UTC (+1). To ensure that only images captured during low tide are selected, a 2-hour time window will be applied. Consequently, in the aforementioned example, solely those images will be chosen where low tide took place 2 hours prior or post image acquisition, i.e., between 10:00 and 14:00. The satellite acquisition time is indicated in the image filename."
+
+HELP_TOLERANCE = "Images are selected when a low tide occurs within this many minutes of their own acquisition time, e.g. 120 keeps the images acquired up to 2 hours before or after a low tide, including low tides of the previous or next day. Enter 0 to use the low tide time range instead: an image is then selected when a low tide of its acquisition date falls between the two times, read in the given time zone (e.g. UTC or Europe/Dublin)."
+
+HELP_TILES = "You can enter multiple tiles separated by semicolons without spaces. For example: T29UPV;T29UQV"
+
+
+# Class definition for sending the text written to stdout to the console text widget through the queue
+class OutputText:
+    def __init__(self, messages):
+        self.messages = messages
+
+    def write(self, s):
+        self.messages.put(("log", s))
+
+    def flush(self):
+        pass
+
+
+# Main window of the mapper. The engine runs in a worker thread which sends its output, progress and
+# widget updates through a queue ("log", text), ("progress", value) or ("call", function, args) that
+# the Tk main loop drains, so Tk widgets are only touched by the main loop.
+class MapperWindow:
+    def __init__(self, root):
+        self.root = root
+        self.messages = queue.Queue()
+        # Set by the Cancel button to stop the running process between tide requests and scenes
+        self.cancel_event = threading.Event()
+
+        root.title("BioIntertidal Mapper")
+
+        # Create login button
+        self.login_button = tk.Button(root, text="Login in Google Earth Engine", command=self.authenticate)
+        self.login_button.grid(row=0, column=0, columnspan=2, pady=(20, 20))
+
+        self.entry_fields = []
+        initial_state = "disabled"
+
+        def create_range_entries(row, width):
+            start_entry = tk.Entry(root, state=initial_state, width=width)
+            start_entry.grid(row=row, column=1, padx=(10, 5), pady=(5, 5), sticky="W")
+
+            to_label = tk.Label(root, text="to")
+            to_label.grid(row=row, column=1)
+
+            end_entry = tk.Entry(root, state=initial_state, width=width)
+            end_entry.grid(row=row, column=1, padx=(5, 35), pady=(5, 5), sticky="E")
+
+            return [start_entry, end_entry]
+
+        for i, field in enumerate(fields):
+            label = tk.Label(root, text=field["label"])
+            label.grid(row=i+1, column=0, padx=(25,10), pady=(5, 5), sticky="W")
+
+            if field["label"] == "Low Tide Time Range (HH:MM):":
+                help_button1 = tk.Button(root, text="?", width=1, height=1,
+                                         command=lambda: messagebox.showinfo("Help", HELP_TIME_RANGE))
+                help_button1.grid(row=i+1, column=0, padx=(0, 5), pady=(5, 5), sticky="E")
+                entries = create_range_entries(i+1, 8)
+
+            elif field["label"] == "Low tide tolerance (minutes):":
+                help_button3 = tk.Button(root, text="?", width=1, height=1,
+                                         command=lambda: messagebox.showinfo("Help", HELP_TOLERANCE))
+                help_button3.grid(row=i+1, column=0, padx=(0, 5), pady=(5, 5), sticky="E")
+                entry = tk.Entry(root, state=initial_state, width=38)
+                entry.grid(row=i+1, column=1, padx=(0,25), pady=(5, 5))
+                entries = [entry]
+
+            elif field["label"] == "Tile numbers fields:":
+                help_button2 = tk.Button(root, text="?", width=1, height=1,
+                                         command=lambda: messagebox.showinfo("Help", HELP_TILES))
+                help_button2.grid(row=i+1, column=0, padx=(0, 5), pady=(5, 5), sticky="E")
+                entry = tk.Entry(root, state=initial_state, width=38)
+                entry.grid(row=i+1, column=1, padx=(0,25), pady=(5, 5))
+                entries = [entry]
+
+            elif field["label"] == "Date Range (YYYY-MM-DD):":
+                entries = create_range_entries(i+1, 13)
+
+            elif field["label"] == "NDVI Range:":
+                entries = create_range_entries(i+1, 8)
+
+            else:
+                entry = tk.Entry(root, state=initial_state, width=38)
+                entry.grid(row=i+1, column=1, padx=(0,25), pady=(5, 5))
+                entries = [entry]
+
+            names = field["entry"] if isinstance(field["entry"], list) else [field["entry"]]
+            for name, entry in zip(names, entries):
+                setattr(self, name, entry)
+            self.entry_fields.extend(entries)
+
+        # Create execute button
+        self.run_button = tk.Button(root, text="Execute", command=self.run_in_thread, state="disabled", width=20, height=2)
+        self.run_button.grid(row=len(fields)+2, column=1, pady=(25,0))
+
+        # Create cancel button
+        self.cancel_button = tk.Button(root, text="Cancel", command=self.cancel_run, state="disabled", width=10, height=2)
+        self.cancel_button.grid(row=len(fields)+2, column=0, pady=(25,0))
+
+        # Create label "Output"
+        console_output_title = tk.Label(root, text="Output:")
+        console_output_title.grid(row=0, column=3)
+
+        # Create the text widget to display the console output
+        self.console_output_text = ScrolledText(root, wrap=tk.WORD, width=50, height=15, state="disabled")
+        self.console_output_text.grid(row=1, column=3, rowspan=len(fields)//2, padx=25, sticky="N")
+
+        # Create the label "Dates with images acquired during low tide":
+        tide_dates_title = tk.Label(root, text="Dates with images acquired during low tide:")
+        tide_dates_title.grid(row=len(fields)//2 + 1, column=3, pady=(10,5))
+
+        # Create the text widget to display the dates with tides
+        self.tide_dates_text = ScrolledText(root, wrap=tk.WORD, width=50, height=9, state="disabled")
+        self.tide_dates_text.grid(row=len(fields)//2 + 2, column=3, rowspan=len(fields)//2, padx=25, pady=(0,5), sticky="N")
+
+        # Create the Clear button
+        clear_button = tk.Button(root, text="Clear console", command=self.clear_console_output, width=10, height=1)
+        clear_button.grid(row=len(fields) + 2, column=3, padx=25, pady=(25, 25), sticky="NE")
+
+        # Create labels Haro, S. and email
+        sara_label = tk.Label(root, text="Haro, S.")
+        sara_label.grid(row=len(fields) + 3, column=3, padx=25, sticky="E")
+        sara_label2 = tk.Label(root, text="haropaez.sara@gmail.com")
+        sara_label2.grid(row=len(fields) + 4, column=3, padx=25, pady=(2,15), sticky="E")
+
+        self.progress_bar = ttk.Progressbar(root, orient="horizontal", length=300, mode="determinate")
+        self.progress_bar.grid(row=len(fields) + 3, column=1, columnspan=2, pady=(15, 0))
+
+    # Running a function in the Tk main loop from the worker thread
+    def post(self, function, *args):
+        self.messages.put(("call", function, args))
+
+    # Draining the queue in the Tk main loop every 100 ms. The text of all pending log messages is
+    # inserted at once and only the last progress value is applied.
+    def pump_queue(self):
+        text, progress, calls = [], None, []
+        try:
+            while True:
+                message = self.messages.get_nowait()
+                if message[0] == "log":
+                    text.append(message[1])
+                elif message[0] == "progress":
+                    progress = message[1]
+                else:
+                    calls.append(message[1:])
+        except queue.Empty:
+            pass
+
+        if text:
+            self.console_output_text.config(state="normal")  # Enable text widget for writing
+            self.console_output_text.insert(tk.END, "".join(text))  # Insert text
+            self.console_output_text.see(tk.END)  # Scroll view to end
+            self.console_output_text.config(state="disabled")  # Disable text widget for read-only
+        if progress is not None:
+            self.progress_bar['value'] = progress
+        for function, args in calls:
+            function(*args)
+        self.root.after(100, self.pump_queue)
+
+    # Clearing the contents of the two text widgets
+    def clear_console_output(self):
+        self.console_output_text.config(state="normal")
+        self.console_output_text.delete(1.0, tk.END)
+        self.console_output_text.config(state="disabled")
+        self.tide_dates_text.config(state="normal")
+        self.tide_dates_text.delete(1.0, tk.END)
+        self.tide_dates_text.config(state="disabled")
+        self.progress_bar['value'] = 0
+
+    # Authenticating a connection to the Google Earth Engine API
+    def authenticate(self):
+        try:
+            import ee
+        except ImportError:
+            messagebox.showerror("Error", "The Earth Engine library is not installed. "
+                                          "Install it with: pip install earthengine-api")
+            return
+        ee.Authenticate()
+        ee.Initialize()
+        self.login_button.config(state="disabled")
+        self.enable_fields()
+
+    # Enabling and filling in default values for text input fields
+    def enable_fields(self):
+        for i, entry in enumerate(self.entry_fields):
+            entry.config(state="normal")
+            entry.insert(0, default_values[i])  # Insert default value
+        self.run_button.config(state="normal")  # Enable button to execute process function
+
+    # Updating the text widget with a list of dates
+    def update_tide_dates_text(self, dates):
+        self.tide_dates_text.config(state="normal")
+        self.tide_dates_text.delete(1.0, tk.END)
+        self.tide_dates_text.insert(tk.END, "\n".join(dates))
+        self.tide_dates_text.config(state="disabled")
+
+    # Moving the progress bar, called by the engine while it runs
+    def set_progress(self, value):
+        self.messages.put(("progress", value))
+
+    # Re-enabling the buttons once a run has ended
+    def finish_run(self):
+        self.progress_bar['value'] = 100
+        self.run_button.config(state="normal")
+        self.cancel_button.config(state="disabled")
+
+    # Stopping the running process at the next scene or tide request
+    def cancel_run(self):
+        self.cancel_event.set()
+        self.cancel_button.config(state="disabled")
+        print("Cancelling...")
+
+    # Running the engine with the values of the input fields (in the worker thread)
+    def run(self):
+        try:
+            # Get the values from the input fields
+            config = RunConfig(
+                lat=self.lat_entry.get(),
+                lon=self.lon_entry.get(),
+                world_tides_key=self.key_entry.get(),
+                constituents_file=self.constituents_entry.get(),
+                tide_tolerance_minutes=float(self.tolerance_entry.get() or 0),
+                start_hour=self.start_hour_entry.get(),
+                end_hour=self.end_hour_entry.get(),
+                timezone=self.timezone_entry.get().strip() or "UTC",
+                start_date=self.start_date_entry.get(),
+                end_date=self.end_date_entry.get(),
+                cloudy_percentage=int(self.cloudy_percentage_entry.get()),
+                tiles=self.tile_entry.get().split(";"),
+                start_ndvi=float(self.start_ndvi_entry.get()),
+                end_ndvi=float(self.end_ndvi_entry.get()),
+                indices=[name.strip().lower() for name in self.indices_entry.get().split(";") if name.strip()],
+                geometry=self.geometry_entry.get(),
+                epsg=self.epsg_entry.get(),
+                folder_name=self.folder_name_entry.get(),
+            )
+
+            # Validate the parameters
+            valid, error_message = config.validate()
+            if not valid:
+                self.post(messagebox.showerror, "Error", error_message)
+                return
+
+            # Run the engine with the input values
+            result = process(config, progress=self.set_progress, cancel=self.cancel_event)
+            if result.dates_with_low_tides:
+                self.post(self.update_tide_dates_text, result.dates_with_low_tides)
+        except RunCancelled:
+            print("Run cancelled.")
+        except TideAPIError as error:
+            self.post(messagebox.showerror, "Error", str(error))
+        except ValueError as ve:
+            self.post(messagebox.showerror, "Error", f"Invalid input value: {ve}")
+        except Exception as e:
+            self.post(messagebox.showerror, "Error", f"An unexpected error occurred: {e}")
+        finally:
+            self.post(self.finish_run)
+
+    def run_in_thread(self):
+        self.run_button.config(state="disabled")
+        self.cancel_button.config(state="normal")
+        self.cancel_event.clear()
+        self.clear_console_output()
+        main_thread = threading.Thread(target=self.run, daemon=True)
+        main_thread.start()
+
+
+# Function definition for the GUI entry point: creates the window, redirects stdout to its console
+# while it is open and runs the Tk main loop
+def main():
+    root = tk.Tk()
+    window = MapperWindow(root)
+
+    # Redirect standard output (stdout) to the text widget
+    stdout = sys.stdout
+    sys.stdout = OutputText(window.messages)
+    try:
+        root.after(100, window.pump_queue)
+        root.mainloop()
+    finally:
+        sys.stdout = stdout
@@ -0,0 +1,185 @@
+import argparse
+import datetime
+import json
+
+import numpy as np
+
+from biointertidal_mapper.tides import TideBackend, low_tides
+
+# Angular speeds (degrees per hour) of the usual tidal constituents. A constituent that is not
+# listed here must give its own "speed" in the constituents file.
+CONSTITUENT_SPEEDS = {
+    "M2": 28.9841042, "S2": 30.0, "N2": 28.4397295, "K2": 30.0821373,
+    "K1": 15.0410686, "O1": 13.9430356, "P1": 14.9589314, "Q1": 13.3986609,
+    "2N2": 27.8953548, "MU2": 27.9682084, "NU2": 28.5125831, "L2": 29.5284789,
+    "T2": 29.9589333, "M4": 57.9682084, "MS4": 58.9841042, "MN4": 57.4238337,
+    "M6": 86.9523127, "MF": 1.0980331, "MM": 0.5443747, "SA": 0.0410686, "SSA": 0.0821373,
+}
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def _utc(date):
+    parsed = datetime.datetime.strptime(date, "%Y-%m-%d")
+    return parsed.replace(tzinfo=datetime.timezone.utc)
+
+
+def _format_extreme(dt, height, kind):
+    when = EPOCH + datetime.timedelta(seconds=int(dt))
+    return {"dt": int(dt), "date": when.strftime("%Y-%m-%dT%H:%M+0000"), "height": round(float(height), 3), "type": kind}
+
+
+# Offline tide backend predicting the tide from harmonic constituents. The constituents file is a
+# JSON document such as:
+#
+#   {"reference_time": "2000-01-01T00:00:00Z", "mean_level": 2.1,
+#    "constituents": [{"name": "M2", "amplitude": 1.33, "phase": 326.0}, ...]}
+#
+# where phases are lags in degrees relative to reference_time, amplitudes are in metres and
+# optional "speed" (degrees per hour) and "nodal_factor" values override the defaults.
+class HarmonicTideBackend(TideBackend):
+    def __init__(self, constituents, reference_time, mean_level=0.0, step_minutes=6):
+        self.names = [c["name"] for c in constituents]
+        self.amplitudes = np.array([c["amplitude"] * c.get("nodal_factor", 1.0) for c in constituents])
+        self.phases = np.radians([c["phase"] for c in constituents])
+        self.speeds = np.radians([c.get("speed", CONSTITUENT_SPEEDS.get(c["name"].upper())) for c in constituents])
+        self.reference = reference_time.timestamp()
+        self.mean_level = mean_level
+        self.step = step_minutes * 60
+        self.extremes_by_date = {}
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        with open(path) as f:
+            spec = json.load(f)
+        for constituent in spec["constituents"]:
+            if "speed" not in constituent and constituent["name"].upper() not in CONSTITUENT_SPEEDS:
+                raise ValueError(f"Unknown tidal constituent '{constituent['name']}' without a speed in {path}")
+        reference = datetime.datetime.fromisoformat(spec.get("reference_time", "1970-01-01T00:00:00").replace("Z", "+00:00"))
+        if reference.tzinfo is None:
+            reference = reference.replace(tzinfo=datetime.timezone.utc)
+        return cls(spec["constituents"], reference, spec.get("mean_level", 0.0), **kwargs)
+
+    # Tide height (metres) at an array of epoch seconds
+    def heights(self, times):
+        hours = (np.asarray(times, dtype=float) - self.reference)[:, None] / 3600.0
+        return self.mean_level + np.cos(hours * self.speeds - self.phases) @ self.amplitudes
+
+    # Compute every high and low tide between two dates (both included) in one vectorized pass
+    def extremes_between(self, start_date, end_date):
+        start = _utc(start_date).timestamp()
+        end = (_utc(end_date) + datetime.timedelta(days=1)).timestamp()
+        times = np.arange(start - self.step, end + 2 * self.step, self.step, dtype=float)
+
+        # Sign changes of the time derivative locate the extremes on the sampling grid
+        hours = (times - self.reference)[:, None] / 3600.0
+        rate = -np.sin(hours * self.speeds - self.phases) @ (self.amplitudes * self.speeds)
+        turning = np.nonzero(np.sign(rate[:-1]) != np.sign(rate[1:]))[0]
+        turning = turning[rate[turning] != rate[turning + 1]]
+
+        # Refine each extreme by linear interpolation of the derivative's zero crossing
+        fraction = rate[turning] / (rate[turning] - rate[turning + 1])
+        when = times[turning] + fraction * self.step
+        is_low = rate[turning] < 0
+        inside = (when >= start) & (when < end)
+        when, is_low = when[inside], is_low[inside]
+        height = self.heights(when)
+
+        return [_format_extreme(dt, h, "Low" if low else "High") for dt, h, low in zip(when, height, is_low)]
+
+    # Predict the whole date range of a run at once and index the extremes by date
+    def prefetch(self, dates, lat, lon, cancel=None):
+        dates = sorted(set(dates) - set(self.extremes_by_date))
+        if not dates:
+            return
+        for date in dates:
+            self.extremes_by_date[date] = []
+        for extreme in self.extremes_between(dates[0], dates[-1]):
+            day = extreme["date"][:10]
+            if day in self.extremes_by_date:
+                self.extremes_by_date[day].append(extreme)
+
+    # Get every extreme of a date; lat and lon are implied by the constituents file
+    def extremes(self, date, lat=None, lon=None):
+        if date not in self.extremes_by_date:
+            self.prefetch([date], lat, lon)
+        return self.extremes_by_date[date]
+
+    def low_tide_extremes(self, date, lat, lon):
+        return low_tides(self.extremes(date, lat, lon))
+
+    def summary(self):
+        return f"Tide predictions computed offline from {len(self.names)} harmonic constituents"
+
+
+# Function definition for comparing the harmonic predictions with the WorldTides extremes stored
+# in a TideCache for the same location. Each cached extreme is matched with the nearest predicted
+# extreme of the same type.
+def validate_against_cache(backend, cache, lat, lon, datum=None):
+    lat, lon = cache.snap(lat, lon)
+    observed = [extreme for entry_lat, entry_lon, date, entry_datum, extremes in cache.entries()
+                if (entry_lat, entry_lon) == (lat, lon) and entry_datum == (datum or "default")
+                for extreme in extremes]
+    if not observed:
+        return None
+
+    dates = sorted({extreme["date"][:10] for extreme in observed})
+    predicted = backend.extremes_between(dates[0], dates[-1])
+
+    report = {"extremes": len(observed), "dates": len(dates)}
+    time_errors = []
+    height_errors = []
+    for kind in ("Low", "High"):
+        predicted_times = np.array([e["dt"] for e in predicted if e["type"] == kind], dtype=float)
+        predicted_heights = np.array([e["height"] for e in predicted if e["type"] == kind])
+        observed_kind = [e for e in observed if e["type"] == kind]
+        if not observed_kind or not len(predicted_times):
+            continue
+        observed_times = np.array([e["dt"] for e in observed_kind], dtype=float)
+        if len(predicted_times) == 1:
+            nearest = np.zeros(len(observed_times), dtype=int)
+        else:
+            index = np.clip(np.searchsorted(predicted_times, observed_times), 1, len(predicted_times) - 1)
+            before = np.abs(predicted_times[index - 1] - observed_times)
+            after = np.abs(predicted_times[index] - observed_times)
+            nearest = np.where(before <= after, index - 1, index)
+        time_errors.append((predicted_times[nearest] - observed_times) / 60.0)
+        height_errors.append(predicted_heights[nearest] - np.array([e["height"] for e in observed_kind]))
+
+    if not time_errors:
+        return report
+
+    time_errors = np.concatenate(time_errors)
+    height_errors = np.concatenate(height_errors)
+    report.update({
+        "time_error_mean_abs_minutes": round(float(np.mean(np.abs(time_errors))), 1),
+        "time_error_max_abs_minutes": round(float(np.max(np.abs(time_errors))), 1),
+        "time_error_rms_minutes": round(float(np.sqrt(np.mean(time_errors ** 2))), 1),
+        # WorldTides heights depend on the requested datum, so the offset is reported apart from the spread
+        "height_offset_m": round(float(np.mean(height_errors)), 3),
+        "height_error_std_m": round(float(np.std(height_errors)), 3),
+    })
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Validate harmonic tide predictions against cached WorldTides extremes")
+    parser.add_argument("constituents", help="JSON file with the harmonic constituents of the site")
+    parser.add_argument("--lat", type=float, required=True)
+    parser.add_argument("--lon", type=float, required=True)
+    parser.add_argument("--cache", help="Path of the tide cache (defaults to the shared cache)")
+    parser.add_argument("--datum")
+    args = parser.parse_args(argv)
+
+    from biointertidal_mapper.tide_cache import TideCache
+    cache = TideCache(args.cache)
+    report = validate_against_cache(HarmonicTideBackend.from_file(args.constituents), cache, args.lat, args.lon, args.datum)
+    if report is None:
+        print("No cached WorldTides extremes for this location.")
+        return 1
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,82 @@
+import dataclasses
+
+
+# Definition of a spectral index: a band expression over Sentinel-2 bands and the default range of
+# values kept in the exported image (values outside the open interval are masked)
+@dataclasses.dataclass(frozen=True)
+class SpectralIndex:
+    name: str
+    expression: str
+    bands: dict
+    value_range: tuple
+
+
+# Registry of the indices the mapper can compute, by lower-case name
+INDICES = {}
+
+
+def register_index(index):
+    INDICES[index.name] = index
+    return index
+
+
+register_index(SpectralIndex(
+    "ndvi", "(NIR - RED) / (NIR + RED)",
+    {"NIR": "B8", "RED": "B4"}, (0.10, 1.0)))
+
+register_index(SpectralIndex(
+    "evi", "2.5 * (NIR - RED) / (NIR + 6 * RED - 7.5 * BLUE + 1)",
+    {"NIR": "B8", "RED": "B4", "BLUE": "B2"}, (-1.0, 1.0)))
+
+# Floating Algae Index, with the central wavelengths (micrometres) of B8 (0.842), B5 (0.705) and B11 (1.610)
+register_index(SpectralIndex(
+    "fai", "NIR - (REDEDGE + (SWIR - REDEDGE) * (0.842 - 0.705) / (1.610 - 0.705))",
+    {"NIR": "B8", "REDEDGE": "B5", "SWIR": "B11"}, (0.0, 3.0)))
+
+
+def get_index(name):
+    try:
+        return INDICES[name.lower()]
+    except KeyError:
+        raise ValueError(f"Unknown spectral index '{name}'. Available indices: {', '.join(sorted(INDICES))}")
+
+
+# Function definition for computing one index on an image and masking the values outside its range
+def compute_index(img, index, value_range=None):
+    low, high = value_range if value_range is not None else index.value_range
+    variables = {variable: img.select(band).toFloat() for variable, band in index.bands.items()}
+    band = img.expression(index.expression, variables).rename(index.name)
+    return band.updateMask(band.gt(low)).updateMask(band.lt(high))
+
+
+# Function definition for computing a set of indices on an image as a single multi-band image.
+# index_ranges maps index names to (low, high) ranges, in band order.
+def index_image(img, index_ranges):
+    bands = [compute_index(img, get_index(name), value_range) for name, value_range in index_ranges.items()]
+    stacked = bands[0]
+    for band in bands[1:]:
+        stacked = stacked.addBands(band)
+    return stacked
+
+
+# Function definition for parsing a per-pixel composite statistic: "median", "max" or a percentile
+# such as "p90". Returns (reducer name, percentile or None).
+def parse_statistic(statistic):
+    statistic = statistic.lower()
+    if statistic in ("median", "max"):
+        return statistic, None
+    if statistic.startswith("p") and statistic[1:].isdigit() and 0 <= int(statistic[1:]) <= 100:
+        return "percentile", int(statistic[1:])
+    raise ValueError(f"Unknown composite statistic '{statistic}'. Use median, max or a percentile such as p90.")
+
+
+# Band names of a composite image: the statistic and the number of valid observations of every index,
+# e.g. ndvi_median, ndvi_count
+def composite_band_names(index_names, statistic):
+    return [f"{name}_{suffix}" for name in index_names for suffix in (statistic.lower(), "count")]
+
+
+# Function definition for building the output file name of an image, e.g. ndvi_20210601_T29UPV or
+# ndvi_evi_20210601_T29UPV when several indices are exported together
+def output_name(index_names, img_date, tile):
+    return (f"{'_'.join(index_names)}_{img_date}_{tile}").replace('-', '')
@@ -0,0 +1,102 @@
+import contextlib
+import json
+import os
+import threading
+import time
+
+# Upper bounds (milliseconds) of the latency histogram buckets of network calls
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Default folder of the JSON run reports
+DEFAULT_REPORT_DIR = os.path.join(os.path.expanduser("~"), ".biointertidal_mapper", "reports")
+
+
+# Wall-clock time per stage and count, bytes and latency of the network calls of every backend
+# ("ee.get_info", "worldtides", ...) during a run. Calls may be recorded from any thread.
+class RunStats:
+    def __init__(self):
+        self.started = time.time()
+        self.stages = {}
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    # Attribute the wall-clock time of the block to a stage (added up if the stage is entered again)
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def record_call(self, backend, seconds, size=0):
+        with self._lock:
+            calls = self.calls.setdefault(backend, {"calls": 0, "bytes": 0, "latencies": []})
+            calls["calls"] += 1
+            calls["bytes"] += size
+            calls["latencies"].append(seconds)
+
+    def call_count(self, backend=None):
+        with self._lock:
+            return sum(calls["calls"] for name, calls in self.calls.items() if backend in (None, name))
+
+    def report(self):
+        with self._lock:
+            calls = {name: _call_report(calls) for name, calls in sorted(self.calls.items())}
+            stages = {name: round(seconds, 3) for name, seconds in self.stages.items()}
+        return {"wall_seconds": round(time.time() - self.started, 3), "stages": stages, "calls": calls}
+
+
+def _call_report(calls):
+    latencies = sorted(calls["latencies"])
+    histogram = {f"<={bound}ms": 0 for bound in LATENCY_BUCKETS_MS}
+    histogram[f">{LATENCY_BUCKETS_MS[-1]}ms"] = 0
+    for seconds in latencies:
+        milliseconds = seconds * 1000
+        bucket = next((f"<={bound}ms" for bound in LATENCY_BUCKETS_MS if milliseconds <= bound),
+                      f">{LATENCY_BUCKETS_MS[-1]}ms")
+        histogram[bucket] += 1
+
+    def percentile(fraction):
+        return round(latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] * 1000, 1)
+
+    return {
+        "calls": calls["calls"],
+        "bytes": calls["bytes"],
+        "seconds": round(sum(latencies), 3),
+        "latency_ms": {"p50": percentile(0.5), "p95": percentile(0.95), "max": percentile(1.0),
+                       "histogram": histogram},
+    }
+
+
+# Function definition for timing a network call of `backend` when a run records statistics (stats
+# may be None). The block can set "bytes" in the yielded dictionary.
+@contextlib.contextmanager
+def timed_call(stats, backend):
+    if stats is None:
+        yield {}
+        return
+    info = {"bytes": 0}
+    start = time.perf_counter()
+    try:
+        yield info
+    finally:
+        stats.record_call(backend, time.perf_counter() - start, info["bytes"])
+
+
+# Function definition for the size in bytes of a decoded JSON value, as an estimate of a response size
+def json_size(value):
+    try:
+        return len(json.dumps(value, separators=(",", ":")))
+    except (TypeError, ValueError):
+        return 0
+
+
+# Function definition for writing a JSON run report atomically; returns its path
+def write_report(report, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        json.dump(report, f, indent=1)
+    os.replace(path + ".tmp", path)
+    return path
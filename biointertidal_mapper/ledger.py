@@ -0,0 +1,99 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Default location of the run ledger, shared by every run and every site
+DEFAULT_LEDGER_PATH = os.path.join(os.path.expanduser("~"), ".biointertidal_mapper", "ledger.sqlite")
+
+# Run parameters that do not change which scenes are selected or what is exported; runs that only
+# differ by these share their ledger entries (so extending the date range reuses earlier runs)
+LEDGER_IGNORED_PARAMETERS = ("start_date", "end_date", "world_tides_key", "ee_project", "output_dir", "local_inputs",
+                             "workers", "block_size", "max_concurrent_exports", "export_poll_interval",
+                             "export_retries", "report_path", "profile", "incremental", "download_chunk_size",
+                             "download_workers", "statistics", "statistics_path", "statistics_classes",
+                             "statistics_percentile", "zone_property")
+
+
+# Function definition for the ledger key of a run: a hash of its site and parameter set
+def run_key(config):
+    values = {name: value for name, value in config.to_dict().items() if name not in LEDGER_IGNORED_PARAMETERS}
+    return hashlib.sha256(json.dumps(values, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+# Persistent record, per run key, of the tide decision of every scene evaluated and of the status of
+# every output. A run only screens the scenes the ledger has not seen and only exports the outputs
+# that did not complete with the same scenes, so runs are incremental and resume after a crash. The
+# Earth Engine task id of every submitted export is kept so a resumed run polls the tasks still in
+# flight instead of exporting their images again.
+class RunLedger:
+    def __init__(self, path=None):
+        self.path = path or os.environ.get("BIOINTERTIDAL_RUN_LEDGER", DEFAULT_LEDGER_PATH)
+        self._lock = threading.Lock()
+
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS scenes (
+                run TEXT NOT NULL,
+                scene_id TEXT NOT NULL,
+                extreme TEXT,
+                evaluated REAL NOT NULL,
+                PRIMARY KEY (run, scene_id)
+            );
+            CREATE TABLE IF NOT EXISTS outputs (
+                run TEXT NOT NULL,
+                name TEXT NOT NULL,
+                scenes TEXT NOT NULL,
+                status TEXT NOT NULL,
+                updated REAL NOT NULL,
+                task_id TEXT,
+                PRIMARY KEY (run, name)
+            );""")
+        # Ledgers written before task ids were recorded
+        if "task_id" not in [row[1] for row in self._conn.execute("PRAGMA table_info(outputs)")]:
+            self._conn.execute("ALTER TABLE outputs ADD COLUMN task_id TEXT")
+        self._conn.commit()
+
+    # Tide decisions of the scenes already evaluated: {scene id: low tide extreme, or None if rejected}
+    def decisions(self, run):
+        with self._lock:
+            rows = self._conn.execute("SELECT scene_id, extreme FROM scenes WHERE run=?", (run,)).fetchall()
+        return {scene_id: json.loads(extreme) if extreme else None for scene_id, extreme in rows}
+
+    # Record the decisions of newly evaluated scenes, given as {scene id: extreme or None}
+    def record_decisions(self, run, decisions):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO scenes VALUES (?, ?, ?, ?)",
+                [(run, scene_id, json.dumps(extreme) if extreme else None, now)
+                 for scene_id, extreme in decisions.items()])
+            self._conn.commit()
+
+    # Status of the outputs: {name: (status, sorted scene ids, Earth Engine task id or None)}
+    def outputs(self, run):
+        with self._lock:
+            rows = self._conn.execute("SELECT name, scenes, status, task_id FROM outputs WHERE run=?",
+                                      (run,)).fetchall()
+        return {name: (status, json.loads(scenes), task_id) for name, scenes, status, task_id in rows}
+
+    def record_output(self, run, name, scene_ids, status, task_id=None):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO outputs (run, name, scenes, status, updated, task_id) "
+                               "VALUES (?, ?, ?, ?, ?, ?)",
+                               (run, name, json.dumps(sorted(scene_ids)), status, time.time(), task_id))
+            self._conn.commit()
+
+    # Whether an output completed earlier with exactly the same scenes
+    def is_done(self, run, name, scene_ids, outputs=None):
+        outputs = outputs if outputs is not None else self.outputs(run)
+        status, scenes, task_id = outputs.get(name, (None, None, None))
+        return status in ("COMPLETED", "SKIPPED") and scenes == sorted(scene_ids)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,275 @@
+import concurrent.futures
+import datetime
+import functools
+import glob
+import math
+import os
+import re
+import warnings
+import xml.etree.ElementTree as ElementTree
+
+from biointertidal_mapper.engine import (MOSAIC_TILE, RunResult, check_cancelled, group_by_date, group_by_period,
+                                         make_tide_backend, screen_incremental, screen_scenes)
+from biointertidal_mapper.ledger import run_key
+from biointertidal_mapper.indices import composite_band_names, get_index, output_name, parse_statistic
+from biointertidal_mapper.instrument import RunStats
+from biointertidal_mapper.shapefiles import read_shapefile, reproject_geometries, geometries_bounds
+
+# Band file names of Sentinel-2 L2A products, e.g. T29UPV_20210601T114349_B04_10m.jp2 inside a SAFE
+# folder or the same name as a GeoTIFF
+BAND_FILE = re.compile(r"T(?P<tile>\d{2}[A-Z]{3})_(?P<time>\d{8}T\d{6})_(?P<band>B\d{2}|B8A)(?:_(?P<res>\d+)m)?\.(jp2|tif|tiff)$",
+                       re.IGNORECASE)
+
+
+# Function definition for converting an Earth Engine band name (B8) to the L2A file band name (B08)
+def local_band(name):
+    return name if name.upper() == "B8A" else f"B{int(name[1:]):02d}"
+
+
+def _safe_cloud_percentage(path, cache):
+    folder = os.path.dirname(path)
+    while folder and not folder.upper().endswith(".SAFE"):
+        parent = os.path.dirname(folder)
+        if parent == folder:
+            return None
+        folder = parent
+    if folder not in cache:
+        cache[folder] = None
+        metadata = os.path.join(folder, "MTD_MSIL2A.xml")
+        if os.path.isfile(metadata):
+            for element in ElementTree.parse(metadata).iter():
+                if element.tag.endswith("Cloud_Coverage_Assessment") and element.text:
+                    cache[folder] = float(element.text)
+                    break
+    return cache[folder]
+
+
+# Function definition for listing the Sentinel-2 scenes found in SAFE folders or folders of band
+# GeoTIFFs. Scenes have the same keys as the Earth Engine scene table plus the band file paths.
+def find_local_scenes(inputs):
+    scenes = {}
+    clouds = {}
+    for location in inputs:
+        paths = glob.glob(os.path.join(location, "**", "*"), recursive=True) if os.path.isdir(location) else [location]
+        for path in sorted(paths):
+            match = BAND_FILE.search(os.path.basename(path))
+            if not match:
+                continue
+            tile, acquired = match.group("tile").upper(), match.group("time").upper()
+            scene = scenes.get((tile, acquired))
+            if scene is None:
+                when = datetime.datetime.strptime(acquired, "%Y%m%dT%H%M%S").replace(tzinfo=datetime.timezone.utc)
+                scene = scenes[(tile, acquired)] = {
+                    "id": f"{acquired}_T{tile}",
+                    "time_start": int(when.timestamp() * 1000),
+                    "date": when.strftime("%Y-%m-%d"),
+                    "tile": f"T{tile}",
+                    "cloud": _safe_cloud_percentage(path, clouds),
+                    "bands": {},
+                    "resolutions": {},
+                }
+            # Keep the finest resolution available for every band
+            band, resolution = match.group("band").upper(), int(match.group("res") or 0)
+            if band not in scene["bands"] or resolution < scene["resolutions"][band]:
+                scene["bands"][band] = path
+                scene["resolutions"][band] = resolution
+    return sorted(scenes.values(), key=lambda scene: scene["time_start"])
+
+
+# Function definition for computing the index bands of one block of the output grid. Runs in a worker
+# process: every band file is opened and warped onto the output grid for the block only. With several
+# scenes (a mosaic of tiles from the same date) pixels without data in a scene are filled from the next one.
+def compute_block(scene_band_paths, indices, grid, window, aoi):
+    import numpy as np
+    import rasterio
+    from rasterio.enums import Resampling
+    from rasterio.features import geometry_mask
+    from rasterio.vrt import WarpedVRT
+    from rasterio.windows import Window, transform as window_transform
+
+    crs, transform, width, height = grid
+    block = Window(*window)
+    values = {}
+    for band_paths in scene_band_paths:
+        for band, path in band_paths.items():
+            with rasterio.open(path) as src, WarpedVRT(src, crs=crs, transform=transform, width=width, height=height,
+                                                       resampling=Resampling.nearest) as vrt:
+                data = vrt.read(1, window=block).astype("float32")
+            # Digital number 0 marks pixels without data in L2A products
+            data[data == 0] = np.nan
+            if band in values:
+                missing = np.isnan(values[band])
+                values[band][missing] = data[missing]
+            else:
+                values[band] = data
+
+    inside = geometry_mask(aoi, out_shape=(block.height, block.width),
+                           transform=window_transform(block, transform), invert=True)
+    bands = []
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for expression, variables, (low, high) in indices:
+            index = eval(expression, {"__builtins__": {}}, {variable: values[band] for variable, band in variables.items()})
+            index = np.asarray(index, dtype="float32")
+            index[~((index > low) & (index < high)) | ~inside] = np.nan
+            bands.append(index)
+    return window, np.stack(bands)
+
+
+# Function definition for reducing the index bands of several scenes on one block of the output grid to
+# the composite statistic and the count of valid observations of every index (see composite_band_names)
+def reduce_block(scene_band_paths, indices, grid, window, aoi, statistic):
+    import numpy as np
+
+    stack = np.stack([compute_block([band_paths], indices, grid, window, aoi)[1] for band_paths in scene_band_paths])
+    reducer, percentile = parse_statistic(statistic)
+    with warnings.catch_warnings():
+        # Pixels without any valid observation are expected and stay NaN
+        warnings.simplefilter("ignore", RuntimeWarning)
+        if reducer == "median":
+            reduced = np.nanmedian(stack, axis=0)
+        elif reducer == "max":
+            reduced = np.nanmax(stack, axis=0)
+        else:
+            reduced = np.nanpercentile(stack, percentile, axis=0)
+    bands = np.empty((2 * len(indices),) + stack.shape[2:], dtype="float32")
+    bands[0::2] = reduced
+    bands[1::2] = (~np.isnan(stack)).sum(axis=0)
+    return window, bands
+
+
+# Function definition for writing the selected indices of a scene (or of the mosaic of several scenes),
+# clipped to the AOI, to a GeoTIFF. With a statistic the scenes are reduced to a composite instead.
+# The output grid is split into blocks of block_size pixels computed on a pool of worker processes,
+# so memory use is bounded whatever the size of the AOI.
+def write_scene(scenes, index_ranges, aoi, crs, scale, path, workers=0, block_size=1024, statistic=None):
+    import rasterio
+    from rasterio.transform import from_origin
+
+    minx, miny, maxx, maxy = geometries_bounds(aoi)
+    minx, maxy = math.floor(minx / scale) * scale, math.ceil(maxy / scale) * scale
+    width = max(1, math.ceil((maxx - minx) / scale))
+    height = max(1, math.ceil((maxy - miny) / scale))
+    transform = from_origin(minx, maxy, scale, scale)
+    grid = (crs, transform, width, height)
+
+    indices = []
+    scene_band_paths = [{} for scene in scenes]
+    for name, value_range in index_ranges.items():
+        index = get_index(name)
+        variables = {variable: local_band(band) for variable, band in index.bands.items()}
+        for scene, band_paths in zip(scenes, scene_band_paths):
+            missing = [band for band in variables.values() if band not in scene["bands"]]
+            if missing:
+                raise ValueError(f"Scene '{scene['id']}' has no {', '.join(missing)} band files for {name.upper()}")
+            band_paths.update({band: scene["bands"][band] for band in variables.values()})
+        indices.append((index.expression, variables, value_range))
+
+    if statistic:
+        compute = functools.partial(reduce_block, statistic=statistic)
+        descriptions = composite_band_names(list(index_ranges), statistic)
+    else:
+        compute = compute_block
+        descriptions = list(index_ranges)
+
+    windows = [(col, row, min(block_size, width - col), min(block_size, height - row))
+               for row in range(0, height, block_size) for col in range(0, width, block_size)]
+
+    profile = dict(driver="GTiff", width=width, height=height, count=len(descriptions), dtype="float32", crs=crs,
+                   transform=transform, nodata=float("nan"), tiled=True, blockxsize=256, blockysize=256,
+                   compress="deflate")
+    with rasterio.open(path, "w", **profile) as dst:
+        dst.descriptions = tuple(descriptions)
+
+        def write(result):
+            (col, row, w, h), data = result
+            dst.write(data, window=rasterio.windows.Window(col, row, w, h))
+
+        if workers == 1 or len(windows) == 1:
+            for window in windows:
+                write(compute(scene_band_paths, indices, grid, window, aoi))
+            return
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers or None) as executor:
+            # Keep a bounded number of blocks in flight so finished blocks are written as they arrive
+            limit = 2 * (workers or os.cpu_count() or 1)
+            pending = set()
+            for window in windows:
+                pending.add(executor.submit(compute, scene_band_paths, indices, grid, window, aoi))
+                if len(pending) >= limit:
+                    done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        write(future.result())
+            for future in concurrent.futures.as_completed(pending):
+                write(future.result())
+
+
+# Function definition for running the mapper on local Sentinel-2 L2A products instead of Earth Engine.
+# Scenes are screened for low tide exactly like in process() and written as
+# <output_dir>/<index names>_<date>_<tile>.tif, clipped to the local shapefile given as geometry.
+def process_local(config, tide_backend=None, progress=None, cancel=None, stats=None, ledger=None):
+    report = progress or (lambda value: None)
+    result = RunResult()
+    stats = stats if stats is not None else RunStats()
+    if tide_backend is None:
+        tide_backend = make_tide_backend(config)
+    tide_backend.stats = stats
+
+    index_ranges = config.selected_index_ranges()
+    crs = f"EPSG:{config.epsg}"
+    with stats.stage("aoi"):
+        geometries, source_crs = read_shapefile(config.geometry)
+        aoi = reproject_geometries(geometries, source_crs or "EPSG:4326", crs)
+
+    report(10)
+
+    # Scenes of the date range below the maximum cloud percentage (when the metadata gives one)
+    with stats.stage("scene_search"):
+        scenes = [scene for scene in find_local_scenes(config.local_inputs)
+                  if config.start_date <= scene["date"] < config.end_date
+                  and (scene["cloud"] is None or scene["cloud"] < config.cloudy_percentage)]
+    result.scene_count = len(scenes)
+
+    report(20)
+    with stats.stage("tide_screening"):
+        if ledger is not None:
+            matches = screen_incremental(config, scenes, tide_backend, ledger, run_key(config),
+                                         lambda fraction: report(20 + 20 * fraction), cancel)
+        else:
+            matches = screen_scenes(config, scenes, tide_backend, lambda fraction: report(20 + 20 * fraction), cancel)
+
+    result.dates_with_low_tides = [scene["date"] for scene, extreme in matches]
+
+    # One composite per period, one output per date when the tiles of a date are mosaicked, or one
+    # output per scene
+    names = list(index_ranges)
+    statistic = config.composite_statistic if config.composite else None
+    if config.composite:
+        outputs = [(output_name(names, period, statistic), period_scenes)
+                   for period, period_scenes in group_by_period(matches, config.composite).items()]
+    elif config.mosaic:
+        outputs = [(output_name(names, date, MOSAIC_TILE), date_scenes)
+                   for date, date_scenes in group_by_date(matches).items()]
+    else:
+        outputs = [(output_name(names, scene["date"], scene["tile"]), [scene]) for scene, extreme in matches]
+
+    output_dir = config.output_dir or config.folder_name
+    os.makedirs(output_dir, exist_ok=True)
+    for i, (name, output_scenes) in enumerate(outputs):
+        check_cancelled(cancel)
+        path = os.path.join(output_dir, f"{name}.tif")
+        if os.path.exists(path):
+            print(f"Image '{path}' already exists, skipped")
+        else:
+            with stats.stage("write_outputs"):
+                write_scene(output_scenes, index_ranges, aoi, crs, 10, path, config.workers, config.block_size,
+                            statistic)
+            print(f"Image '{path}' written")
+        print()
+        result.exports.append(name)
+        report(40 + 60 * (i + 1) / len(outputs))
+
+    if not result.dates_with_low_tides:
+        print("No images were found that meet the conditions.")
+
+    report(100)
+    return result
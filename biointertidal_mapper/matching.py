@@ -0,0 +1,63 @@
+import datetime
+
+
+# Sorted index of the low tide times of a run, as UTC epoch seconds, for matching scenes to their
+# nearest low tide with a binary search
+class LowTideIndex:
+    def __init__(self, extremes):
+        import numpy as np
+
+        by_time = {extreme["dt"]: extreme for extreme in extremes}
+        self.times = np.array(sorted(by_time), dtype=np.int64)
+        self.extremes = [by_time[time] for time in self.times.tolist()]
+
+    def __len__(self):
+        return len(self.times)
+
+    # Nearest low tide to each of the given UTC epoch times, all searched in one vectorized pass.
+    # Returns the extreme, or None when there is none within tolerance seconds, for every time.
+    def nearest(self, times, tolerance):
+        import numpy as np
+
+        times = np.asarray(times, dtype=np.int64)
+        if not len(self.times):
+            return [None] * len(times)
+        after = np.searchsorted(self.times, times)
+        before = np.clip(after - 1, 0, len(self.times) - 1)
+        after = np.clip(after, 0, len(self.times) - 1)
+        before_gap = np.abs(times - self.times[before])
+        after_gap = np.abs(self.times[after] - times)
+        best = np.where(after_gap < before_gap, after, before)
+        gap = np.minimum(before_gap, after_gap)
+        return [self.extremes[i] if within else None for i, within in zip(best.tolist(), (gap <= tolerance).tolist())]
+
+
+# Function definition for the minutes since midnight of "HH:MM"
+def clock_minutes(hour):
+    hours, minutes = map(int, hour.split(":"))
+    return hours * 60 + minutes
+
+
+# Function definition for the tzinfo of an IANA time zone name. UTC needs no time zone database, which
+# is missing on Windows unless the tzdata package is installed.
+def time_zone(name):
+    if name in ("UTC", "Etc/UTC"):
+        return datetime.timezone.utc
+    import zoneinfo
+    return zoneinfo.ZoneInfo(name)
+
+
+# Function definition for selecting the extremes whose local time of day (in the IANA time zone
+# `timezone`) falls inside the start_hour-end_hour window, which may cross midnight
+def in_hour_window(extremes, start_hour, end_hour, timezone="UTC"):
+    import numpy as np
+
+    zone = time_zone(timezone)
+    local_times = [datetime.datetime.fromtimestamp(extreme["dt"], zone) for extreme in extremes]
+    minutes = np.array([local.hour * 60 + local.minute for local in local_times], dtype=int)
+    start, end = clock_minutes(start_hour), clock_minutes(end_hour)
+    if start < end:
+        inside = (minutes >= start) & (minutes <= end)
+    else:  # Over midnight
+        inside = (minutes >= start) | (minutes <= end)
+    return [extreme for extreme, keep in zip(extremes, inside.tolist()) if keep]
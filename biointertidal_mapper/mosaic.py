@@ -0,0 +1,96 @@
+import collections
+import glob
+import math
+import os
+import re
+
+# Per-tile output file names, e.g. ndvi_20220109_T16PBC.tif or ndvi_evi_20220109_T16PBC.tif
+TILE_OUTPUT = re.compile(r"^(?P<prefix>.+)_(?P<date>\d{8})_(?P<tile>T\d{2}[A-Z]{3})\.tif$", re.IGNORECASE)
+
+
+# Function definition for grouping the per-tile GeoTIFFs of a folder by index names and date.
+# Returns {(prefix, date): [paths]} with the paths of every group sorted by tile.
+def group_tile_outputs(folder):
+    groups = collections.defaultdict(list)
+    for path in sorted(glob.glob(os.path.join(folder, "*.tif"))):
+        match = TILE_OUTPUT.match(os.path.basename(path))
+        if match:
+            groups[(match.group("prefix"), match.group("date"))].append(path)
+    return dict(groups)
+
+
+# Function definition for merging GeoTIFFs into one raster covering all of them, like merge() of the R
+# raster package: where rasters overlap the first one with a valid value wins. The output is written
+# block by block, reading only the matching window of every input, so memory use does not depend on
+# the size of the rasters. Inputs in another CRS than the first one are warped on the fly.
+def merge_rasters(paths, output_path, block_size=1024):
+    import numpy as np
+    import rasterio
+    from rasterio.enums import Resampling
+    from rasterio.transform import from_origin
+    from rasterio.vrt import WarpedVRT
+    from rasterio.windows import Window, from_bounds
+
+    sources = [rasterio.open(path) for path in paths]
+    try:
+        first = sources[0]
+        crs, count, dtype = first.crs, first.count, first.dtypes[0]
+        xres, yres = first.res
+        nodata = first.nodata
+        if nodata is None:
+            nodata = float("nan") if np.dtype(dtype).kind == "f" else 0
+        readers = [src if src.crs == crs else WarpedVRT(src, crs=crs, resampling=Resampling.nearest) for src in sources]
+
+        bounds = [reader.bounds for reader in readers]
+        minx, miny = min(b.left for b in bounds), min(b.bottom for b in bounds)
+        maxx, maxy = max(b.right for b in bounds), max(b.top for b in bounds)
+        width = max(1, math.ceil(round((maxx - minx) / xres, 6)))
+        height = max(1, math.ceil(round((maxy - miny) / yres, 6)))
+        transform = from_origin(minx, maxy, xres, yres)
+
+        profile = dict(driver="GTiff", width=width, height=height, count=count, dtype=dtype, crs=crs,
+                       transform=transform, nodata=nodata, tiled=True, blockxsize=256, blockysize=256,
+                       compress="deflate")
+        with rasterio.open(output_path, "w", **profile) as dst:
+            dst.descriptions = first.descriptions
+            for row in range(0, height, block_size):
+                for col in range(0, width, block_size):
+                    block = Window(col, row, min(block_size, width - col), min(block_size, height - row))
+                    block_bounds = rasterio.windows.bounds(block, transform)
+                    merged = np.full((count, block.height, block.width), nodata, dtype=dtype)
+                    missing = np.ones(merged.shape, dtype=bool)
+                    for reader, reader_bounds in zip(readers, bounds):
+                        # Skip the inputs that do not overlap the block
+                        if (reader_bounds.left >= block_bounds[2] or reader_bounds.right <= block_bounds[0]
+                                or reader_bounds.bottom >= block_bounds[3] or reader_bounds.top <= block_bounds[1]):
+                            continue
+                        window = from_bounds(*block_bounds, transform=reader.transform)
+                        data = reader.read(window=window, out_shape=merged.shape, boundless=True, fill_value=nodata,
+                                           resampling=Resampling.nearest)
+                        valid = ~np.isnan(data) if np.isnan(nodata) else data != nodata
+                        fill = missing & valid
+                        merged[fill] = data[fill]
+                        missing &= ~valid
+                        if not missing.any():
+                            break
+                    dst.write(merged, window=block)
+    finally:
+        for src in sources:
+            src.close()
+
+
+# Function definition for merging every group of per-tile outputs of a folder into
+# <prefix>_<date>_merged.tif files; returns the paths written
+def merge_folder(folder, output_dir=None, overwrite=False, block_size=1024):
+    output_dir = output_dir or folder
+    os.makedirs(output_dir, exist_ok=True)
+    written = []
+    for (prefix, date), paths in sorted(group_tile_outputs(folder).items()):
+        output_path = os.path.join(output_dir, f"{prefix}_{date}_merged.tif")
+        if os.path.exists(output_path) and not overwrite:
+            print(f"Image '{output_path}' already exists, skipped")
+            continue
+        merge_rasters(paths, output_path, block_size)
+        print(f"Image '{output_path}' written from {len(paths)} tile{'s' if len(paths) != 1 else ''}")
+        written.append(output_path)
+    return written
@@ -0,0 +1,184 @@
+import contextlib
+import dataclasses
+import io
+
+from biointertidal_mapper.ee_client import EarthEngineClient
+from biointertidal_mapper.engine import (build_outputs, make_tide_backend, neighbour_dates, prepare_aoi,
+                                         screen_scenes)
+from biointertidal_mapper.indices import composite_band_names
+from biointertidal_mapper.ledger import RunLedger, run_key
+from biointertidal_mapper.tides import TideBackend, WorldTidesBackend, date_windows, low_tides
+
+# Output pixel size in metres, as used by the exports and downloads
+PLAN_SCALE = 10
+
+# Bytes per pixel and band of the outputs (float32 bands)
+BYTES_PER_VALUE = 4
+
+
+# Tide backend serving only the extremes already known before the run (tide cache or offline
+# predictions); it never sends a request
+class _KnownTides(TideBackend):
+    def __init__(self, extremes_by_date):
+        self.extremes_by_date = extremes_by_date
+
+    def low_tide_extremes(self, date, lat, lon):
+        return low_tides(self.extremes_by_date[date])
+
+
+# Estimate of a run made before executing it. outputs lists one dictionary per output that may be
+# written: name, scene count, status ("expected" when all its scenes are known to match a low tide,
+# "possible" when some depend on tides not yet fetched, "done" when completed by an earlier run),
+# pixel count and uncompressed size in bytes.
+@dataclasses.dataclass
+class RunPlan:
+    folder_name: str
+    candidate_scenes: int = 0
+    scenes_to_screen: int = 0
+    matched_scenes: int = 0
+    unknown_scenes: int = 0
+    tide_dates: int = 0
+    cached_tide_dates: int = 0
+    tide_requests: int = 0
+    tide_credits: int = 0
+    ee_round_trips: int = 0
+    width: int = 0
+    height: int = 0
+    bands: int = 0
+    outputs: list = dataclasses.field(default_factory=list)
+    notes: list = dataclasses.field(default_factory=list)
+
+    @property
+    def export_tasks(self):
+        return sum(1 for output in self.outputs if output["status"] == "expected")
+
+    @property
+    def possible_export_tasks(self):
+        return sum(1 for output in self.outputs if output["status"] in ("expected", "possible"))
+
+    @property
+    def total_bytes(self):
+        return sum(output["bytes"] for output in self.outputs if output["status"] != "done")
+
+    def to_dict(self):
+        values = dataclasses.asdict(self)
+        values.update(export_tasks=self.export_tasks, possible_export_tasks=self.possible_export_tasks,
+                      total_bytes=self.total_bytes)
+        return values
+
+
+# Function definition for the tide extremes of the given dates that are known without any request:
+# every date for offline backends, the dates in the tide cache for WorldTides (read without touching its
+# statistics or eviction order)
+def known_extremes(tide_backend, dates, lat, lon):
+    if not isinstance(tide_backend, WorldTidesBackend):
+        tide_backend.prefetch(dates, lat, lon)
+        return {date: tide_backend.low_tide_extremes(date, lat, lon) for date in dates}
+    known = {}
+    for date in dates:
+        cached = tide_backend.cache.peek(date, lat, lon, tide_backend.datum) if tide_backend.cache is not None else None
+        if cached is not None:
+            known[date] = cached
+    return known
+
+
+# Function definition for planning a run on Earth Engine without executing it. Only the AOI and the
+# scene metadata are queried (one or two round trips); tides come from the tide cache or the offline
+# predictions and the run ledger. Nothing is exported, downloaded or fetched from WorldTides.
+def plan_run(config, client=None, tide_backend=None, ledger=None):
+    plan = RunPlan(config.folder_name)
+    if client is None:
+        client = EarthEngineClient()
+    if tide_backend is None:
+        tide_backend = make_tide_backend(config)
+    if ledger is None and config.incremental:
+        ledger = RunLedger()
+    round_trips = client.round_trips
+
+    geometry, region = prepare_aoi(config, client)
+    imgs = client.image_collection(geometry, config.cloudy_percentage, config.start_date, config.end_date,
+                                   config.tiles)
+    candidates = [scene for scene in client.scene_table(imgs) if scene["tile"] in config.tiles]
+    plan.candidate_scenes = len(candidates)
+    if config.aoi_cloud_percentage < 100:
+        plan.notes.append("The AOI cloud screening is not applied by the plan: scene counts are upper bounds.")
+
+    # Scenes decided by earlier runs need no tides
+    key = run_key(config)
+    decisions = ledger.decisions(key) if ledger is not None else {}
+    matches = [(scene, decisions[scene["id"]]) for scene in candidates if decisions.get(scene["id"])]
+    new_scenes = [scene for scene in candidates if scene["id"] not in decisions]
+    plan.scenes_to_screen = len(new_scenes)
+
+    # Tide dates of the new scenes, the ones already known and the requests needed for the others
+    needed = {scene["id"]: [scene["date"]] + (neighbour_dates(scene["date"]) if config.tide_tolerance_minutes else [])
+              for scene in new_scenes}
+    dates = sorted({date for scene_dates in needed.values() for date in scene_dates})
+    known = known_extremes(tide_backend, dates, config.lat, config.lon)
+    missing = [date for date in dates if date not in known]
+    plan.tide_dates, plan.cached_tide_dates = len(dates), len(known)
+    if isinstance(tide_backend, WorldTidesBackend):
+        # One request, and one credit, per window of up to MAX_WINDOW_DAYS consecutive days
+        plan.tide_requests = plan.tide_credits = len(date_windows(missing, tide_backend.max_window_days))
+
+    # Screen the new scenes whose tides are known exactly like a run would; the others may or may not match
+    screenable = [scene for scene in new_scenes if all(date in known for date in needed[scene["id"]])]
+    unknown = [scene for scene in new_scenes if not all(date in known for date in needed[scene["id"]])]
+    with contextlib.redirect_stdout(io.StringIO()):
+        matches += screen_scenes(config, screenable, _KnownTides(known))
+    plan.matched_scenes = len({scene["id"] for scene, extreme in matches})
+    plan.unknown_scenes = len(unknown)
+
+    # Outputs that will be written (from matched scenes) and that may be written (with unknown scenes)
+    from biointertidal_mapper.download import aoi_bounds, output_grid
+
+    left, top, plan.width, plan.height = output_grid(aoi_bounds(config, region), PLAN_SCALE)
+    names = list(config.selected_index_ranges())
+    plan.bands = len(composite_band_names(names, config.composite_statistic) if config.composite else names)
+    pixels = plan.width * plan.height
+    done = ledger.outputs(key) if ledger is not None else {}
+    expected = dict(build_outputs(config, matches))
+    possible = dict(build_outputs(config, matches + [(scene, None) for scene in unknown]))
+    for name, scene_ids in possible.items():
+        if ledger is not None and ledger.is_done(key, name, scene_ids, done):
+            status = "done"
+        elif name in expected and len(expected[name]) == len(scene_ids):
+            status = "expected"
+        else:
+            status = "possible"
+        plan.outputs.append({"name": name, "scenes": len(scene_ids), "status": status, "pixels": pixels,
+                             "bytes": pixels * plan.bands * BYTES_PER_VALUE})
+    if config.statistics:
+        plan.notes.append("Statistics mode: the outputs are rows of one table, not exported rasters.")
+
+    plan.ee_round_trips = client.round_trips - round_trips
+    return plan
+
+
+# Function definition for the size of a number of bytes in human units
+def format_bytes(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+# Function definition for a readable report of a plan
+def format_plan(plan):
+    lines = [
+        f"Plan for '{plan.folder_name}':",
+        f"  Candidate scenes: {plan.candidate_scenes} ({plan.scenes_to_screen} not screened by an earlier run)",
+        f"  Tide dates: {plan.tide_dates}, {plan.cached_tide_dates} already known",
+        f"  WorldTides requests: {plan.tide_requests} (about {plan.tide_credits} credits)",
+        f"  Scenes at low tide: {plan.matched_scenes} known, {plan.unknown_scenes} depending on tides not fetched yet",
+        f"  Export tasks: {plan.export_tasks} expected, up to {plan.possible_export_tasks}",
+        f"  Output grid: {plan.width} x {plan.height} pixels at {PLAN_SCALE} m, {plan.bands} float32 bands, "
+        f"{format_bytes(plan.width * plan.height * plan.bands * BYTES_PER_VALUE)} per output uncompressed",
+        f"  Total uncompressed size: up to {format_bytes(plan.total_bytes)}",
+        f"  Earth Engine round trips used by the plan: {plan.ee_round_trips}",
+    ]
+    for output in plan.outputs:
+        lines.append(f"    {output['name']}: {output['scenes']} scene{'s' if output['scenes'] != 1 else ''}, "
+                     f"{output['status']}, {format_bytes(output['bytes'])}")
+    lines.extend(f"  Note: {note}" for note in plan.notes)
+    return "\n".join(lines)
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+
+# Default folder of the converted local AOIs, keyed by the content hash of the shapefile
+DEFAULT_AOI_CACHE = os.path.join(os.path.expanduser("~"), ".biointertidal_mapper", "aoi")
+# Part of the cache key, bumped when the conversion changes so that older cached AOIs are not reused
+AOI_CACHE_VERSION = 2
+
+
+# Function definition for reading the geometries of a local shapefile as GeoJSON dictionaries.
+# Returns the geometries and the WKT of the .prj file next to it (None if there is none).
+def read_shapefile(path):
+    import shapefile
+
+    with shapefile.Reader(path) as reader:
+        geometries = [shape.__geo_interface__ for shape in reader.shapes() if shape.points]
+
+    prj_path = os.path.splitext(path)[0] + ".prj"
+    crs_wkt = None
+    if os.path.isfile(prj_path):
+        with open(prj_path) as f:
+            crs_wkt = f.read()
+    return geometries, crs_wkt
+
+
+def _transform_coordinates(coordinates, transform):
+    if coordinates and isinstance(coordinates[0], (int, float)):
+        return list(transform(coordinates[0], coordinates[1]))
+    return [_transform_coordinates(part, transform) for part in coordinates]
+
+
+# Function definition for reprojecting GeoJSON geometries between two coordinate reference systems
+# (anything pyproj understands: WKT, "EPSG:32629", ...)
+def reproject_geometries(geometries, source_crs, target_crs):
+    from pyproj import CRS, Transformer
+
+    source, target = CRS.from_user_input(source_crs), CRS.from_user_input(target_crs)
+    if source == target:
+        return geometries
+    transformer = Transformer.from_crs(source, target, always_xy=True)
+    return [{"type": geometry["type"], "coordinates": _transform_coordinates(geometry["coordinates"], transformer.transform)}
+            for geometry in geometries]
+
+
+# Function definition for the CRS in which geometries in `crs` are simplified, so that the tolerance is
+# in metres: `crs` itself when it is projected, otherwise the UTM zone of the centre of the geometries
+def simplification_crs(geometries, crs):
+    from pyproj import CRS
+
+    if not CRS.from_user_input(crs).is_geographic:
+        return crs
+    min_lon, min_lat, max_lon, max_lat = geometries_bounds(reproject_geometries(geometries, crs, "EPSG:4326"))
+    zone = min(int(((min_lon + max_lon) / 2 + 180) // 6) + 1, 60)
+    return f"EPSG:{(32600 if min_lat + max_lat >= 0 else 32700) + zone}"
+
+
+# Function definition for the bounding box (min x, min y, max x, max y) of GeoJSON geometries
+def geometries_bounds(geometries):
+    xs, ys = [], []
+
+    def collect(coordinates):
+        if coordinates and isinstance(coordinates[0], (int, float)):
+            xs.append(coordinates[0])
+            ys.append(coordinates[1])
+        else:
+            for part in coordinates:
+                collect(part)
+
+    for geometry in geometries:
+        collect(geometry["coordinates"])
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+# Function definition for simplifying a line or ring with the Douglas-Peucker algorithm (vectorized
+# distances, explicit stack instead of recursion)
+def _simplify_line(points, tolerance):
+    import numpy as np
+
+    points = np.asarray(points, dtype=float)
+    if len(points) < 3:
+        return points.tolist()
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end <= start + 1:
+            continue
+        a, b = points[start], points[end]
+        segment = points[start + 1:end]
+        dx, dy = b - a
+        length = np.hypot(dx, dy)
+        if length == 0:
+            # Closed ring: distance to the first point
+            distances = np.hypot(segment[:, 0] - a[0], segment[:, 1] - a[1])
+        else:
+            distances = np.abs(dx * (segment[:, 1] - a[1]) - dy * (segment[:, 0] - a[0])) / length
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            keep[start + 1 + farthest] = True
+            stack.extend([(start, start + 1 + farthest), (start + 1 + farthest, end)])
+    return points[keep].tolist()
+
+
+def _simplify_polygon(rings, tolerance):
+    simplified = []
+    for ring in rings:
+        ring = _simplify_line(ring, tolerance)
+        # Rings that collapse below a triangle are dropped (a polygon whose outer ring collapses is dropped)
+        if len(ring) < 4:
+            if not simplified:
+                return None
+            continue
+        simplified.append(ring)
+    return simplified
+
+
+# Function definition for merging polygon geometries into a single MultiPolygon
+def merge_polygons(geometries):
+    polygons = []
+    for geometry in geometries:
+        if geometry["type"] == "Polygon":
+            polygons.append(geometry["coordinates"])
+        elif geometry["type"] == "MultiPolygon":
+            polygons.extend(geometry["coordinates"])
+        else:
+            raise ValueError(f"The AOI must be made of polygons, not {geometry['type']}")
+    return {"type": "MultiPolygon", "coordinates": polygons}
+
+
+def vertex_count(geometry):
+    return sum(len(ring) for polygon in geometry["coordinates"] for ring in polygon)
+
+
+# Function definition for simplifying a MultiPolygon within `tolerance` (in CRS units). If it still has
+# more than max_vertices vertices the tolerance is doubled until it fits the budget.
+def simplify_multipolygon(geometry, tolerance, max_vertices=None):
+    def simplify(tolerance):
+        polygons = [_simplify_polygon(polygon, tolerance) for polygon in geometry["coordinates"]]
+        return {"type": "MultiPolygon", "coordinates": [polygon for polygon in polygons if polygon]}
+
+    simplified = simplify(tolerance) if tolerance else geometry
+    while max_vertices and vertex_count(simplified) > max_vertices:
+        tolerance = tolerance * 2 if tolerance else 1.0
+        candidate = simplify(tolerance)
+        if not candidate["coordinates"]:
+            break
+        simplified = candidate
+    return simplified
+
+
+# Function definition for loading a local shapefile as the AOI of a run: all features merged into one
+# MultiPolygon in target_crs, simplified within `tolerance` metres and reduced to max_vertices. The result is
+# cached on disk by the content hash of the shapefile and the parameters.
+def load_aoi(path, target_crs, tolerance=10.0, max_vertices=5000, cache_dir=None):
+    cache_dir = cache_dir or os.environ.get("BIOINTERTIDAL_AOI_CACHE", DEFAULT_AOI_CACHE)
+    digest = hashlib.sha256(json.dumps([target_crs, tolerance, max_vertices, AOI_CACHE_VERSION]).encode())
+    for extension in (".shp", ".shx", ".prj"):
+        part = os.path.splitext(path)[0] + extension
+        if os.path.isfile(part):
+            with open(part, "rb") as f:
+                digest.update(f.read())
+    cache_path = os.path.join(cache_dir, digest.hexdigest() + ".geojson")
+    try:
+        with open(cache_path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        pass
+
+    geometries, source_crs = read_shapefile(path)
+    geometries = reproject_geometries(geometries, source_crs or "EPSG:4326", target_crs)
+    # A geographic target CRS is in degrees: simplify in metres in the local UTM zone and reproject back
+    working_crs = simplification_crs(geometries, target_crs)
+    geometries = reproject_geometries(geometries, target_crs, working_crs)
+    aoi = simplify_multipolygon(merge_polygons(geometries), tolerance, max_vertices)
+    aoi = reproject_geometries([aoi], working_crs, target_crs)[0]
+
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(cache_path + ".tmp", "w") as f:
+        json.dump(aoi, f)
+    os.replace(cache_path + ".tmp", cache_path)
+    return aoi
@@ -0,0 +1,80 @@
+import csv
+import os
+
+# Default NDVI class breaks between start_ndvi and end_ndvi
+DEFAULT_CLASS_BREAKS = (0.2, 0.4, 0.6)
+
+
+# Function definition for the NDVI classes [low, high) of a run: start_ndvi to end_ndvi cut at the
+# configured breaks that fall inside that range
+def ndvi_classes(start_ndvi, end_ndvi, breaks=DEFAULT_CLASS_BREAKS):
+    bounds = [start_ndvi] + sorted(value for value in set(breaks) if start_ndvi < value < end_ndvi) + [end_ndvi]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+# Function definition for the columns of the time series of a run with the given percentile
+def time_series_columns(percentile):
+    return ["site", "date", "zone", "ndvi_class", "pixel_count", "vegetated_area_m2", "ndvi_mean",
+            f"ndvi_p{percentile}"]
+
+
+# Function definition for turning the zonal statistics of a site (see zonal_statistics of the Earth
+# Engine clients) into time series rows. The vegetated area is the number of pixels of the class
+# times the area of a pixel.
+def time_series_rows(site, statistics, percentile, scale=10):
+    rows = []
+    for row in statistics:
+        rows.append({
+            "site": site,
+            "date": row["date"],
+            "zone": row["zone"],
+            "ndvi_class": f"{row['class_low']:g}-{row['class_high']:g}",
+            "pixel_count": int(row["count"]),
+            "vegetated_area_m2": round(row["count"] * scale * scale, 2),
+            "ndvi_mean": None if row["mean"] is None else round(row["mean"], 4),
+            f"ndvi_p{percentile}": None if row["percentile"] is None else round(row["percentile"], 4),
+        })
+    return rows
+
+
+def _read_rows(path):
+    if path.endswith(".parquet"):
+        import pandas
+        frame = pandas.read_parquet(path)
+        return list(frame.columns), frame.where(frame.notna(), None).to_dict("records")
+    with open(path, newline="") as f:
+        reader = csv.DictReader(f)
+        return reader.fieldnames, [{name: value if value != "" else None for name, value in row.items()}
+                                   for row in reader]
+
+
+# Function definition for writing the time series of a site to a CSV file, or a Parquet file if the
+# path ends with .parquet (needs pandas and pyarrow). The rows of the other sites already in the file
+# are kept, so the runs of several sites build up a single table; the file is replaced atomically.
+def write_time_series(rows, path, site, percentile):
+    columns = time_series_columns(percentile)
+    if os.path.isfile(path):
+        existing_columns, existing = _read_rows(path)
+        if existing_columns == columns:
+            rows = [row for row in existing if row["site"] != site] + rows
+        else:
+            print(f"The columns of '{path}' differ from those of this run, the file is rewritten")
+    rows = sorted(rows, key=lambda row: (str(row["site"]), str(row["date"]), str(row["zone"]),
+                                         str(row["ndvi_class"])))
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    partial_path = path + ".tmp"
+    if path.endswith(".parquet"):
+        try:
+            import pandas
+        except ImportError:
+            raise ImportError("Writing Parquet time series needs pandas and pyarrow "
+                              "(pip install pandas pyarrow), or use a .csv path.")
+        pandas.DataFrame(rows, columns=columns).to_parquet(partial_path, index=False)
+    else:
+        with open(partial_path, "w", newline="") as f:
+            writer = csv.DictWriter(f, columns)
+            writer.writeheader()
+            writer.writerows(rows)
+    os.replace(partial_path, path)
+    return path
@@ -0,0 +1,193 @@
+import datetime
+import http.server
+import json
+import math
+import threading
+import time
+import urllib.parse
+
+# Local stand-ins for the web services used by the mapper, for running the pipeline and the
+# benchmarks without accounts or network access.
+
+M2_PERIOD = 12.4206012 * 3600
+
+
+# Function definition for generating deterministic semidiurnal extremes in the WorldTides format
+def stub_extremes(date, days, phase_hours=0.0):
+    start = datetime.datetime.strptime(date, "%Y-%m-%d").replace(tzinfo=datetime.timezone.utc).timestamp()
+    end = start + days * 86400
+    # First high tide at or after the start of the window
+    first_high = phase_hours * 3600 + math.ceil((start - phase_hours * 3600) / M2_PERIOD) * M2_PERIOD
+    extremes = []
+    t = first_high - M2_PERIOD / 2
+    kind = "Low"
+    while t < end:
+        if t >= start:
+            when = datetime.datetime.fromtimestamp(int(t), datetime.timezone.utc)
+            extremes.append({"dt": int(t), "date": when.strftime("%Y-%m-%dT%H:%M+0000"),
+                             "height": -1.2 if kind == "Low" else 1.2, "type": kind})
+        t += M2_PERIOD / 2
+        kind = "High" if kind == "Low" else "Low"
+    return extremes
+
+
+# Threaded HTTP server answering WorldTides extremes requests. Each key in `credits` can pay for
+# that many requests before "Not enough credits" is returned, unknown keys get "API key is
+# invalid", every request waits `latency` seconds and every `fail_every`-th request returns 503.
+# Requests to any other path than /api/v3 get an HTML 404 page, like a misconfigured proxy would send.
+class StubWorldTidesServer:
+    def __init__(self, credits=None, latency=0.0, fail_every=0, phase_hours=0.0):
+        self.credits = dict(credits or {"stub-key": 10 ** 9})
+        self.latency = latency
+        self.fail_every = fail_every
+        self.phase_hours = phase_hours
+        self.request_count = 0
+        self.requests = []
+        self._lock = threading.Lock()
+        self._server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/api/v3"
+
+    def _respond(self, query):
+        with self._lock:
+            self.request_count += 1
+            self.requests.append(query)
+            count = self.request_count
+            key = query.get("key")
+            if self.fail_every and count % self.fail_every == 0:
+                return 503, {"error": "Service unavailable"}
+            if key not in self.credits:
+                return 200, {"status": 400, "error": "API key is invalid"}
+            if self.credits[key] <= 0:
+                return 200, {"status": 400, "error": "Not enough credits"}
+            self.credits[key] -= 1
+        days = int(query.get("days", 1))
+        return 200, {"status": 200, "callCount": 1,
+                     "extremes": stub_extremes(query["date"], days, self.phase_hours)}
+
+    def _handler(self):
+        stub = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urllib.parse.urlparse(self.path)
+                query = dict(urllib.parse.parse_qsl(url.query, keep_blank_values=True))
+                if stub.latency:
+                    time.sleep(stub.latency)
+                if url.path != "/api/v3":
+                    status, content_type = 404, "text/html"
+                    payload = b"<html><body><h1>404 Not Found</h1></body></html>"
+                else:
+                    status, body = stub._respond(query)
+                    content_type, payload = "application/json", json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+# Function definition for deterministic pixel values of a chunk: band b of the pixel at (x, y) in CRS
+# units is ((x + y) / 1000 + b / 10) modulo 1
+def stub_pixels(bands, x, y, scale, width, height):
+    import numpy as np
+
+    xs = x + (np.arange(width) + 0.5) * scale
+    ys = y - (np.arange(height) + 0.5) * scale
+    values = np.empty((height, width), dtype=[(band, "<f4") for band in bands])
+    for b, band in enumerate(bands):
+        values[band] = np.mod((xs[None, :] + ys[:, None]) / 1000 + b / 10, 1)
+    return values
+
+
+# Threaded HTTP server standing in for the Earth Engine pixel download URLs (getDownloadURL with the
+# NPY format). The chunk grid and bands are given in the query string; every request waits `latency`
+# seconds and every `fail_every`-th request returns 503.
+class StubPixelServer:
+    def __init__(self, latency=0.0, fail_every=0):
+        self.latency = latency
+        self.fail_every = fail_every
+        self.request_count = 0
+        self._lock = threading.Lock()
+        self._server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/pixels"
+
+    def _respond(self, query):
+        import io
+        import numpy as np
+
+        with self._lock:
+            self.request_count += 1
+            if self.fail_every and self.request_count % self.fail_every == 0:
+                return 503, b"Service unavailable"
+        values = stub_pixels(query["bands"].split(","), float(query["x"]), float(query["y"]), float(query["scale"]),
+                             int(query["width"]), int(query["height"]))
+        payload = io.BytesIO()
+        np.save(payload, values)
+        return 200, payload.getvalue()
+
+    def _handler(self):
+        stub = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                query = dict(urllib.parse.parse_qsl(urllib.parse.urlparse(self.path).query))
+                if stub.latency:
+                    time.sleep(stub.latency)
+                status, payload = stub._respond(query)
+                self.send_response(status)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,113 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Default location of the tide cache, shared by every run and every site
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".biointertidal_mapper", "tides.sqlite")
+
+
+# Persistent store of the tide extremes returned by WorldTides, keyed by snapped coordinates,
+# date and datum. Entries older than max_age_days are ignored and the least recently used
+# entries are evicted once the store holds more than max_entries days.
+class TideCache:
+    def __init__(self, path=None, max_age_days=365, max_entries=100000, grid=0.01):
+        self.path = path or os.environ.get("BIOINTERTIDAL_TIDE_CACHE", DEFAULT_CACHE_PATH)
+        self.max_age_days = max_age_days
+        self.max_entries = max_entries
+        self.grid = grid
+        self.hits = 0
+        self.misses = 0
+        self.credits_saved = 0
+        self._lock = threading.Lock()
+
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS extremes (
+                lat REAL NOT NULL,
+                lon REAL NOT NULL,
+                date TEXT NOT NULL,
+                datum TEXT NOT NULL,
+                extremes TEXT NOT NULL,
+                credits REAL NOT NULL,
+                fetched REAL NOT NULL,
+                accessed REAL NOT NULL,
+                PRIMARY KEY (lat, lon, date, datum)
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS extremes_accessed ON extremes (accessed)")
+        self._conn.commit()
+
+    # Snap coordinates to the cache grid so that nearby requests share the same entry
+    def snap(self, lat, lon):
+        return (round(round(float(lat) / self.grid) * self.grid, 6),
+                round(round(float(lon) / self.grid) * self.grid, 6))
+
+    def _lookup(self, key, now):
+        row = self._conn.execute(
+            "SELECT extremes, credits, fetched FROM extremes WHERE lat=? AND lon=? AND date=? AND datum=?",
+            key).fetchone()
+        if row is None or (self.max_age_days is not None and now - row[2] > self.max_age_days * 86400):
+            return None
+        return row
+
+    # Return the cached extremes (all types) for a date, or None on a miss
+    def get(self, date, lat, lon, datum=None):
+        lat, lon = self.snap(lat, lon)
+        key = (lat, lon, date, datum or "default")
+        now = time.time()
+        with self._lock:
+            row = self._lookup(key, now)
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE extremes SET accessed=? WHERE lat=? AND lon=? AND date=? AND datum=?", (now,) + key)
+            self._conn.commit()
+            self.hits += 1
+            self.credits_saved += row[1]
+        return json.loads(row[0])
+
+    # Return the cached extremes of a date like get(), without counting a hit or a miss and without
+    # refreshing the entry for the eviction (for dry runs)
+    def peek(self, date, lat, lon, datum=None):
+        lat, lon = self.snap(lat, lon)
+        with self._lock:
+            row = self._lookup((lat, lon, date, datum or "default"), time.time())
+        return json.loads(row[0]) if row is not None else None
+
+    # Store the extremes of a date. credits is the share of the request cost spent on this date.
+    def put(self, date, lat, lon, extremes, datum=None, credits=1):
+        lat, lon = self.snap(lat, lon)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO extremes VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (lat, lon, date, datum or "default", json.dumps(extremes), credits, now, now))
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        if self.max_entries is None:
+            return
+        count = self._conn.execute("SELECT COUNT(*) FROM extremes").fetchone()[0]
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM extremes WHERE rowid IN (SELECT rowid FROM extremes ORDER BY accessed LIMIT ?)",
+                (count - self.max_entries,))
+
+    # Iterate over every stored entry as (lat, lon, date, datum, extremes)
+    def entries(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT lat, lon, date, datum, extremes FROM extremes ORDER BY date").fetchall()
+        return [(lat, lon, date, datum, json.loads(extremes)) for lat, lon, date, datum, extremes in rows]
+
+    def summary(self):
+        return (f"Tide cache: {self.hits} hits, {self.misses} misses, "
+                f"{round(self.credits_saved, 1):g} WorldTides credits saved")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,246 @@
+import concurrent.futures
+import datetime
+import random
+import threading
+import time
+
+from biointertidal_mapper.instrument import timed_call
+
+# Spare WorldTides keys tried in turn when the user's key runs out of credits
+FALLBACK_KEYS = [
+    "cc44e94c-1ebb-4bd6-a024-4bdc00cd9374",
+    "77bcfbff-3479-4d19-ae25-ade4f8cdf66e"
+]
+
+WORLDTIDES_URL = "https://www.worldtides.info/api/v3"
+
+# Longest window fetched with a single WorldTides request (one credit covers up to 7 days of extremes)
+MAX_WINDOW_DAYS = 7
+
+
+class TideAPIError(Exception):
+    pass
+
+
+# Function definition for keeping only the low tides of a list of extremes
+def low_tides(extremes):
+    return [extreme for extreme in extremes if extreme['type'] == 'Low']
+
+
+# Function definition for merging a set of dates into windows of at most max_days consecutive days.
+# Returns (first date, number of days, dates in the window) tuples.
+def date_windows(dates, max_days=MAX_WINDOW_DAYS):
+    windows = []
+    for date in sorted(set(dates)):
+        day = datetime.date.fromisoformat(date)
+        if windows and (day - windows[-1][0]).days < max_days:
+            windows[-1][1].append(date)
+        else:
+            windows.append((day, [date]))
+    return [(first.isoformat(), (datetime.date.fromisoformat(members[-1]) - first).days + 1, members)
+            for first, members in windows]
+
+
+# Interface shared by the tide backends. Extremes are dictionaries in the WorldTides format:
+# {"dt": epoch seconds, "date": "YYYY-MM-DDTHH:MM+0000", "height": metres, "type": "Low"/"High"}
+class TideBackend:
+    # RunStats of the current run (see biointertidal_mapper.instrument), set by the engine
+    stats = None
+
+    # Hook for backends that can answer many dates more cheaply at once. Backends that send requests
+    # stop sending new ones once the threading.Event `cancel` is set.
+    def prefetch(self, dates, lat, lon, cancel=None):
+        pass
+
+    def low_tide_extremes(self, date, lat, lon):
+        raise NotImplementedError
+
+    def summary(self):
+        return ""
+
+
+# Spaces out requests so that no more than `rate` requests per second are sent, across all threads
+class RateLimiter:
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+class _TransientError(Exception):
+    pass
+
+
+# HTTP client for the WorldTides API. Requests share a pooled session and run concurrently on a
+# bounded thread pool under a requests-per-second limit. Keys are tried in order: a key that runs
+# out of credits is retired for every thread and the next one is used. Connection errors, timeouts
+# and 429/5xx responses are retried with jittered exponential backoff.
+class WorldTidesClient:
+    def __init__(self, keys, max_workers=4, requests_per_second=5, max_retries=3, backoff=0.5, timeout=30,
+                 base_url=WORLDTIDES_URL):
+        import requests
+        self._requests = requests
+        self.keys = [key for key in keys if key]
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.base_url = base_url
+        self.limiter = RateLimiter(requests_per_second)
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.exhausted_keys = set()
+        # Number of HTTP requests sent to WorldTides
+        self.request_count = 0
+        # RunStats recording the latency and size of every request, if any
+        self.stats = None
+        self._lock = threading.Lock()
+
+    def _current_key(self):
+        with self._lock:
+            for key in self.keys:
+                if key not in self.exhausted_keys:
+                    return key
+        raise TideAPIError("All provided API keys for WorldTides have run out of credits. "
+                           "Please log in to your WorldTides account and top up your credits "
+                           "before trying again or enter a new API key. Thank you.")
+
+    def _get(self, url):
+        for attempt in range(self.max_retries + 1):
+            self.limiter.wait()
+            with self._lock:
+                self.request_count += 1
+            try:
+                with timed_call(self.stats, "worldtides") as call:
+                    response = self.session.get(url, timeout=self.timeout)
+                    call["bytes"] = len(response.content)
+                if response.status_code == 429 or response.status_code >= 500:
+                    raise _TransientError(f"HTTP {response.status_code}: {response.text[:200]}")
+                return self._decode(response)
+            except (self._requests.ConnectionError, self._requests.Timeout, _TransientError) as error:
+                if attempt == self.max_retries:
+                    raise TideAPIError(f"WorldTides request failed after {attempt + 1} attempts: {error}")
+                time.sleep(self.backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+
+    # Decode a WorldTides answer. Error answers carry a JSON body with an "error" message, handled by
+    # fetch(); anything else that is not JSON (a proxy or HTML error page) is reported with its status.
+    def _decode(self, response):
+        try:
+            data = response.json()
+        except ValueError:
+            data = None
+        if isinstance(data, dict) and (response.status_code == 200 or "error" in data):
+            return data
+        raise TideAPIError(f"WorldTides request failed with HTTP {response.status_code}: {response.text[:200]}")
+
+    # Fetch every extreme of `days` days starting at `date`. Returns (extremes, credits used).
+    def fetch(self, date, lat, lon, days=1, datum=None):
+        while True:
+            key = self._current_key()
+            url = f'{self.base_url}?extremes&date={date}&lat={lat}&lon={lon}&days={days}&key={key}'
+            if datum:
+                url += f'&datum={datum}'
+            data = self._get(url)
+
+            if 'error' not in data:
+                return data['extremes'], data.get('callCount', 1)
+            if data['error'] == 'Not enough credits':
+                with self._lock:
+                    self.exhausted_keys.add(key)
+                continue
+            if data['error'] == 'API key is invalid':
+                raise TideAPIError("The API key for WorldTides is invalid. "
+                                   "Please enter a valid API key and try again. Thank you.")
+            raise TideAPIError(f"WorldTides request failed: {data['error']}")
+
+    # Run fetch() for a list of (date, lat, lon, days, datum) requests concurrently, keeping their order.
+    # Once the threading.Event `cancel` is set no new request is sent and the result of every request
+    # not sent is None.
+    def fetch_many(self, requests, cancel=None):
+        def fetch(request):
+            if cancel is not None and cancel.is_set():
+                return None
+            return self.fetch(*request)
+
+        if len(requests) <= 1 or self.max_workers <= 1:
+            return [fetch(request) for request in requests]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(fetch, requests))
+
+    def close(self):
+        self.session.close()
+
+
+# Tide backend querying the WorldTides API, optionally through a persistent TideCache
+class WorldTidesBackend(TideBackend):
+    def __init__(self, key, cache=None, datum=None, fallback_keys=FALLBACK_KEYS, max_window_days=MAX_WINDOW_DAYS,
+                 client=None, **client_options):
+        self.cache = cache
+        self.datum = datum
+        self.max_window_days = max_window_days
+        self.client = client or WorldTidesClient([key] + list(fallback_keys), **client_options)
+        self.extremes_by_date = {}
+
+    # Number of HTTP requests sent to WorldTides
+    @property
+    def request_count(self):
+        return self.client.request_count
+
+    @property
+    def stats(self):
+        return self.client.stats
+
+    @stats.setter
+    def stats(self, stats):
+        self.client.stats = stats
+
+    # Fetch the extremes of every requested date up front. Cached dates are read from the cache,
+    # the remaining distinct dates are merged into multi-day windows fetched with one request each.
+    def prefetch(self, dates, lat, lon, cancel=None):
+        missing = []
+        for date in sorted(set(dates) - set(self.extremes_by_date)):
+            cached = self.cache.get(date, lat, lon, self.datum) if self.cache is not None else None
+            if cached is not None:
+                self.extremes_by_date[date] = cached
+            else:
+                missing.append(date)
+
+        windows = date_windows(missing, self.max_window_days)
+        results = self.client.fetch_many([(first, lat, lon, days, self.datum) for first, days, _ in windows], cancel)
+        for (first, days, _), result in zip(windows, results):
+            if result is not None:
+                self._store_window(first, days, lat, lon, *result)
+
+    def _store_window(self, first, days, lat, lon, extremes, credits):
+        start = datetime.date.fromisoformat(first)
+        window = {(start + datetime.timedelta(days=i)).isoformat(): [] for i in range(days)}
+        for extreme in extremes:
+            if extreme['date'][:10] in window:
+                window[extreme['date'][:10]].append(extreme)
+
+        for date, day_extremes in window.items():
+            self.extremes_by_date[date] = day_extremes
+            if self.cache is not None:
+                self.cache.put(date, lat, lon, day_extremes, self.datum, credits / days)
+
+    # Get low tide extremes for a specific date and coordinates
+    def low_tide_extremes(self, date, lat, lon):
+        if date not in self.extremes_by_date:
+            self.prefetch([date], lat, lon)
+        return low_tides(self.extremes_by_date[date])
+
+    def summary(self):
+        summary = f"WorldTides requests: {self.request_count}"
+        if self.cache is not None:
+            summary += f"\n{self.cache.summary()}"
+        return summary
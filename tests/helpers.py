@@ -0,0 +1,27 @@
+import datetime
+
+from biointertidal_mapper.engine import RunConfig
+
+# Scenes and run parameters shared by the tests, for the in-memory Earth Engine client and the local
+# stub servers (no account or network access needed)
+
+TILES = ["T29UPV", "T29UQV"]
+
+
+# Scenes of both tiles acquired at 11:30 UTC every `step` days from 2021-06-01
+def make_scenes(count, step=2):
+    start = datetime.datetime(2021, 6, 1, 11, 30, tzinfo=datetime.timezone.utc)
+    scenes = []
+    for i in range(count):
+        acquired = start + datetime.timedelta(days=i * step)
+        for tile in TILES:
+            scenes.append({"id": f"{acquired:%Y%m%dT%H%M%S}_{tile}", "time_start": int(acquired.timestamp() * 1000),
+                           "tile": tile[1:], "cloud": 10})
+    return scenes
+
+
+def make_config(tmp_path, **values):
+    defaults = dict(lat="53.36", lon="-6.18", start_date="2021-06-01", end_date="2021-09-01", tiles=TILES,
+                    geometry="users/test/dollymount", epsg="32629", folder_name="Test", start_hour="00:00",
+                    end_hour="23:59", report_path=str(tmp_path / "report.json"), incremental=False)
+    return RunConfig.from_dict({**defaults, **values})
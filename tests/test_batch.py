@@ -0,0 +1,85 @@
+import contextlib
+import io
+import json
+
+from biointertidal_mapper.batch import assign_scenes, process_batch
+from biointertidal_mapper.ee_client import FakeEEClient
+from biointertidal_mapper.exports import ExportManager, ExportRegistry
+from biointertidal_mapper.tides import TideBackend
+
+from helpers import make_config, make_scenes
+
+# Two sites on the east and west halves of tile T29UPV
+EAST = {"type": "Polygon", "coordinates": [[[-6.0, 53.3], [-5.9, 53.3], [-5.9, 53.4], [-6.0, 53.4], [-6.0, 53.3]]]}
+WEST = {"type": "Polygon", "coordinates": [[[-6.3, 53.3], [-6.2, 53.3], [-6.2, 53.4], [-6.3, 53.4], [-6.3, 53.3]]]}
+
+
+# Low tide at noon UTC on every date
+class NoonLowTides(TideBackend):
+    def low_tide_extremes(self, date, lat, lon):
+        return [{"dt": 0, "date": f"{date}T12:00+0000", "height": -1.0, "type": "Low"}]
+
+
+# Daily scenes of T29UPV from 2021-06-01, whose footprint misses the east site on the even days of June,
+# with 40% of cloud inside the AOI on the 1st of every month and 10% otherwise
+def batch_scenes():
+    scenes = [scene for scene in make_scenes(45, step=1) if scene["tile"] == "29UPV"]
+    for scene in scenes:
+        day = int(scene["id"][6:8])
+        swath_edge = scene["id"].startswith("202106") and day % 2 == 0
+        scene["footprint"] = {"type": "Polygon", "coordinates": [[[-6.4, 53.2], [-6.1, 53.2], [-6.1, 53.5],
+                                                                  [-6.4, 53.5], [-6.4, 53.2]]]} if swath_edge else None
+        scene["aoi_cloud"] = 40 if day == 1 else 10
+    return scenes
+
+
+# Client counting the scene metadata queries
+class CountingClient(FakeEEClient):
+    scene_queries = 0
+
+    def scene_table(self, *args, **kwargs):
+        self.scene_queries += 1
+        return super().scene_table(*args, **kwargs)
+
+
+def run_batch(tmp_path, scenes, **values):
+    configs = [make_config(tmp_path, geometry="east", folder_name="East", tiles=["T29UPV"], **values),
+               make_config(tmp_path, geometry="west", folder_name="West", tiles=["T29UPV"], end_date="2021-07-01",
+                           **values)]
+    client = CountingClient(scenes, aoi={"east": EAST, "west": WEST})
+    exports = ExportManager(client, 5, 0.01, 0, ExportRegistry(str(tmp_path / "exports.sqlite")))
+    backends = {config.folder_name: NoonLowTides() for config in configs}
+    with contextlib.redirect_stdout(io.StringIO()):
+        return process_batch(configs, client, exports=exports, tide_backends=backends), client
+
+
+def test_scenes_are_assigned_by_date_and_footprint(tmp_path):
+    config = make_config(tmp_path, tiles=["T29UPV"], end_date="2021-07-01", cloudy_percentage=30)
+    scenes = [{"id": "a", "tile": "T29UPV", "date": "2021-06-01", "cloud": 10, "sites": [0, 1]},
+              {"id": "b", "tile": "T29UPV", "date": "2021-06-02", "cloud": 10, "sites": [1]},
+              {"id": "c", "tile": "T29UQV", "date": "2021-06-03", "cloud": 10, "sites": [0]},
+              {"id": "d", "tile": "T29UPV", "date": "2021-07-01", "cloud": 10, "sites": [0]},
+              {"id": "e", "tile": "T29UPV", "date": "2021-06-05", "cloud": 50, "sites": [0]},
+              {"id": "f", "tile": "T29UPV", "date": "2021-06-06", "cloud": 10, "sites": [0],
+               "site_clouds": {0: 25.0}}]
+    assert [scene["id"] for scene in assign_scenes(config, scenes, 0)] == ["a", "f"]
+    assert [scene["id"] for scene in assign_scenes(config, scenes)] == ["a", "b", "f"]
+    assert assign_scenes(config, scenes, 0)[1]["aoi_cloud"] == 25.0
+    assert "aoi_cloud" not in scenes[5]
+
+
+def test_aoi_cloud_cover_comes_with_the_shared_query(tmp_path):
+    batch, client = run_batch(tmp_path, batch_scenes(), aoi_cloud_percentage=20)
+    assert batch.errors == {}
+    # No query per site for the cloud cover
+    assert client.scene_queries == 1
+    # The east site misses the even days of June, and both sites drop the 1st of the month as too cloudy
+    assert batch.results["East"].scene_count == 45 - 15 - 2
+    assert batch.results["West"].scene_count == 30 - 1
+
+
+def test_batch_report_is_written_to_report_path(tmp_path):
+    batch, client = run_batch(tmp_path, batch_scenes(), report_path=str(tmp_path / "batch.json"))
+    assert batch.report_path == str(tmp_path / "batch.json")
+    with open(batch.report_path) as f:
+        assert set(json.load(f)["sites"]) == {"East", "West"}
@@ -0,0 +1,42 @@
+import pytest
+
+from biointertidal_mapper.ee_client import FakeEEClient
+from biointertidal_mapper.engine import build_outputs, composite_period
+from biointertidal_mapper.indices import composite_band_names, output_name, parse_statistic
+
+from helpers import make_config, make_scenes
+
+
+def test_composite_periods():
+    assert composite_period("2021-06-01", "month") == "2021-06"
+    assert composite_period("2021-06-01", "season") == "2021-JJA"
+    assert composite_period("2021-11-30", "season") == "2021-SON"
+    # December belongs to the winter of the next year, with January and February
+    assert composite_period("2021-12-01", "season") == "2022-DJF"
+    assert composite_period("2022-02-28", "season") == "2022-DJF"
+
+
+def test_composite_band_and_file_names():
+    assert composite_band_names(["ndvi", "evi"], "P90") == ["ndvi_p90", "ndvi_count", "evi_p90", "evi_count"]
+    assert output_name(["ndvi"], "2021-JJA", "median") == "ndvi_2021JJA_median"
+    assert output_name(["ndvi", "evi"], "2021-06-01", "T29UPV") == "ndvi_evi_20210601_T29UPV"
+    assert parse_statistic("p90") == ("percentile", 90)
+    assert parse_statistic("Median") == ("median", None)
+    with pytest.raises(ValueError, match="p101"):
+        parse_statistic("p101")
+
+
+def test_one_composite_per_period(tmp_path):
+    client = FakeEEClient(make_scenes(50))
+    scenes = client.scene_table(client.image_collection(None, 30, "2021-06-01", "2021-10-01"))
+    matches = [(scene, None) for scene in scenes]
+
+    outputs = build_outputs(make_config(tmp_path, composite="season", composite_statistic="p90"), matches)
+    assert [name for name, scene_ids in outputs] == ["ndvi_2021JJA_p90", "ndvi_2021SON_p90"]
+    assert sum(len(scene_ids) for name, scene_ids in outputs) == len(scenes)
+
+    outputs = dict(build_outputs(make_config(tmp_path, composite="month"), matches))
+    assert list(outputs) == ["ndvi_202106_median", "ndvi_202107_median", "ndvi_202108_median",
+                             "ndvi_202109_median"]
+    # Both tiles of every date go into the composite of its month
+    assert len(outputs["ndvi_202106_median"]) == 2 * 15
@@ -0,0 +1,26 @@
+import pytest
+
+from biointertidal_mapper.download import ChunkDownloader, output_grid
+from biointertidal_mapper.ee_client import FakeEEClient, FakeEEObject
+from biointertidal_mapper.stubs import StubPixelServer, stub_pixels
+
+
+def test_failed_chunks_are_retried(tmp_path):
+    rasterio = pytest.importorskip("rasterio")
+    with StubPixelServer(fail_every=3) as server:
+        client = FakeEEClient(pixel_url=server.url)
+        downloader = ChunkDownloader(client, workers=2, chunk_size=8, backoff=0)
+        path = downloader.download(FakeEEObject("image"), ["ndvi"], (0, 0, 200, 200), "EPSG:32629", 10,
+                                   str(tmp_path / "ndvi.tif"))
+    # 20 x 20 pixels in 9 chunks, every third request failing once
+    assert server.request_count == downloader.request_count > 9
+    with rasterio.open(path) as src:
+        data = src.read(1)
+    assert data == pytest.approx(stub_pixels(["ndvi"], 0, 200, 10, 20, 20)["ndvi"])
+
+
+def test_output_grid_snaps_outwards():
+    assert output_grid((101, 203, 149, 291), 10) == (100, 300, 5, 10)
+    assert output_grid((100, 200, 150, 300), 10) == (100, 300, 5, 10)
+    # Degenerate bounds still give one pixel
+    assert output_grid((100, 200, 100, 200), 10) == (100, 200, 1, 1)
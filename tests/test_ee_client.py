@@ -0,0 +1,16 @@
+from biointertidal_mapper.ee_client import FakeEEClient
+
+from helpers import TILES, make_scenes
+
+
+def test_scene_table_is_one_round_trip():
+    client = FakeEEClient(make_scenes(20))
+    geometry, region = client.aoi("users/test/dollymount")
+    imgs = client.image_collection(geometry, 30, "2021-06-01", "2021-09-01", TILES)
+
+    before = client.round_trips
+    scenes = client.scene_table(imgs, geometry, sites=[geometry])
+    assert client.round_trips - before == 1
+    assert len(scenes) == 40
+    assert all("aoi_cloud" in scene and scene["sites"] == [0] for scene in scenes)
+    assert scenes[0]["date"] == "2021-06-01" and scenes[0]["tile"] == "T29UPV"
@@ -0,0 +1,44 @@
+import contextlib
+import datetime
+import io
+
+from biointertidal_mapper.ee_client import FakeEEClient
+from biointertidal_mapper.engine import process, screen_scenes
+from biointertidal_mapper.exports import ExportManager, ExportRegistry
+from biointertidal_mapper.stubs import StubWorldTidesServer
+from biointertidal_mapper.tides import TideBackend, WorldTidesBackend
+
+from helpers import make_config, make_scenes
+
+
+# Two low tides on every date, at 06:00 and 18:00 UTC
+class TwoLowTides(TideBackend):
+    def low_tide_extremes(self, date, lat, lon):
+        day = datetime.datetime.fromisoformat(date).replace(tzinfo=datetime.timezone.utc)
+        return [{"dt": int((day + datetime.timedelta(hours=hour)).timestamp()), "date": f"{date}T{hour:02d}:00+0000",
+                 "height": -1.0, "type": "Low"} for hour in (6, 18)]
+
+
+def scene_list(scenes):
+    client = FakeEEClient(scenes)
+    return client.scene_table(client.image_collection(None, 30, "2021-06-01", "2021-09-01"))
+
+
+def test_scene_matches_its_nearest_low_tide_once(tmp_path):
+    scenes = scene_list(make_scenes(5))
+    with contextlib.redirect_stdout(io.StringIO()):
+        matches = screen_scenes(make_config(tmp_path), scenes, TwoLowTides())
+    assert [scene["id"] for scene, extreme in matches] == [scene["id"] for scene in scenes]
+    # Scenes acquired at 11:30 are nearer the 06:00 low tide than the 18:00 one
+    assert {extreme["date"][11:16] for scene, extreme in matches} == {"06:00"}
+
+
+def test_one_export_per_scene(tmp_path):
+    # The stub tides have two low tides a day, both inside a 00:00-23:59 window
+    client = FakeEEClient(make_scenes(10))
+    with StubWorldTidesServer() as server, contextlib.redirect_stdout(io.StringIO()):
+        backend = WorldTidesBackend("stub-key", fallback_keys=(), base_url=server.url, requests_per_second=0)
+        exports = ExportManager(client, 5, 0.01, 0, ExportRegistry(str(tmp_path / "exports.sqlite")))
+        result = process(make_config(tmp_path), client, backend, exports=exports)
+    assert len(result.exports) == len(set(result.exports)) == len(client.exports) == 20
+    assert len(result.dates_with_low_tides) == 20
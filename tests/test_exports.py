@@ -0,0 +1,64 @@
+import json
+
+from biointertidal_mapper.ee_client import FakeEEClient, FakeEEObject
+from biointertidal_mapper.exports import ExportManager, ExportRegistry
+
+
+def submit(exports, name, folder="Test", force=False):
+    return exports.submit(name, FakeEEObject(name), force=force, scale=10, folder=folder, crs="EPSG:32629",
+                          region=None)
+
+
+def test_registries_sharing_a_path_keep_each_others_entries(tmp_path):
+    path = str(tmp_path / "exports.sqlite")
+    first, second = ExportRegistry(path), ExportRegistry(path)
+    first.mark_completed("Test", "ndvi_20210601_T29UPV", 12.0)
+    second.mark_completed("Test", "ndvi_20210603_T29UPV", 8.0)
+
+    registry = ExportRegistry(path)
+    assert registry.is_completed("Test", "ndvi_20210601_T29UPV")
+    assert registry.is_completed("Test", "ndvi_20210603_T29UPV")
+    assert not registry.is_completed("Other", "ndvi_20210601_T29UPV")
+
+
+def test_json_registry_is_imported(tmp_path):
+    legacy = tmp_path / "exports.json"
+    legacy.write_text(json.dumps({"Test/ndvi_20210601_T29UPV": {"completed": "2021-06-02T10:00:00", "seconds": 5}}))
+    registry = ExportRegistry(str(tmp_path / "exports.sqlite"))
+    assert registry.is_completed("Test", "ndvi_20210601_T29UPV")
+    assert not legacy.exists()
+
+
+def test_completed_exports_are_skipped(tmp_path):
+    registry = ExportRegistry(str(tmp_path / "exports.sqlite"))
+    client = FakeEEClient()
+    exports = ExportManager(client, poll_interval=0.01, registry=registry)
+    submit(exports, "ndvi_20210601_T29UPV")
+    exports.wait()
+
+    exports = ExportManager(client, poll_interval=0.01, registry=registry)
+    assert submit(exports, "ndvi_20210601_T29UPV").state == "SKIPPED"
+    assert submit(exports, "ndvi_20210601_T29UPV", force=True).state == "QUEUED"
+    exports.wait()
+    assert len(client.exports) == 2
+
+
+def test_failing_callback_does_not_stop_the_manager(tmp_path):
+    def on_finished(job):
+        raise OSError("disk full")
+
+    exports = ExportManager(FakeEEClient(), poll_interval=0.01, registry=ExportRegistry(str(tmp_path / "e.sqlite")),
+                            on_finished=on_finished)
+    for day in range(1, 4):
+        submit(exports, f"ndvi_2021060{day}_T29UPV")
+    assert {job.state for job in exports.wait()} == {"COMPLETED"}
+
+
+def test_file_queued_twice_is_exported_once(tmp_path):
+    client = FakeEEClient(export_duration=0.2)
+    exports = ExportManager(client, poll_interval=0.01, registry=ExportRegistry(str(tmp_path / "exports.sqlite")))
+    first = submit(exports, "ndvi_20210601_T29UPV")
+    assert submit(exports, "ndvi_20210601_T29UPV") is first
+    assert submit(exports, "ndvi_20210601_T29UPV", folder="Other") is not first
+    exports.wait()
+    assert len(client.exports) == 2
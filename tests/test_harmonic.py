@@ -0,0 +1,42 @@
+import datetime
+
+import pytest
+
+from biointertidal_mapper.harmonic import CONSTITUENT_SPEEDS, HarmonicTideBackend
+
+REFERENCE = datetime.datetime(2021, 6, 1, tzinfo=datetime.timezone.utc)
+M2_PERIOD = 360 / CONSTITUENT_SPEEDS["M2"] * 3600
+
+
+# Pure M2 tide around 2 m: sin(wt), high a quarter period after the reference time and low three quarters after
+def m2_backend():
+    return HarmonicTideBackend([{"name": "M2", "amplitude": 1.5, "phase": 90.0}], REFERENCE, mean_level=2.0)
+
+
+def test_extremes_between_matches_the_analytic_tide():
+    extremes = m2_backend().extremes_between("2021-06-01", "2021-06-02")
+    start = REFERENCE.timestamp()
+    expected = [(start + (0.25 + i / 2) * M2_PERIOD, "High" if i % 2 == 0 else "Low") for i in range(8)]
+    expected = [(when, kind) for when, kind in expected if when < start + 2 * 86400]
+
+    assert [extreme["type"] for extreme in extremes] == [kind for when, kind in expected]
+    for extreme, (when, kind) in zip(extremes, expected):
+        assert extreme["dt"] == pytest.approx(when, abs=60)
+        assert extreme["height"] == pytest.approx(3.5 if kind == "High" else 0.5, abs=0.01)
+        assert extreme["date"][:10] in ("2021-06-01", "2021-06-02")
+
+
+def test_prefetch_indexes_extremes_by_date():
+    backend = m2_backend()
+    backend.prefetch(["2021-06-02", "2021-06-01"], None, None)
+    lows = backend.low_tide_extremes("2021-06-01", None, None)
+    assert len(lows) in (1, 2) and all(extreme["type"] == "Low" for extreme in lows)
+    assert all(extreme["date"].startswith("2021-06-02") for extreme in backend.extremes("2021-06-02"))
+    assert backend.extremes_by_date.keys() == {"2021-06-01", "2021-06-02"}
+
+
+def test_unknown_constituent_needs_a_speed(tmp_path):
+    path = tmp_path / "constituents.json"
+    path.write_text('{"constituents": [{"name": "X9", "amplitude": 1.0, "phase": 0.0}]}')
+    with pytest.raises(ValueError, match="X9"):
+        HarmonicTideBackend.from_file(str(path))
@@ -0,0 +1,91 @@
+import contextlib
+import io
+import os
+import threading
+import time
+
+import pytest
+
+from biointertidal_mapper.ee_client import FakeEEClient
+from biointertidal_mapper.engine import RunCancelled, process
+from biointertidal_mapper.exports import ExportManager, ExportRegistry
+from biointertidal_mapper.ledger import RunLedger, run_key
+from biointertidal_mapper.stubs import StubPixelServer, StubWorldTidesServer
+from biointertidal_mapper.tides import WorldTidesBackend
+
+from helpers import make_config, make_scenes
+
+
+def run_twice(tmp_path, client, first, second, server):
+    ledger_path, registry_path = str(tmp_path / "ledger.sqlite"), str(tmp_path / "exports.sqlite")
+    for config in (first, second):
+        backend = WorldTidesBackend("stub-key", fallback_keys=(), base_url=server.url, requests_per_second=0)
+        exports = ExportManager(client, 5, 0.01, 0, ExportRegistry(registry_path))
+        with contextlib.redirect_stdout(io.StringIO()):
+            process(config, client, backend, exports=exports, ledger=RunLedger(ledger_path))
+
+
+def test_rerun_with_same_parameters_exports_nothing(tmp_path):
+    config = make_config(tmp_path, incremental=True, end_date="2021-06-10")
+    client = FakeEEClient(make_scenes(5))
+    with StubWorldTidesServer() as server:
+        run_twice(tmp_path, client, config, config, server)
+    assert len(client.exports) == 10
+
+
+def test_rerun_with_other_parameters_exports_again(tmp_path):
+    # Same dates and folder, different NDVI range: a new run key, so the files are replaced even though
+    # the registry knows their names
+    first = make_config(tmp_path, incremental=True, end_date="2021-06-10")
+    second = make_config(tmp_path, incremental=True, end_date="2021-06-10", start_ndvi=0.3)
+    client = FakeEEClient(make_scenes(5))
+    with StubWorldTidesServer() as server:
+        run_twice(tmp_path, client, first, second, server)
+    assert len(client.exports) == 20
+
+
+def test_rerun_with_other_parameters_downloads_again(tmp_path):
+    pytest.importorskip("rasterio")
+    pytest.importorskip("shapefile")
+    values = dict(incremental=True, end_date="2021-06-04", download=True, output_dir=str(tmp_path / "out"))
+    first, second = make_config(tmp_path, **values), make_config(tmp_path, start_ndvi=0.3, **values)
+    with StubPixelServer() as pixels, StubWorldTidesServer() as server:
+        client = FakeEEClient(make_scenes(2), pixel_url=pixels.url)
+        run_twice(tmp_path, client, first, first, server)
+        requests = pixels.request_count
+        run_twice(tmp_path, client, second, second, server)
+    assert requests and pixels.request_count == 2 * requests
+    assert len(os.listdir(tmp_path / "out")) == 4
+
+
+def test_resumed_run_does_not_resubmit_exports(tmp_path):
+    config = make_config(tmp_path, incremental=True, end_date="2021-06-15", max_concurrent_exports=5,
+                         export_poll_interval=0.05)
+    client = FakeEEClient(make_scenes(7), export_duration=2.0)
+    ledger_path = str(tmp_path / "ledger.sqlite")
+    registry_path = str(tmp_path / "exports.sqlite")
+
+    def run(cancel=None):
+        backend = WorldTidesBackend("stub-key", fallback_keys=(), base_url=server.url, requests_per_second=0)
+        exports = ExportManager(client, config.max_concurrent_exports, config.export_poll_interval, 0,
+                                ExportRegistry(registry_path))
+        return process(config, client, backend, exports=exports, cancel=cancel, ledger=RunLedger(ledger_path))
+
+    def cancel_once_exporting(cancel):
+        while not client.exports:
+            time.sleep(0.01)
+        cancel.set()
+
+    with StubWorldTidesServer() as server:
+        cancel = threading.Event()
+        threading.Thread(target=cancel_once_exporting, args=(cancel,), daemon=True).start()
+        with pytest.raises(RunCancelled):
+            run(cancel)
+        in_flight = [name for name, (status, scenes, task_id) in RunLedger(ledger_path).outputs(run_key(config)).items()
+                     if task_id and status not in ("COMPLETED", "CANCELLED")]
+        assert in_flight
+
+        result = run()
+    # Every output exported exactly once: the tasks left running were polled, not started again
+    assert len(client.exports) == len(result.exports) == 14
+    assert {job.state for job in result.export_jobs} == {"COMPLETED"}
@@ -0,0 +1,52 @@
+import datetime
+
+import pytest
+
+from biointertidal_mapper.matching import LowTideIndex, clock_minutes, in_hour_window, time_zone
+
+
+def extreme(text):
+    when = datetime.datetime.fromisoformat(text).replace(tzinfo=datetime.timezone.utc)
+    return {"dt": int(when.timestamp()), "date": when.strftime("%Y-%m-%dT%H:%M+0000"), "height": -1.0, "type": "Low"}
+
+
+def epoch(text):
+    return extreme(text)["dt"]
+
+
+def test_nearest_low_tide_within_tolerance():
+    lows = [extreme("2021-06-01T05:00"), extreme("2021-06-01T17:30"), extreme("2021-06-02T06:00")]
+    index = LowTideIndex(lows[::-1] + lows[:1])
+    assert len(index) == 3
+
+    times = [epoch("2021-06-01T11:00"), epoch("2021-06-01T11:30"), epoch("2021-06-01T16:00"),
+             epoch("2021-06-02T00:30"), epoch("2021-05-31T23:00")]
+    nearest = index.nearest(times, tolerance=6 * 3600)
+    assert nearest == [lows[0], lows[1], lows[1], lows[2], lows[0]]
+    assert index.nearest(times, tolerance=3600) == [None, None, None, None, None]
+
+
+def test_nearest_with_no_low_tides():
+    assert LowTideIndex([]).nearest([epoch("2021-06-01T11:00")], 3600) == [None]
+
+
+def test_hour_window_across_midnight():
+    lows = [extreme("2021-06-01T01:30"), extreme("2021-06-01T12:00"), extreme("2021-06-01T22:30")]
+    assert in_hour_window(lows, "22:00", "02:00") == [lows[0], lows[2]]
+    assert in_hour_window(lows, "10:00", "14:00") == [lows[1]]
+    assert clock_minutes("02:05") == 125
+
+
+def test_hour_window_in_local_time():
+    try:
+        time_zone("Europe/Dublin")
+    except Exception:
+        pytest.skip("no time zone database")
+    # 09:30 UTC is 10:30 in Dublin in summer (UTC+1)
+    lows = [extreme("2021-06-01T09:30"), extreme("2021-06-01T13:30")]
+    assert in_hour_window(lows, "10:00", "14:00", "Europe/Dublin") == [lows[0]]
+    assert in_hour_window(lows, "10:00", "14:00") == [lows[1]]
+
+
+def test_utc_needs_no_time_zone_database():
+    assert time_zone("UTC") is datetime.timezone.utc
@@ -0,0 +1,49 @@
+import datetime
+import sqlite3
+
+from biointertidal_mapper.ee_client import FakeEEClient
+from biointertidal_mapper.plan import plan_run
+from biointertidal_mapper.stubs import StubWorldTidesServer
+from biointertidal_mapper.tide_cache import TideCache
+from biointertidal_mapper.tides import WorldTidesBackend
+
+from helpers import make_config, make_scenes
+
+
+# Low tide at 11:00 UTC and high tide at 17:00 UTC on a date
+def tide_extremes(date):
+    day = datetime.datetime.fromisoformat(date).replace(tzinfo=datetime.timezone.utc)
+    return [{"dt": int((day + datetime.timedelta(hours=hour)).timestamp()), "date": f"{date}T{hour}:00+0000",
+             "height": height, "type": kind} for hour, height, kind in ((11, -1.0, "Low"), (17, 3.0, "High"))]
+
+
+def accessed(path):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT date, accessed FROM extremes ORDER BY date").fetchall()
+
+
+def test_plan_reads_the_tide_cache_without_requests(tmp_path):
+    path = str(tmp_path / "tides.sqlite")
+    cache = TideCache(path)
+    # The tides of the first 8 of the 10 scene dates (every other day from 2021-06-01) are cached
+    for day in range(1, 16, 2):
+        cache.put(f"2021-06-{day:02d}", 53.36, -6.18, tide_extremes(f"2021-06-{day:02d}"))
+    before = accessed(path)
+
+    config = make_config(tmp_path, start_hour="10:00", end_hour="14:00")
+    with StubWorldTidesServer() as server:
+        backend = WorldTidesBackend("stub-key", cache=cache, fallback_keys=(), base_url=server.url,
+                                    requests_per_second=0)
+        plan = plan_run(config, FakeEEClient(make_scenes(10)), backend)
+    assert server.request_count == 0
+
+    assert (plan.candidate_scenes, plan.tide_dates, plan.cached_tide_dates) == (20, 10, 8)
+    # The two dates missing from the cache are consecutive scene dates, fetched in one window
+    assert plan.tide_requests == 1
+    assert (plan.matched_scenes, plan.unknown_scenes) == (16, 4)
+    assert (plan.export_tasks, plan.possible_export_tasks) == (16, 20)
+    assert plan.ee_round_trips == 2
+
+    # Planning leaves the cache statistics and eviction order as they were
+    assert (cache.hits, cache.misses, cache.credits_saved) == (0, 0, 0)
+    assert accessed(path) == before
@@ -0,0 +1,37 @@
+import math
+
+import pytest
+
+from biointertidal_mapper.shapefiles import geometries_bounds, load_aoi, simplification_crs, vertex_count
+
+pytest.importorskip("pyproj")
+shapefile = pytest.importorskip("shapefile")
+
+
+# Circle of about 500 m radius on Dollymount Strand, in longitude and latitude
+def write_circle(path, points=360):
+    ring = [(-6.16 + 0.0075 * math.cos(math.radians(-angle)), 53.36 + 0.0045 * math.sin(math.radians(-angle)))
+            for angle in range(points)]
+    with shapefile.Writer(str(path), shapeType=shapefile.POLYGON) as writer:
+        writer.field("name", "C")
+        writer.poly([ring + ring[:1]])
+        writer.record("circle")
+    return str(path)
+
+
+def test_simplification_crs_is_in_metres():
+    circle = [{"type": "Point", "coordinates": [-6.16, 53.36]}]
+    assert simplification_crs(circle, "EPSG:4326") == "EPSG:32629"
+    assert simplification_crs([{"type": "Point", "coordinates": [151.2, -33.9]}], "EPSG:4326") == "EPSG:32756"
+    assert simplification_crs(circle, "EPSG:32629") == "EPSG:32629"
+
+
+@pytest.mark.parametrize("crs", ["EPSG:4326", "EPSG:32629"])
+def test_tolerance_is_in_metres_in_any_crs(tmp_path, crs):
+    path = write_circle(tmp_path / "circle.shp")
+    aoi = load_aoi(path, crs, tolerance=10, max_vertices=None, cache_dir=str(tmp_path / "cache"))
+    # A 10 m tolerance keeps the shape of a 500 m circle with a fraction of its vertices
+    assert 20 < vertex_count(aoi) < 200
+    if crs == "EPSG:4326":
+        min_x, min_y, max_x, max_y = geometries_bounds([aoi])
+        assert min_x == pytest.approx(-6.1675, abs=1e-4) and max_y == pytest.approx(53.3645, abs=1e-4)
@@ -0,0 +1,65 @@
+from biointertidal_mapper import tide_cache
+from biointertidal_mapper.tide_cache import TideCache
+
+EXTREMES = [{"dt": 1622527200, "date": "2021-06-01T06:00+0000", "height": -1.2, "type": "Low"}]
+
+
+class Clock:
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+def make_cache(monkeypatch, **options):
+    clock = Clock()
+    monkeypatch.setattr(tide_cache.time, "time", clock.time)
+    return TideCache(":memory:", **options), clock
+
+
+def test_nearby_coordinates_share_an_entry(monkeypatch):
+    cache, clock = make_cache(monkeypatch)
+    cache.put("2021-06-01", 53.3612, -6.1789, EXTREMES, credits=0.5)
+    assert cache.get("2021-06-01", 53.358, -6.181) == EXTREMES
+    assert cache.get("2021-06-01", 53.40, -6.18) is None
+    assert cache.get("2021-06-01", 53.36, -6.18, datum="LAT") is None
+    assert (cache.hits, cache.misses, cache.credits_saved) == (1, 2, 0.5)
+
+
+def test_entries_expire(monkeypatch):
+    cache, clock = make_cache(monkeypatch, max_age_days=30)
+    cache.put("2021-06-01", 53.36, -6.18, EXTREMES)
+    clock.now += 29 * 86400
+    assert cache.get("2021-06-01", 53.36, -6.18) == EXTREMES
+    clock.now += 2 * 86400
+    assert cache.get("2021-06-01", 53.36, -6.18) is None
+
+
+def test_least_recently_used_entries_are_evicted(monkeypatch):
+    cache, clock = make_cache(monkeypatch, max_entries=2)
+    for date in ("2021-06-01", "2021-06-02"):
+        clock.now += 1
+        cache.put(date, 53.36, -6.18, EXTREMES)
+    # Reading the oldest entry makes the other one the least recently used
+    clock.now += 1
+    assert cache.get("2021-06-01", 53.36, -6.18) is not None
+    clock.now += 1
+    cache.put("2021-06-03", 53.36, -6.18, EXTREMES)
+    assert [entry[2] for entry in cache.entries()] == ["2021-06-01", "2021-06-03"]
+
+
+def test_peek_leaves_counters_and_eviction_order(monkeypatch):
+    cache, clock = make_cache(monkeypatch, max_entries=2, max_age_days=30)
+    for date in ("2021-06-01", "2021-06-02"):
+        clock.now += 1
+        cache.put(date, 53.36, -6.18, EXTREMES)
+    clock.now += 1
+    assert cache.peek("2021-06-01", 53.36, -6.18) == EXTREMES
+    assert cache.peek("2021-06-05", 53.36, -6.18) is None
+    assert (cache.hits, cache.misses) == (0, 0)
+    # The entry read with peek is still the least recently used one
+    cache.put("2021-06-03", 53.36, -6.18, EXTREMES)
+    assert [entry[2] for entry in cache.entries()] == ["2021-06-02", "2021-06-03"]
+    clock.now += 31 * 86400
+    assert cache.peek("2021-06-03", 53.36, -6.18) is None
@@ -0,0 +1,82 @@
+import pytest
+
+from biointertidal_mapper.ee_client import FakeEEClient
+from biointertidal_mapper.engine import screen_scenes
+from biointertidal_mapper.stubs import StubWorldTidesServer
+from biointertidal_mapper.tide_cache import TideCache
+from biointertidal_mapper.tides import TideAPIError, WorldTidesBackend, WorldTidesClient, date_windows
+
+from helpers import make_config, make_scenes
+
+
+def test_date_windows_merge_close_dates():
+    dates = ["2021-06-03", "2021-06-01", "2021-06-07", "2021-06-08", "2021-06-03", "2021-07-01"]
+    assert date_windows(dates) == [("2021-06-01", 7, ["2021-06-01", "2021-06-03", "2021-06-07"]),
+                                   ("2021-06-08", 1, ["2021-06-08"]),
+                                   ("2021-07-01", 1, ["2021-07-01"])]
+    assert date_windows(dates, max_days=1) == [(date, 1, [date]) for date in sorted(set(dates))]
+    assert date_windows([]) == []
+
+
+def test_repeated_tide_dates_are_fetched_once(tmp_path):
+    # Both tiles share every date, and the dates are too far apart to share a request window
+    client = FakeEEClient(make_scenes(4, step=10))
+    scenes = client.scene_table(client.image_collection(None, 30, "2021-06-01", "2021-09-01"))
+    with StubWorldTidesServer() as server:
+        backend = WorldTidesBackend("stub-key", fallback_keys=(), base_url=server.url, requests_per_second=0)
+        matches = screen_scenes(make_config(tmp_path), scenes, backend)
+        assert server.request_count == 4
+        assert backend.request_count == 4
+    assert {scene["id"] for scene, extreme in matches} == {scene["id"] for scene in scenes}
+
+
+def test_window_request_fills_every_date(tmp_path):
+    cache = TideCache(str(tmp_path / "tides.sqlite"))
+    with StubWorldTidesServer() as server:
+        backend = WorldTidesBackend("stub-key", cache=cache, fallback_keys=(), base_url=server.url,
+                                    requests_per_second=0)
+        backend.prefetch(["2021-06-01", "2021-06-04", "2021-06-04"], 53.36, -6.18)
+        assert server.request_count == 1
+        assert server.requests[0]["days"] == "4"
+        # Every date of the window is cached, so a later date inside it needs no request
+        backend = WorldTidesBackend("stub-key", cache=cache, fallback_keys=(), base_url=server.url,
+                                    requests_per_second=0)
+        assert backend.low_tide_extremes("2021-06-02", 53.36, -6.18)
+        assert server.request_count == 1
+
+
+
+
+def test_key_rotates_when_out_of_credits():
+    with StubWorldTidesServer(credits={"first": 1, "second": 10}) as server:
+        client = WorldTidesClient(["first", "second"], requests_per_second=0, base_url=server.url)
+        client.fetch("2021-06-01", 53.36, -6.18)
+        extremes, credits = client.fetch("2021-06-02", 53.36, -6.18)
+    assert extremes
+    assert [request["key"] for request in server.requests] == ["first", "first", "second"]
+    assert client.exhausted_keys == {"first"}
+    assert client.request_count == 3
+
+
+def test_tide_request_retried_on_503():
+    with StubWorldTidesServer(fail_every=2) as server:
+        client = WorldTidesClient(["stub-key"], requests_per_second=0, backoff=0, base_url=server.url)
+        results = [client.fetch(date, 53.36, -6.18) for date in ("2021-06-01", "2021-06-02")]
+    assert all(extremes for extremes, credits in results)
+    assert server.request_count == 3
+    assert client.request_count == 3
+
+
+def test_non_json_error_page_is_a_tide_error():
+    with StubWorldTidesServer() as server:
+        client = WorldTidesClient(["stub-key"], requests_per_second=0, base_url=server.url.replace("/api/v3", "/proxy"))
+        with pytest.raises(TideAPIError, match="HTTP 404: <html>"):
+            client.fetch("2021-06-01", 53.36, -6.18)
+    assert client.request_count == 1
+
+
+def test_invalid_key_is_a_tide_error():
+    with StubWorldTidesServer(credits={"valid": 10}) as server:
+        client = WorldTidesClient(["other"], requests_per_second=0, base_url=server.url)
+        with pytest.raises(TideAPIError, match="invalid"):
+            client.fetch("2021-06-01", 53.36, -6.18)